@@ -0,0 +1,213 @@
+"""
+benchmarks/generate.py
+
+Generators of synthetic DOCX documents for the benchmarks.
+A document consists of a title page, body paragraphs made of several runs,
+image and table captions, tables with merged cells and several sections.
+The Normal style conforms to the rules in config/config.py, and a
+configurable share of paragraphs, runs, captions, table cells and sections
+gets a formatting violation applied directly. Generation is deterministic
+for a given DocumentSpec.
+"""
+
+import hashlib
+import json
+import random
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.enum.section import WD_SECTION
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Cm, Pt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config.config import (  # noqa: E402
+    TARGET_FONT,
+    MAX_FONT_SIZE,
+    TOP_MARGIN_CM,
+    BOTTOM_MARGIN_CM,
+    LEFT_MARGIN_CM,
+    RIGHT_MARGIN_CM,
+    FIRST_LINE_INDENT_CM,
+    LINE_SPACING
+)
+
+
+WORDS = ("формат", "документ", "отчёт", "таблица", "раздел", "проверка", "текст", "абзац",
+         "report", "format", "value", "margin", "style")
+
+
+@dataclass(frozen=True)
+class DocumentSpec:
+    """
+    Size and shape of a synthetic document.
+
+    Attributes:
+        paragraphs: number of body paragraphs (captions not included).
+        runs: runs per body paragraph.
+        words: words per run.
+        tables: number of tables, each preceded by a table caption.
+        rows, cols: size of each table.
+        merged: merge a block of cells in every table, horizontally and vertically.
+        images: number of image captions.
+        sections: number of sections.
+        violations: share (0..1) of elements that get a formatting violation.
+        seed: seed of the random generator.
+    """
+    paragraphs: int = 1000
+    runs: int = 4
+    words: int = 6
+    tables: int = 10
+    rows: int = 20
+    cols: int = 5
+    merged: bool = True
+    images: int = 10
+    sections: int = 3
+    violations: float = 0.05
+    seed: int = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+    def key(self) -> str:
+        """
+        Short digest of the spec, used to name generated files.
+        """
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+# Presets selectable by name from the benchmark runner
+SIZES: Dict[str, DocumentSpec] = {
+    "small": DocumentSpec(paragraphs=200, runs=3, tables=3, rows=10, cols=4, images=3, sections=2),
+    "medium": DocumentSpec(paragraphs=2000, runs=6, tables=20, rows=30, cols=6, images=20, sections=5),
+    "large": DocumentSpec(paragraphs=10000, runs=10, tables=50, rows=100, cols=8, images=50, sections=20),
+}
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + " "
+
+
+def _set_conforming_styles(docx: DocumentObject) -> None:
+    """
+    Make the Normal style conform, so only the injected violations are reported.
+    """
+    normal = docx.styles["Normal"]
+    normal.font.name = TARGET_FONT
+    normal.font.size = Pt(MAX_FONT_SIZE)
+    fmt = normal.paragraph_format
+    fmt.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    fmt.first_line_indent = Cm(FIRST_LINE_INDENT_CM)
+    fmt.line_spacing = LINE_SPACING
+
+
+def _set_margins(section, violate: bool) -> None:
+    section.top_margin = Cm(TOP_MARGIN_CM)
+    section.bottom_margin = Cm(BOTTOM_MARGIN_CM)
+    section.left_margin = Cm(LEFT_MARGIN_CM + (1 if violate else 0))
+    section.right_margin = Cm(RIGHT_MARGIN_CM)
+
+
+def _add_body_paragraph(docx: DocumentObject, spec: DocumentSpec, rng: random.Random) -> None:
+    paragraph = docx.add_paragraph()
+    for _ in range(spec.runs):
+        run = paragraph.add_run(_text(rng, spec.words))
+        if rng.random() < spec.violations:
+            run.font.name = "Arial"
+        if rng.random() < spec.violations:
+            run.font.size = Pt(10)
+    if rng.random() < spec.violations:
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    if rng.random() < spec.violations:
+        paragraph.paragraph_format.first_line_indent = Cm(0)
+    if rng.random() < spec.violations:
+        paragraph.paragraph_format.line_spacing = 1.0
+
+
+def _add_caption(docx: DocumentObject, text: str, alignment: WD_ALIGN_PARAGRAPH,
+                 rng: random.Random, violations: float) -> None:
+    paragraph = docx.add_paragraph()
+    run = paragraph.add_run(text)
+    paragraph.alignment = alignment
+    paragraph.paragraph_format.first_line_indent = Cm(0)
+    if rng.random() < violations:
+        run.bold = True
+    if rng.random() < violations:
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+
+def _add_table(docx: DocumentObject, spec: DocumentSpec, rng: random.Random) -> None:
+    table = docx.add_table(rows=spec.rows, cols=spec.cols)
+    for row in table.rows:
+        for cell in row.cells:
+            run = cell.paragraphs[0].add_run(_text(rng, 2))
+            if rng.random() < spec.violations:
+                run.font.size = Pt(9)
+    if spec.merged and spec.rows >= 3 and spec.cols >= 3:
+        table.cell(1, 0).merge(table.cell(2, 1))  # 2x2 block: both hMerge and vMerge
+        table.cell(0, spec.cols - 2).merge(table.cell(0, spec.cols - 1))
+
+
+def generate_document(spec: DocumentSpec) -> DocumentObject:
+    """
+    Build a synthetic document according to spec.
+
+    Args:
+        spec (DocumentSpec): Size, shape and violation share of the document.
+
+    Returns:
+        DocumentObject: The generated document.
+    """
+    rng = random.Random(spec.seed)
+    docx = Document()
+    _set_conforming_styles(docx)
+
+    # Title page, ended by the TITLE_PAGE_PATTERN marker
+    docx.add_paragraph("Министерство науки и высшего образования").alignment = WD_ALIGN_PARAGRAPH.CENTER
+    docx.add_paragraph("Отчёт по практике").alignment = WD_ALIGN_PARAGRAPH.CENTER
+    docx.add_paragraph("Москва 2025 г.").alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Tables, images and section breaks are spread evenly over the body
+    events = sorted(
+        [(i * spec.paragraphs // max(spec.tables, 1), "table") for i in range(spec.tables)]
+        + [(i * spec.paragraphs // max(spec.images, 1), "image") for i in range(spec.images)]
+        + [((i + 1) * spec.paragraphs // spec.sections, "section") for i in range(spec.sections - 1)]
+    )
+    _set_margins(docx.sections[0], rng.random() < spec.violations)
+    table_number = image_number = 0
+    position = 0
+    for index in range(spec.paragraphs + 1):
+        while position < len(events) and events[position][0] == index:
+            kind = events[position][1]
+            if kind == "table":
+                table_number += 1
+                _add_caption(docx, f"Табл. {table_number}. Результаты измерений", WD_ALIGN_PARAGRAPH.RIGHT,
+                             rng, spec.violations)
+                _add_table(docx, spec, rng)
+            elif kind == "image":
+                image_number += 1
+                _add_caption(docx, f"Рис. {image_number}. Схема установки", WD_ALIGN_PARAGRAPH.CENTER,
+                             rng, spec.violations)
+            else:
+                _set_margins(docx.add_section(WD_SECTION.NEW_PAGE), rng.random() < spec.violations)
+            position += 1
+        if index < spec.paragraphs:
+            _add_body_paragraph(docx, spec, rng)
+    return docx
+
+
+def write_document(spec: DocumentSpec, path: Path) -> Path:
+    """
+    Generate a document and save it to path, unless it already exists.
+    Documents are deterministic, so an existing file is reused.
+    """
+    path = Path(path)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        generate_document(spec).save(str(path))
+    return path
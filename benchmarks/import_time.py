@@ -0,0 +1,97 @@
+"""
+benchmarks/import_time.py
+
+Import-time benchmark. Starts a fresh interpreter for each entry point
+(python -X importtime -c "import <module>") and reports the median total
+import time, the wall time of the process and whether heavy dependencies
+(python-docx, lxml, tkinter) were imported.
+
+Usage:
+    python benchmarks/import_time.py [--repeat N] [-o results.json] [MODULE ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+DEFAULT_MODULES = [
+    "sys",  # baseline: interpreter startup alone
+    "config.config",
+    "cli",
+    "server",
+    "main",
+    "docx_utils.cache",
+    "docx_utils.report",
+    "docx_utils.docx_operations",
+]
+
+HEAVY_MODULES = ("docx", "lxml.etree", "tkinter")
+
+
+def measure_import(module: str) -> Dict[str, Any]:
+    """
+    Import module in a fresh interpreter.
+
+    Returns:
+        dict: total import time and process wall time in seconds, and the
+        heavy modules that were imported.
+    """
+    env = {**os.environ, "PYTHONPATH": str(SRC)}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        imported.add(name.strip())
+    return {
+        "import_seconds": total_us / 1e6,
+        "wall_seconds": wall,
+        "heavy": sorted(name for name in HEAVY_MODULES if name in imported),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the import time of the entry points.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (default: 5)")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file.")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        result = {
+            "module": module,
+            "import_seconds": statistics.median(r["import_seconds"] for r in runs),
+            "wall_seconds": statistics.median(r["wall_seconds"] for r in runs),
+            "heavy": runs[0]["heavy"],
+        }
+        print(f"{module:<30} import {result['import_seconds'] * 1000:7.1f} ms  "
+              f"process {result['wall_seconds'] * 1000:7.1f} ms  heavy: {', '.join(result['heavy']) or '-'}",
+              file=sys.stderr)
+        results.append(result)
+
+    text = json.dumps({"python": sys.version.split()[0], "repeat": args.repeat, "modules": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+benchmarks/memory.py
+
+Peak memory benchmark of analyze_docx and analyze_docx_chunked.
+Generates documents of increasing length (see generate.py) and analyzes
+each of them in a fresh interpreter per function, so that every process
+starts from the same state, and records the peak resident set size of
+the process (which includes the memory held by lxml) above its size once
+the modules are imported, and the wall time.
+
+analyze_docx keeps the whole document in memory, so its peak grows with
+the number of paragraphs; the peak of analyze_docx_chunked should stay
+roughly the same. With --max-growth, the exit code is 1 if the chunked
+peak of the longest document is more than that many times the one of the
+shortest. The peak is read from the resource module, so the benchmark
+does not run on Windows.
+
+Usage:
+    python benchmarks/memory.py [--paragraphs N ...] [--mode {report,highlight,fix,full}]
+                                [--chunk-blocks N] [--work-dir DIR] [-o results.json]
+                                [--max-growth F]
+"""
+
+import argparse
+import dataclasses
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from generate import DocumentSpec, write_document  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FUNCTIONS = ("analyze_docx", "analyze_docx_chunked")
+
+# The shape of the generated documents; only the number of paragraphs changes
+BASE_SPEC = DocumentSpec(runs=4, tables=5, rows=20, cols=5, images=10, sections=3)
+DEFAULT_PARAGRAPHS = [2000, 8000, 32000]
+
+
+def _peak_rss_kb() -> int:
+    # On Linux, ru_maxrss is inherited from the parent process across fork and
+    # exec, which would count the memory used to generate the documents
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def child(function: str, path: str, mode: str, chunk_blocks: int, work_dir: str) -> None:
+    """
+    Analyze one document and print the peak RSS and wall time as JSON;
+    runs in the interpreter started by measure().
+    """
+    from docx_utils.chunked import analyze_docx_chunked
+    from docx_utils.docx_operations import analyze_docx, save_docx
+    from docx_utils.report import open_report_writer
+
+    checked_path = Path(work_dir) / "checked.docx"
+    fixed_path = Path(work_dir) / "fixed.docx"
+    base_kb = _peak_rss_kb()
+    start = time.perf_counter()
+    # The report is streamed to a file, as by the CLI, so only the document is kept in memory
+    with open_report_writer(Path(work_dir) / "report.jsonl", "jsonl") as report:
+        if function == "analyze_docx":
+            _, checked, fixed = analyze_docx(path, report, mode=mode)
+            if checked is not None:
+                save_docx(checked, checked_path)
+            if fixed is not None:
+                save_docx(fixed, fixed_path)
+        else:
+            outputs = {"checked_output": checked_path if mode in ("highlight", "full") else None,
+                       "fixed_output": fixed_path if mode in ("fix", "full") else None}
+            analyze_docx_chunked(path, report, mode=mode, chunk_blocks=chunk_blocks, **outputs)
+    wall = time.perf_counter() - start
+    print(json.dumps({"base_kb": base_kb, "peak_kb": _peak_rss_kb(), "seconds": wall, "issues": len(report)}))
+
+
+def measure(function: str, path: Path, mode: str, chunk_blocks: int, work_dir: Path) -> Dict[str, Any]:
+    """
+    Run function on the document at path in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, __file__, "--child", function, str(path), "--mode", mode,
+                             "--chunk-blocks", str(chunk_blocks), "--work-dir", str(work_dir)],
+                            capture_output=True, text=True, check=True)
+    measured = json.loads(result.stdout)
+    return {
+        "function": function,
+        "peak_mb": (measured["peak_kb"] - measured["base_kb"]) / 1024,
+        "process_peak_mb": measured["peak_kb"] / 1024,
+        "seconds": measured["seconds"],
+        "issues": measured["issues"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the peak memory of chunked and whole-document analysis.")
+    parser.add_argument("--paragraphs", nargs="+", type=int, default=DEFAULT_PARAGRAPHS,
+                        help=f"Body paragraphs of the generated documents (default: {DEFAULT_PARAGRAPHS}).")
+    parser.add_argument("--mode", choices=["report", "highlight", "fix", "full"], default="full",
+                        help="Analysis mode (default: full).")
+    parser.add_argument("--chunk-blocks", type=int, default=200, help="Blocks per window of the chunked analysis.")
+    parser.add_argument("--work-dir", default=None,
+                        help="Folder for generated documents, reused between runs (default: temp folder).")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file.")
+    parser.add_argument("--max-growth", type=float, default=None,
+                        help="Fail if the chunked peak grows by more than this factor over the document sizes.")
+    parser.add_argument("--child", nargs=2, metavar=("FUNCTION", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if resource is None:
+        print("The peak memory can only be measured where the resource module is available (Linux, macOS), "
+              "not on this platform", file=sys.stderr)
+        sys.exit(2)
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir()) / "docx-benchmarks"
+    if args.child:
+        child(args.child[0], args.child[1], args.mode, args.chunk_blocks, str(work_dir))
+        return
+
+    results: List[Dict[str, Any]] = []
+    for paragraphs in sorted(args.paragraphs):
+        spec = dataclasses.replace(BASE_SPEC, paragraphs=paragraphs)
+        path = write_document(spec, work_dir / f"{spec.key()}.docx")
+        for function in FUNCTIONS:
+            result = {"paragraphs": paragraphs, "size_mb": path.stat().st_size / 2**20,
+                      **measure(function, path, args.mode, args.chunk_blocks, work_dir)}
+            print(f"{paragraphs:>7} paragraphs  {function:<22} peak {result['peak_mb']:8.1f} MB  "
+                  f"{result['seconds']:7.2f} s  {result['issues']} issues", file=sys.stderr)
+            results.append(result)
+
+    text = json.dumps({"python": platform.python_version(), "mode": args.mode, "chunk_blocks": args.chunk_blocks,
+                       "results": results}, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.max_growth is not None:
+        chunked = [r["peak_mb"] for r in results if r["function"] == "analyze_docx_chunked"]
+        growth = chunked[-1] / max(chunked[0], 1.0)
+        if growth > args.max_growth:
+            print(f"REGRESSION chunked peak grew {growth:.2f}x ({chunked[0]:.1f} -> {chunked[-1]:.1f} MB)",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
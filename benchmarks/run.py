@@ -0,0 +1,310 @@
+"""
+benchmarks/run.py
+
+Benchmark runner. Generates synthetic documents (see generate.py) and
+times every stage of the pipeline separately: loading, the traversal
+alone, the columnar extraction, the page estimation, each checker (one by
+one and all of them on the extracted columns), each fixer, saving and the
+whole analyze_docx.
+Each stage is timed --repeat times on a freshly loaded document, then run
+once more under tracemalloc to record its peak Python memory (memory held
+by lxml's C library is not visible to tracemalloc; the process-wide peak
+RSS is recorded per document instead).
+
+Results are written as JSON. With --compare, stages whose median time
+grew by more than --threshold relative to an earlier result file are
+listed and the exit code is 1.
+
+Usage:
+    python benchmarks/run.py [--size {small,medium,large} ...] [--paragraphs N] [--runs N]
+                             [--tables N] [--rows N] [--cols N] [--sections N] [--violations F]
+                             [--repeat N] [--stage NAME ...] [--work-dir DIR]
+                             [-o results.json] [--compare baseline.json] [--threshold F]
+"""
+
+import argparse
+import dataclasses
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import docx as python_docx
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.text.paragraph import Paragraph
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from generate import SIZES, DocumentSpec, write_document  # noqa: E402
+from docx_utils.alignment_check import AlignmentCheckVisitor  # noqa: E402
+from docx_utils.auto_fix.alignment_fix import AlignmentFixVisitor  # noqa: E402
+from docx_utils.auto_fix.font_fix import FontFixVisitor  # noqa: E402
+from docx_utils.auto_fix.page_margins_fix import PageMarginsFixVisitor  # noqa: E402
+from docx_utils.auto_fix.style_fix import StyleFixVisitor, fix_styles  # noqa: E402
+from docx_utils.classification import classify_paragraphs  # noqa: E402
+from docx_utils.columns import extract_columns  # noqa: E402
+from docx_utils.docx_operations import AnalysisMode, analyze_docx, fix_docx, save_docx  # noqa: E402
+from docx_utils.font_check import FontCheckVisitor  # noqa: E402
+from docx_utils.layout import estimate_pages  # noqa: E402
+from docx_utils.page_margins import PageMarginsCheckVisitor  # noqa: E402
+from docx_utils.styles import StyleResolver  # noqa: E402
+from docx_utils.traversal import DocumentVisitor, walk_document  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Stage(NamedTuple):
+    """
+    A timed step. setup(path) prepares the input outside the timing;
+    run(input) is the timed part and may return a count (e.g. of issues).
+    """
+    name: str
+    setup: Callable[[Path], Any]
+    run: Callable[[Any], Optional[int]]
+
+
+def _load(path: Path) -> DocumentObject:
+    return Document(str(path))
+
+
+def _walk(visitor_factory: Callable[[List, StyleResolver], DocumentVisitor]) -> Callable[[DocumentObject], int]:
+    """
+    Timed run of a single checker in a traversal of its own.
+    """
+    def run(docx: DocumentObject) -> int:
+        report: List = []
+        walk_document(docx, [visitor_factory(report, StyleResolver.from_document(docx))])
+        return len(report)
+    return run
+
+
+def _extract(docx: DocumentObject) -> int:
+    return len(extract_columns(docx, StyleResolver.from_document(docx)).run_rows)
+
+
+def _check_columns(docx: DocumentObject) -> int:
+    """
+    Timed extraction and traversal of all checkers reading the columns.
+    """
+    report: List = []
+    styles = StyleResolver.from_document(docx)
+    columns = extract_columns(docx, styles)
+    walk_document(docx, [FontCheckVisitor(report, True, styles, columns=columns),
+                         AlignmentCheckVisitor(report, True, styles, columns=columns),
+                         PageMarginsCheckVisitor(report, columns=columns)])
+    return len(report)
+
+
+def _fix(visitors: Callable[[], List[DocumentVisitor]]) -> Callable[[DocumentObject], None]:
+    """
+    Timed run of fixers in a traversal of their own.
+    """
+    def run(docx: DocumentObject) -> None:
+        walk_document(docx, visitors())
+    return run
+
+
+def _walk_only(docx: DocumentObject) -> None:
+    walk_document(docx, [DocumentVisitor()])
+
+
+def _fix_styles(docx: DocumentObject) -> None:
+    paragraphs = [block for block in docx.iter_inner_content() if isinstance(block, Paragraph)]
+    fix_styles(docx, paragraphs, classify_paragraphs(paragraphs))
+
+
+def _fix_styles_and_runs(docx: DocumentObject) -> int:
+    paragraphs = [block for block in docx.iter_inner_content() if isinstance(block, Paragraph)]
+    classification = classify_paragraphs(paragraphs)
+    visitor = StyleFixVisitor(fix_styles(docx, paragraphs, classification))
+    walk_document(docx, [visitor], classification)
+    return visitor.changes.properties
+
+
+def _save(docx: DocumentObject) -> int:
+    buffer = io.BytesIO()
+    save_docx(docx, buffer)
+    return len(buffer.getvalue())
+
+
+def _analyze(mode: AnalysisMode, **options) -> Callable[[Path], int]:
+    def run(path: Path) -> int:
+        report, _, _ = analyze_docx(str(path), mode=mode, **options)
+        return len(report)
+    return run
+
+
+STAGES: List[Stage] = [
+    Stage("load", lambda path: path, lambda path: _load(path) and None),
+    Stage("styles", _load, lambda docx: StyleResolver.from_document(docx) and None),
+    Stage("walk", _load, _walk_only),
+    Stage("extract", _load, _extract),
+    Stage("check.columns", _load, _check_columns),
+    Stage("layout", _load, lambda docx: estimate_pages(docx).page_count),
+    Stage("check.font", _load, _walk(lambda report, styles: FontCheckVisitor(report, True, styles))),
+    Stage("check.alignment", _load, _walk(lambda report, styles: AlignmentCheckVisitor(report, True, styles))),
+    Stage("check.page_margins", _load, _walk(lambda report, styles: PageMarginsCheckVisitor(report))),
+    Stage("fix.font", _load, _fix(lambda: [FontFixVisitor()])),
+    Stage("fix.alignment", _load, _fix(lambda: [AlignmentFixVisitor()])),
+    Stage("fix.page_margins", _load, _fix(lambda: [PageMarginsFixVisitor()])),
+    Stage("fix.styles", _load, _fix_styles),
+    Stage("fix.style_runs", _load, _fix_styles_and_runs),
+    Stage("fix", _load, lambda docx: fix_docx(docx).properties),
+    Stage("save", _load, _save),
+    Stage("analyze.report", lambda path: path, _analyze(AnalysisMode.REPORT)),
+    Stage("analyze.report_prescan", lambda path: path, _analyze(AnalysisMode.REPORT, prescan=True)),
+    Stage("analyze.full", lambda path: path, _analyze(AnalysisMode.FULL)),
+]
+
+
+def time_stage(stage: Stage, path: Path, repeat: int) -> Dict[str, Any]:
+    """
+    Time a stage repeat times and measure its peak Python memory once.
+
+    Returns:
+        dict: stage name, all timings in seconds, their min and median,
+        the peak memory in bytes and the count returned by the stage.
+    """
+    times = []
+    count = None
+    for _ in range(repeat):
+        data = stage.setup(path)
+        gc.collect()
+        start = time.perf_counter()
+        count = stage.run(data)
+        times.append(time.perf_counter() - start)
+        del data
+
+    data = stage.setup(path)
+    gc.collect()
+    tracemalloc.start()
+    stage.run(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "stage": stage.name,
+        "seconds": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        "peak_bytes": peak,
+        "count": count,
+    }
+
+
+def _max_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # kilobytes on Linux
+
+
+def run_benchmarks(specs: Dict[str, DocumentSpec], work_dir: Path, repeat: int,
+                   stage_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Run the selected stages (all if None) on a document generated for each spec.
+    """
+    stages = [s for s in STAGES if stage_names is None or s.name in stage_names]
+    documents = []
+    for name, spec in specs.items():
+        path = write_document(spec, work_dir / f"{name}-{spec.key()}.docx")
+        print(f"{name}: {path} ({path.stat().st_size} bytes)", file=sys.stderr)
+        results = []
+        for stage in stages:
+            result = time_stage(stage, path, repeat)
+            print(f"  {stage.name:<24} {result['median']:9.4f} s  {result['peak_bytes'] / 2**20:8.1f} MiB",
+                  file=sys.stderr)
+            results.append(result)
+        documents.append({
+            "name": name,
+            "spec": spec.to_dict(),
+            "file_bytes": path.stat().st_size,
+            "max_rss_bytes": _max_rss_bytes(),
+            "stages": results,
+        })
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "python_docx": python_docx.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "documents": documents,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Stages whose median time is more than threshold times the baseline's,
+    for documents generated from the same spec.
+    """
+    def medians(data):
+        return {(json.dumps(doc["spec"], sort_keys=True), doc["name"], stage["stage"]): stage["median"]
+                for doc in data["documents"] for stage in doc["stages"]}
+
+    old = medians(baseline)
+    regressions = []
+    for key, median in medians(results).items():
+        if key in old and old[key] > 0 and median > old[key] * threshold:
+            regressions.append(f"{key[1]} {key[2]}: {old[key]:.4f} s -> {median:.4f} s "
+                               f"({median / old[key]:.2f}x)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the DOCX checks and fixes on synthetic documents.")
+    parser.add_argument("--size", nargs="+", choices=sorted(SIZES), default=["small", "medium"],
+                        help="Preset document sizes to generate (default: small medium).")
+    for field in dataclasses.fields(DocumentSpec):
+        if field.name not in ("merged", "seed"):
+            parser.add_argument(f"--{field.name}", type=field.type, default=None,
+                                help=f"Override '{field.name}' of the presets.")
+    parser.add_argument("--seed", type=int, default=None, help="Override the random seed.")
+    parser.add_argument("--no-merge", action="store_true", help="Do not merge table cells.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (default: 3).")
+    parser.add_argument("--stage", nargs="+", choices=[s.name for s in STAGES], default=None,
+                        help="Run only these stages.")
+    parser.add_argument("--work-dir", default=None,
+                        help="Folder for generated documents, reused between runs (default: temp folder).")
+    parser.add_argument("-o", "--output", default=None, help="Write the JSON results to this file.")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown factor reported as a regression (default: 1.2).")
+    args = parser.parse_args()
+
+    overrides = {f.name: getattr(args, f.name) for f in dataclasses.fields(DocumentSpec)
+                 if getattr(args, f.name, None) is not None}
+    if args.no_merge:
+        overrides["merged"] = False
+    specs = {name: dataclasses.replace(SIZES[name], **overrides) for name in args.size}
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir()) / "docx-benchmarks"
+    results = run_benchmarks(specs, work_dir, args.repeat, args.stage)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
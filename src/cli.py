@@ -0,0 +1,399 @@
+"""
+cli.py
+
+Headless batch entry point. Checks and auto-fixes many .docx documents
+without any GUI, distributing the work over a pool of processes.
+
+Usage:
+    python src/cli.py [-o OUTPUT_DIR] [-j JOBS] [-f {csv,jsonl,text}]
+                      [-m {full,report,highlight,fix}] [--max-issues N] [--prescan]
+                      [--cache-dir DIR] [--cache-size MB] [--state-dir DIR]
+                      [--metrics FILE] [--profile FILE] [--comments] [--pages]
+                      [--chunked [BLOCKS]] PATH [PATH ...]
+
+Each PATH may be a .docx file, a directory (searched recursively) or a
+glob pattern. For every document, <name>_checked.docx, <name>_report.txt
+(.jsonl/.csv with --report-format) and, if issues were found,
+<name>_fixed.docx are written next to the document, or with -o to
+OUTPUT_DIR in the same subfolders as the documents have below their
+common folder, so documents of the same name in different folders do not
+overwrite each other. --mode limits which of them are built.
+With --cache-dir, results of documents analyzed before with the same
+rules are taken from the cache instead of analyzing them again. With
+--state-dir, only paragraphs changed since the previous run are checked.
+With --metrics, the stage timings, visited element counts and issues per
+rule of every document are appended to FILE as JSON Lines.
+With --profile, documents are checked against the rule profile in FILE
+(.json or .toml, see config.profiles) instead of the default rules.
+With --comments, every highlighted paragraph of <name>_checked.docx gets a
+Word comment listing its issues.
+With --pages, the estimated page of every issue is reported, and the text
+report ends with the number of issues per page.
+With --chunked, the body of every document is processed BLOCKS paragraphs
+and tables at a time and the outputs are written while it is read, so
+very large documents are analyzed in bounded memory (see docx_utils.chunked);
+it cannot be combined with the options that need the whole document.
+
+Exit code: 0 if every document conforms, 1 if issues were found,
+2 if at least one document could not be processed. In fix mode no
+issues are reported, so the exit code only reflects failures.
+"""
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+from config.profiles import DEFAULT_PROFILE, RuleProfile, load_profile
+from docx_utils.modes import DEFAULT_CHUNK_BLOCKS, AnalysisMode
+from docx_utils.report import REPORT_FORMATS, open_report_writer
+from docx_utils.cache import DEFAULT_MAX_BYTES, ResultCache, cached_analyze_docx
+from docx_utils.instrumentation import Instrumentation, JsonLinesSink
+
+if TYPE_CHECKING:
+    from docx_utils.incremental import IncrementalState
+
+
+# (document path, number of issues, error message or None)
+FileResult = Tuple[str, int, Optional[str]]
+
+
+def collect_documents(patterns: Iterable[str]) -> List[Path]:
+    """
+    Expand files, directories and glob patterns into a sorted list of unique
+    .docx paths. Word lock files (~$*.docx) and outputs of previous runs
+    (*_checked.docx, *_fixed.docx) found in directories are skipped.
+    """
+    found = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = [
+                p for p in path.rglob("*.docx")
+                if not p.name.startswith("~$")
+                and not p.stem.endswith(("_checked", "_fixed"))
+            ]
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = [Path(p) for p in glob.glob(pattern, recursive=True) if p.lower().endswith(".docx")]
+        found.update(p.resolve() for p in candidates)
+    return sorted(found)
+
+
+def output_dirs(paths: List[Path], output_dir: Optional[str]) -> List[Optional[str]]:
+    """
+    Folder for the outputs of each document: None (next to the document)
+    without output_dir, else output_dir followed by the document's folder
+    relative to the common folder of all documents.
+    """
+    if not output_dir or not paths:
+        return [output_dir] * len(paths)
+    root = Path(os.path.commonpath([path.parent for path in paths]))
+    return [str(Path(output_dir) / path.parent.relative_to(root)) for path in paths]
+
+
+def output_collisions(paths: List[Path], dirs: List[Optional[str]]) -> List[Tuple[Path, Path]]:
+    """
+    Pairs of documents whose outputs would have the same names, e.g.
+    report.docx and report.DOCX in the same folder.
+    """
+    targets = {}
+    collisions = []
+    for path, folder in zip(paths, dirs):
+        target = (Path(folder) if folder else path.parent) / path.stem
+        if target in targets:
+            collisions.append((targets[target], path))
+        else:
+            targets[target] = path
+    return collisions
+
+
+def process_document(docx_path: str, output_dir: Optional[str] = None,
+                     report_format: str = "text", mode: str = AnalysisMode.FULL,
+                     max_issues: Optional[int] = None, prescan: bool = False,
+                     cache_dir: Optional[str] = None, cache_size: int = DEFAULT_MAX_BYTES,
+                     state_dir: Optional[str] = None, metrics_file: Optional[str] = None,
+                     profile: RuleProfile = DEFAULT_PROFILE, comments: bool = False,
+                     pages: bool = False, chunked: Optional[int] = None) -> FileResult:
+    """
+    Analyze a single document and write the outputs of the chosen mode:
+    report, checked copy and/or fixed copy. The report is written
+    incrementally while the document is analyzed.
+    Runs inside a worker process, so errors are returned instead of raised.
+
+    Args:
+        docx_path: Path to the .docx file.
+        output_dir: Folder for the output files; defaults to the document's folder.
+        report_format: One of docx_utils.report.REPORT_FORMATS.
+        mode: AnalysisMode value selecting which outputs are built.
+        max_issues: Stop checking a document after this many issues.
+        prescan: Pre-scan the raw XML and check only suspicious regions.
+        cache_dir: Folder of the result cache; no caching if None.
+        cache_size: Maximum size of the result cache in bytes.
+        state_dir: Folder keeping per-paragraph results between runs, so that
+            only paragraphs changed since the last run are checked again.
+        metrics_file: JSON Lines file the document's metrics are appended to
+            (see docx_utils.instrumentation); no instrumentation if None.
+        profile: Rules to check against (see config.profiles).
+        comments: Add a comment listing the issues to every highlighted paragraph.
+        pages: Report the estimated page of every issue.
+        chunked: Process the body this many blocks at a time in bounded memory;
+            the whole document at once if None.
+
+    Returns:
+        FileResult: (docx_path, number of issues, error message or None).
+    """
+    args = (docx_path, output_dir, report_format, mode, max_issues, prescan, cache_dir, cache_size, state_dir,
+            profile, comments, pages, chunked)
+    if metrics_file is None:
+        return _process_document(*args)
+
+    instrumentation = Instrumentation(JsonLinesSink(metrics_file))
+    with instrumentation.activate(), instrumentation.stage("total"):
+        result = _process_document(*args)
+    instrumentation.emit(document=docx_path, mode=AnalysisMode(mode).value,
+                         profile=profile.name,
+                         issue_count=result[1], error=result[2])
+    return result
+
+
+def _process_document(docx_path: str, output_dir: Optional[str], report_format: str, mode: str,
+                      max_issues: Optional[int], prescan: bool, cache_dir: Optional[str],
+                      cache_size: int, state_dir: Optional[str], profile: RuleProfile,
+                      comments: bool, pages: bool, chunked: Optional[int]) -> FileResult:
+    """
+    process_document without instrumentation setup.
+    """
+    try:
+        source = Path(docx_path)
+        save_dir = Path(output_dir) if output_dir else source.parent
+        save_dir.mkdir(parents=True, exist_ok=True)
+        incremental = None
+        if state_dir:
+            from docx_utils.incremental import IncrementalState, state_path
+            incremental = IncrementalState.load(state_path(state_dir, source), profile)
+
+        if chunked is not None:
+            issues = _process_chunked(source, save_dir, report_format, mode, profile, chunked)
+        elif cache_dir:
+            issues = _process_cached(source, save_dir, report_format, mode, max_issues, prescan,
+                                     ResultCache(cache_dir, cache_size), incremental, profile, comments, pages)
+        else:
+            issues = _process(source, save_dir, report_format, mode, max_issues, prescan, incremental, profile,
+                              comments, pages)
+
+        if incremental is not None:
+            incremental.save(state_path(state_dir, source))
+        return docx_path, issues, None
+    except Exception as exc:
+        return docx_path, 0, f"{type(exc).__name__}: {exc}"
+
+
+def _process(source: Path, save_dir: Path, report_format: str, mode: str, max_issues: Optional[int],
+             prescan: bool, incremental: Optional["IncrementalState"], profile: RuleProfile,
+             comments: bool = False, pages: bool = False) -> int:
+    """
+    Analyze a document and write its outputs. Returns the number of issues.
+    """
+    # python-docx is loaded only when a document is analyzed, not for --help or cache hits
+    from docx_utils.docx_operations import analyze_docx, save_docx
+
+    base_name = source.stem
+
+    if mode == AnalysisMode.FIX:
+        _, _, docx_fixed = analyze_docx(str(source), mode=mode, profile=profile)
+        save_docx(docx_fixed, save_dir / f"{base_name}_fixed.docx")
+        return 0
+
+    extension = REPORT_FORMATS[report_format].extension
+    with open_report_writer(save_dir / f"{base_name}_report{extension}", report_format) as report:
+        _, docx_checked, docx_fixed = analyze_docx(str(source), report, mode, max_issues, prescan, incremental,
+                                                   profile=profile, comments=comments, pages=pages)
+    if docx_checked is not None:
+        save_docx(docx_checked, save_dir / f"{base_name}_checked.docx")
+    if docx_fixed is not None and report.count:
+        save_docx(docx_fixed, save_dir / f"{base_name}_fixed.docx")
+    return report.count
+
+
+def _process_chunked(source: Path, save_dir: Path, report_format: str, mode: str, profile: RuleProfile,
+                     chunk_blocks: int) -> int:
+    """
+    Analyze a document in bounded memory, writing its outputs while it is
+    read. Returns the number of issues.
+    """
+    from docx_utils.chunked import analyze_docx_chunked
+
+    base_name = source.stem
+    checked_path = save_dir / f"{base_name}_checked.docx"
+    fixed_path = save_dir / f"{base_name}_fixed.docx"
+    outputs = {
+        "checked_output": checked_path if mode in (AnalysisMode.HIGHLIGHT, AnalysisMode.FULL) else None,
+        "fixed_output": fixed_path if mode in (AnalysisMode.FIX, AnalysisMode.FULL) else None,
+    }
+
+    if mode == AnalysisMode.FIX:
+        analyze_docx_chunked(str(source), mode=mode, chunk_blocks=chunk_blocks, profile=profile, **outputs)
+        return 0
+
+    extension = REPORT_FORMATS[report_format].extension
+    with open_report_writer(save_dir / f"{base_name}_report{extension}", report_format) as report:
+        analyze_docx_chunked(str(source), report, mode, chunk_blocks=chunk_blocks, profile=profile, **outputs)
+    # The fixed copy is written before the number of issues is known
+    if outputs["fixed_output"] is not None and not report.count:
+        fixed_path.unlink()
+    return report.count
+
+
+def _process_cached(source: Path, save_dir: Path, report_format: str, mode: str,
+                    max_issues: Optional[int], prescan: bool, cache: ResultCache,
+                    incremental: Optional["IncrementalState"], profile: RuleProfile,
+                    comments: bool = False, pages: bool = False) -> int:
+    """
+    Write the same outputs as process_document from the document's cache
+    entry, creating the entry first if missing. Returns the number of issues.
+    """
+    result = cached_analyze_docx(source, cache, mode, max_issues, prescan, incremental, profile, comments,
+                                 pages)
+    if mode != AnalysisMode.FIX:
+        extension = REPORT_FORMATS[report_format].extension
+        with open_report_writer(save_dir / f"{source.stem}_report{extension}", report_format) as report:
+            report.extend(result.report)
+    if result.checked is not None:
+        (save_dir / f"{source.stem}_checked.docx").write_bytes(result.checked)
+    if result.fixed is not None and (result.report or mode == AnalysisMode.FIX):
+        (save_dir / f"{source.stem}_fixed.docx").write_bytes(result.fixed)
+    return len(result.report)
+
+
+def _process_document_args(args: Tuple[str, Optional[str], str, str, Optional[int], bool,
+                                       Optional[str], int, Optional[str], Optional[str], RuleProfile,
+                                       bool, bool, Optional[int]]) -> FileResult:
+    return process_document(*args)
+
+
+def run_batch(paths: List[Path], output_dir: Optional[str], jobs: int,
+              report_format: str = "text", mode: str = AnalysisMode.FULL,
+              max_issues: Optional[int] = None, prescan: bool = False,
+              cache_dir: Optional[str] = None, cache_size: int = DEFAULT_MAX_BYTES,
+              state_dir: Optional[str] = None, metrics_file: Optional[str] = None,
+              profile: RuleProfile = DEFAULT_PROFILE, comments: bool = False,
+              pages: bool = False, chunked: Optional[int] = None) -> List[FileResult]:
+    """
+    Process documents, in parallel when jobs > 1, and return one result
+    per document in input order. The outputs of each document are written
+    to the folder output_dirs gives for it.
+    """
+    tasks = [(str(path), folder, report_format, mode, max_issues, prescan, cache_dir, cache_size, state_dir,
+              metrics_file, profile, comments, pages, chunked)
+             for path, folder in zip(paths, output_dirs(paths, output_dir))]
+    if jobs <= 1 or len(tasks) <= 1:
+        return [_process_document_args(task) for task in tasks]
+
+    # Bigger chunks reduce inter-process overhead on large batches of small files
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_process_document_args, tasks, chunksize=chunksize))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check and auto-fix formatting of .docx documents.")
+    parser.add_argument("paths", nargs="+", help=".docx files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="folder for output files (default: next to each document)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-f", "--report-format", choices=sorted(REPORT_FORMATS), default="text",
+                        help="report file format (default: text)")
+    parser.add_argument("-m", "--mode", choices=[m.value for m in AnalysisMode], default=AnalysisMode.FULL.value,
+                        help="full: report, checked and fixed copies; report: report only; "
+                             "highlight: report and checked copy; fix: fixed copy only (default: full)")
+    parser.add_argument("--max-issues", type=int,
+                        help="stop checking a document after this many issues (fail fast)")
+    parser.add_argument("--prescan", action="store_true",
+                        help="pre-scan the raw XML and run the checks only on suspicious parts")
+    parser.add_argument("--cache-dir", help="reuse results of previously analyzed identical documents from this folder")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="maximum size of the result cache in MB (default: %(default)s)")
+    parser.add_argument("--state-dir",
+                        help="keep per-paragraph results in this folder and re-check only paragraphs "
+                             "changed since the previous run of the same document")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="append stage timings and counters of every document to FILE (JSON Lines)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="check against the rule profile in FILE (.json or .toml) instead of the default rules")
+    parser.add_argument("--comments", action="store_true",
+                        help="add a Word comment listing the issues to every highlighted paragraph")
+    parser.add_argument("--pages", action="store_true",
+                        help="report the estimated page of every issue and the number of issues per page")
+    parser.add_argument("--chunked", type=int, nargs="?", const=DEFAULT_CHUNK_BLOCKS, metavar="BLOCKS",
+                        help="process the body BLOCKS paragraphs and tables at a time, in bounded memory "
+                             "(default: %(const)s)")
+    args = parser.parse_args(argv)
+    if args.chunked is not None:
+        if args.chunked < 1:
+            parser.error("--chunked needs a positive number of blocks")
+        for option in ("max_issues", "prescan", "cache_dir", "state_dir", "comments", "pages"):
+            if getattr(args, option):
+                parser.error(f"--chunked cannot be combined with --{option.replace('_', '-')}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        try:
+            profile = load_profile(args.profile)
+        except (OSError, ValueError) as exc:
+            print(f"Cannot load profile: {exc}", file=sys.stderr)
+            return 2
+
+    paths = collect_documents(args.paths)
+    if not paths:
+        print("No .docx documents found.", file=sys.stderr)
+        return 2
+    collisions = output_collisions(paths, output_dirs(paths, args.output_dir))
+    if collisions:
+        for first, second in collisions:
+            print(f"Outputs of {first} and {second} would have the same names.", file=sys.stderr)
+        return 2
+    if args.state_dir:
+        Path(args.state_dir).mkdir(parents=True, exist_ok=True)
+
+    results = run_batch(paths, args.output_dir, args.jobs, args.report_format, args.mode, args.max_issues,
+                        args.prescan, args.cache_dir, args.cache_size * 1024 * 1024,
+                        args.state_dir, args.metrics, profile, args.comments, args.pages, args.chunked)
+
+    failed = 0
+    with_issues = 0
+    total_issues = 0
+    for docx_path, issues, error in results:
+        if error:
+            failed += 1
+            print(f"ERROR  {docx_path}: {error}")
+        elif args.mode == AnalysisMode.FIX:
+            print(f"FIXED  {docx_path}")
+        elif issues:
+            with_issues += 1
+            total_issues += issues
+            print(f"ISSUES {docx_path}: {issues}")
+        else:
+            print(f"OK     {docx_path}")
+
+    print(f"\nDocuments processed: {len(results)}")
+    if args.mode != AnalysisMode.FIX:
+        print(f"Conforming: {len(results) - with_issues - failed}")
+        print(f"With issues: {with_issues} (total issues: {total_issues})")
+    print(f"Failed: {failed}")
+
+    if failed:
+        return 2
+    return 1 if with_issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
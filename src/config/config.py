@@ -2,19 +2,75 @@
 config/config.py
 
 Configuration module for report checking project.
-Contains global constants and platform-specific environment setup.
+Contains report records, the default rule settings and platform-specific environment setup.
 """
 
 import sys
 import os
-from typing import Dict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional, Union
+
+
+# -----------------------------
+# Report records
+# -----------------------------
+@dataclass(slots=True)
+class IssueLocation:
+    """
+    Where an issue was found. Fields that do not apply are None.
+
+    paragraph_index is the index among top-level body paragraphs, or the
+    index of the paragraph inside its cell when table_index is set.
+    Tables are numbered in document order, nested tables included.
+    Outside the body, story is the kind of story ("header", "footer",
+    "footnote", "endnote" or "textbox") and story_index its number among
+    the stories of that kind; paragraphs and tables are then numbered
+    within the story.
+    page is the estimated page (1-based) of body paragraphs and sections,
+    set only when pages are estimated (see docx_utils.layout).
+    """
+    paragraph_index: Optional[int] = None
+    run_index: Optional[int] = None
+    table_index: Optional[int] = None
+    row_index: Optional[int] = None
+    cell_index: Optional[int] = None
+    section_index: Optional[int] = None
+    story: Optional[str] = None
+    story_index: Optional[int] = None
+    page: Optional[int] = None
+
+
+@dataclass(slots=True)
+class ReportItem:
+    """
+    A single formatting issue. Holds only plain values (no python-docx
+    objects), so it can be pickled, cached and sent between processes.
+
+    rule is a stable identifier such as "font.size" or "margin.top";
+    text is the offending fragment and paragraph_text its context.
+    """
+    rule: str
+    reason: str
+    text: str = ""
+    paragraph_text: str = ""
+    expected: Union[str, float, None] = None
+    actual: Union[str, float, None] = None
+    location: IssueLocation = field(default_factory=IssueLocation)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReportItem":
+        return cls(**{**data, "location": IssueLocation(**data.get("location", {}))})
 
 
 # -----------------------------
 # Target font for the project
 # -----------------------------
+# The settings below are the rules of the default profile
+# (config.profiles.DEFAULT_PROFILE); other standards are loaded as profiles.
 TARGET_FONT = "Times New Roman"
-ReportItem = Dict[str, object]   # {"run": Run, "paragraph_text": str, "reason": str}
 
 # Font size constraints
 MIN_FONT_SIZE = 12
@@ -37,10 +93,19 @@ RIGHT_INDENT_CM = 0
 # Line spacing requirement
 LINE_SPACING = 1.5
 
+
 # -----------------------------
 # Configure Tcl/Tk environment on Windows
 # -----------------------------
-if sys.platform == "win32":
+def configure_gui_environment() -> None:
+    """
+    Prepare the process for the Tkinter GUI on Windows: Tcl/Tk paths and
+    High DPI awareness. Called by main.py before importing tkinter, so the
+    headless entry points (cli.py, server.py) do not run it on import.
+    """
+    if sys.platform != "win32":
+        return
+
     # Set environment variables for Tcl/Tk
     os.environ["TCL_LIBRARY"] = r"C:\Users\user\AppData\Local\Programs\Python\Python313\tcl\tcl8.6"
     os.environ["TK_LIBRARY"] = r"C:\Users\user\AppData\Local\Programs\Python\Python313\tcl\tk8.6"
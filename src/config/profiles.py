@@ -0,0 +1,234 @@
+"""
+config/profiles.py
+
+Rule profiles: the formatting standard a document is checked against.
+The module-level constants in config.config form the default profile;
+other standards are loaded from JSON or TOML files with the same settings
+in lower case, e.g.
+
+    name = "engineering"
+    target_font = "Arial"
+    min_font_size = 11
+    max_font_size = 12
+    left_margin_cm = 3
+
+Settings missing from a file keep their default. A profile is compiled
+once into an immutable RuleProfile holding the values the checkers and
+fixers compare against (lengths in EMU, the compiled title page pattern),
+so nothing is converted per paragraph. Profiles are picklable and can be
+sent to worker processes with each document.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Pattern, Tuple, Union
+from config.config import (
+    TARGET_FONT,
+    MIN_FONT_SIZE,
+    MAX_FONT_SIZE,
+    TITLE_PAGE_PATTERN,
+    TOP_MARGIN_CM,
+    BOTTOM_MARGIN_CM,
+    LEFT_MARGIN_CM,
+    RIGHT_MARGIN_CM,
+    FIRST_LINE_INDENT_CM,
+    LEFT_INDENT_CM,
+    RIGHT_INDENT_CM,
+    LINE_SPACING
+)
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+
+# Units of python-docx lengths (docx.shared), kept here so that loading a
+# profile does not import python-docx
+EMU_PER_CM = 360000
+EMU_PER_PT = 12700
+EMU_PER_TWIP = 635
+
+# Indents within 0.01 cm of the required value are accepted
+INDENT_TOLERANCE_EMU = EMU_PER_CM // 100
+# Margins are compared rounded to 0.01 cm
+MARGIN_TOLERANCE_EMU = EMU_PER_CM // 200
+
+
+def _emu(cm: float) -> int:
+    return int(round(cm * EMU_PER_CM))
+
+
+@dataclass(frozen=True)
+class RuleProfile:
+    """
+    A compiled, immutable set of formatting rules.
+
+    The settings are those of config.config; the attributes after them
+    are derived from the settings when the profile is created.
+
+    Attributes:
+        name: name of the profile, e.g. to select it in a request.
+        title_page_re: compiled title_page_pattern.
+        min_font_size_emu, max_font_size_emu: allowed font sizes in EMU.
+        margins_emu: (side, required cm, required EMU) of each page margin.
+        first_line_indent_emu, left_indent_emu, right_indent_emu: required indents in EMU.
+        line_spacing_emu: line spacing as stored in w:spacing (240ths of a line) in EMU.
+        fingerprint: stable text form of the settings, for cache keys.
+    """
+    name: str = "default"
+    target_font: str = TARGET_FONT
+    min_font_size: float = MIN_FONT_SIZE
+    max_font_size: float = MAX_FONT_SIZE
+    title_page_pattern: str = TITLE_PAGE_PATTERN
+    top_margin_cm: float = TOP_MARGIN_CM
+    bottom_margin_cm: float = BOTTOM_MARGIN_CM
+    left_margin_cm: float = LEFT_MARGIN_CM
+    right_margin_cm: float = RIGHT_MARGIN_CM
+    first_line_indent_cm: float = FIRST_LINE_INDENT_CM
+    left_indent_cm: float = LEFT_INDENT_CM
+    right_indent_cm: float = RIGHT_INDENT_CM
+    line_spacing: float = LINE_SPACING
+
+    title_page_re: Pattern = field(init=False, repr=False, compare=False)
+    min_font_size_emu: int = field(init=False, repr=False, compare=False)
+    max_font_size_emu: int = field(init=False, repr=False, compare=False)
+    margins_emu: Tuple[Tuple[str, float, int], ...] = field(init=False, repr=False, compare=False)
+    first_line_indent_emu: int = field(init=False, repr=False, compare=False)
+    left_indent_emu: int = field(init=False, repr=False, compare=False)
+    right_indent_emu: int = field(init=False, repr=False, compare=False)
+    line_spacing_emu: int = field(init=False, repr=False, compare=False)
+    fingerprint: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.min_font_size > self.max_font_size:
+            raise ValueError(f"min_font_size {self.min_font_size} is greater than "
+                             f"max_font_size {self.max_font_size}")
+        try:
+            title_page_re = re.compile(self.title_page_pattern)
+        except re.error as exc:
+            raise ValueError(f"invalid title_page_pattern: {exc}") from None
+
+        derived = {
+            "title_page_re": title_page_re,
+            "min_font_size_emu": int(round(self.min_font_size * EMU_PER_PT)),
+            "max_font_size_emu": int(round(self.max_font_size * EMU_PER_PT)),
+            "margins_emu": tuple((side, cm, _emu(cm)) for side, cm in (
+                ("top", self.top_margin_cm), ("bottom", self.bottom_margin_cm),
+                ("left", self.left_margin_cm), ("right", self.right_margin_cm))),
+            "first_line_indent_emu": _emu(self.first_line_indent_cm),
+            "left_indent_emu": _emu(self.left_indent_cm),
+            "right_indent_emu": _emu(self.right_indent_cm),
+            "line_spacing_emu": int(self.line_spacing * 240 * EMU_PER_TWIP),
+            # Same form as the rule fingerprint used before profiles existed, so
+            # the default profile keeps the cache keys and incremental states
+            "fingerprint": json.dumps({name.upper(): getattr(self, name) for name in RULE_FIELDS},
+                                      sort_keys=True, ensure_ascii=False),
+        }
+        for name, value in derived.items():
+            object.__setattr__(self, name, value)
+
+    def settings(self) -> Dict[str, Any]:
+        """
+        The settings of the profile, as accepted by profile_from_dict.
+        """
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def wrong_indent(self, value: Optional[int], expected_emu: int) -> bool:
+        """
+        True if an indent in EMU (None meaning 0) differs from expected_emu.
+        """
+        return abs((value or 0) - expected_emu) > INDENT_TOLERANCE_EMU
+
+    def wrong_font_size(self, size: int) -> bool:
+        return not (self.min_font_size_emu <= size <= self.max_font_size_emu)
+
+    def wrong_margin(self, value: Optional[int], expected_emu: int) -> bool:
+        """
+        True if a page margin in EMU (None meaning not set) differs from expected_emu.
+        """
+        return value is None or abs(value - expected_emu) >= MARGIN_TOLERANCE_EMU
+
+
+# Settings that affect analysis results (all but the name)
+RULE_FIELDS = tuple(f.name for f in fields(RuleProfile) if f.init and f.name != "name")
+
+_FIELD_TYPES = {f.name: f.type for f in fields(RuleProfile) if f.init}
+
+DEFAULT_PROFILE = RuleProfile()
+
+
+def profile_from_dict(data: Mapping[str, Any], name: Optional[str] = None) -> RuleProfile:
+    """
+    Compile rule settings into a RuleProfile; missing settings keep their default.
+
+    Args:
+        data: settings by lower-case name, as in a profile file.
+        name: name used if data has none.
+
+    Raises:
+        ValueError: unknown settings, values of the wrong type or an invalid pattern.
+    """
+    unknown = sorted(set(data) - set(_FIELD_TYPES))
+    if unknown:
+        raise ValueError(f"unknown rule settings: {', '.join(unknown)}")
+
+    settings = {}
+    for key, value in data.items():
+        expected = _FIELD_TYPES[key]
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool) if expected is float \
+            else isinstance(value, expected)
+        if not valid:
+            raise ValueError(f"{key} must be a {'number' if expected is float else 'string'}, got {value!r}")
+        settings[key] = value
+    if name is not None:
+        settings.setdefault("name", name)
+    return RuleProfile(**settings)
+
+
+def load_profile(path: Union[str, Path]) -> RuleProfile:
+    """
+    Load a rule profile from a .json or .toml file.
+    The profile is named after the file unless the file sets a name.
+
+    Raises:
+        OSError: the file cannot be read.
+        ValueError: the file is not a valid profile.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+    elif suffix == ".toml":
+        if tomllib is None:
+            raise ValueError("TOML profiles need Python 3.11 or newer; use a .json profile")
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+    else:
+        raise ValueError(f"unsupported profile format: {path.name} (expected .json or .toml)")
+    if not isinstance(data, dict):
+        raise ValueError(f"{path.name}: a profile must be a table of settings")
+    try:
+        return profile_from_dict(data, name=path.stem)
+    except ValueError as exc:
+        raise ValueError(f"{path.name}: {exc}") from None
+
+
+def load_profiles(paths: Iterable[Union[str, Path]]) -> Dict[str, RuleProfile]:
+    """
+    Load several profiles, by name. The default profile is included as
+    "default" unless a file defines a profile of that name.
+
+    Raises:
+        ValueError: a file is not a valid profile, or two files define the same name.
+    """
+    profiles = {DEFAULT_PROFILE.name: DEFAULT_PROFILE}
+    loaded = set()
+    for path in paths:
+        profile = load_profile(path)
+        if profile.name in loaded:
+            raise ValueError(f"more than one profile is named {profile.name!r}")
+        loaded.add(profile.name)
+        profiles[profile.name] = profile
+    return profiles
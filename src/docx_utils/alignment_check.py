@@ -3,160 +3,248 @@ docx_utils/alignment_check.py
 
 Module for checking paragraph alignment and indentation in a DOCX document.
 Highlights runs with incorrect alignment in red and records discrepancies
-as tuples (run, reason) in the report list. Also checks first-line indentation
-for regular paragraphs (not in tables).
+as ReportItem records in the report list. Also checks first-line indentation
+for regular paragraphs (not in tables). All issues of a paragraph are
+collected before it is highlighted, so it is highlighted only once.
+With FormatColumns, paragraphs the column comparison found no violations
+in are skipped (see docx_utils.columns).
 """
 
-from typing import List
-from docx.shared import RGBColor, Cm
-from docx.table import Table
+from typing import List, Optional, Tuple, Union
 from docx.text.paragraph import Paragraph
 from docx.document import Document as DocumentObject
 from config.config import (
     ReportItem, 
-    TITLE_PAGE_PATTERN,
-    FIRST_LINE_INDENT_CM,
-    LEFT_INDENT_CM,
-    RIGHT_INDENT_CM,
-    LINE_SPACING
+    IssueLocation
 )
-import re
+from config.profiles import DEFAULT_PROFILE, RuleProfile
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx_utils.classification import (
+    ParagraphInfo,
+    ParagraphKind
+)
+from docx_utils.columns import BODY_TEXT_RULES, FORMAT_RULES, FormatColumns
+from docx_utils.font_check import Highlight
+from docx_utils.highlight import Highlighter, color_runs_red
+from docx_utils.styles import StyleResolver
+from docx_utils.traversal import DocumentVisitor, ParagraphContext, walk_document
 
 
-def highlight_alignment(paragraph: Paragraph, report: List[ReportItem], reason: str) -> None:
-    """
-    Highlight the entire paragraph in red and append a reasoned dictionary to report.
-    """
-    for run in paragraph.runs:
-        run.font.color.rgb = RGBColor(255, 0, 0)
-    report.append({
-        "run": paragraph.runs[0] if paragraph.runs else None,
-        "paragraph_text": paragraph.text,
-        "reason": reason
-    })
+# An issue found in a paragraph before it is reported:
+# reason, rule, expected value and actual value
+ParagraphIssue = Tuple[str, str, Union[str, float, None], Union[str, float, None]]
 
 
-def is_title_page(paragraphs: List[Paragraph], index: int) -> bool:
+def _report_paragraph_issues(paragraph: Paragraph, report: List[ReportItem], issues: List[ParagraphIssue],
+                             location: Optional[IssueLocation] = None,
+                             paragraph_text: Optional[str] = None,
+                             highlight: Highlight = True) -> None:
     """
-    Determine if a paragraph belongs to the title page based on TITLE_PAGE_PATTERN.
+    Append a ReportItem to report for every issue of the paragraph and
+    highlight the paragraph once for all of them.
     """
-    text = paragraphs[index].text.strip()
-    return bool(re.search(TITLE_PAGE_PATTERN, text))
-
-
-def is_image_caption(paragraph: Paragraph) -> bool:
+    if not issues:
+        return
+    runs = paragraph.runs
+    text = runs[0].text if runs else ""
+    if paragraph_text is None:
+        paragraph_text = paragraph.text
+    for reason, rule, expected, actual in issues:
+        report.append(ReportItem(
+            rule=rule,
+            reason=reason,
+            text=text,
+            paragraph_text=paragraph_text,
+            expected=expected,
+            actual=actual,
+            location=location if location is not None else IssueLocation()
+        ))
+        if isinstance(highlight, Highlighter):
+            highlight.mark_paragraph(paragraph, reason)
+    if highlight is True:
+        color_runs_red(runs)
+
+
+def highlight_alignment(paragraph: Paragraph, report: List[ReportItem], reason: str,
+                        rule: str = "alignment", expected: Union[str, float, None] = None,
+                        actual: Union[str, float, None] = None,
+                        location: Optional[IssueLocation] = None,
+                        paragraph_text: Optional[str] = None,
+                        highlight: Highlight = True) -> None:
     """
-    Check if the paragraph is a caption under an image (starts with 'Рис.').
+    Highlight the entire paragraph in red and append a ReportItem to report.
+    paragraph_text may be passed when the paragraph text is already known.
+    With highlight=False the issue is only recorded and the paragraph is left untouched;
+    with a Highlighter the paragraph is marked for highlighting after the check.
     """
-    text = paragraph.text.strip()
-    return bool(re.match(r"^Рис\.\s*\d*", text))
+    _report_paragraph_issues(paragraph, report, [(reason, rule, expected, actual)],
+                             location, paragraph_text, highlight)
 
 
-def is_table_caption(paragraph: Paragraph) -> bool:
-    """
-    Check if the paragraph is a caption above a table (starts with 'Табл.').
-    """
-    text = paragraph.text.strip()
-    return bool(re.match(r"^Табл\.\s*\d*", text))
+def _alignment_name(alignment: Optional[WD_ALIGN_PARAGRAPH]) -> Optional[str]:
+    return alignment.name if alignment is not None else None
 
 
-def check_paragraph_format(paragraph: Paragraph, report: List[ReportItem], check_first_line: bool = True) -> None:
+def _paragraph_format_issues(paragraph_format, check_first_line: bool,
+                             profile: RuleProfile) -> List[ParagraphIssue]:
     """
-    Check indentation and line spacing for a single paragraph.
-    Highlights issues in red and appends them to the report.
+    Indentation and line spacing issues of a paragraph format.
+    Indents are compared in EMU against the profile's precomputed values.
     """
+    issues: List[ParagraphIssue] = []
+
     # First-line indentation
     if check_first_line:
-        actual_first_line = paragraph.paragraph_format.first_line_indent
-        actual_first_cm = actual_first_line.cm if actual_first_line else 0.0
-        if abs(actual_first_cm - FIRST_LINE_INDENT_CM) > 1e-2:
-            highlight_alignment(paragraph, report,
-                f"First-line indentation should be {FIRST_LINE_INDENT_CM} cm (found {actual_first_cm:.2f} cm)")
+        actual_first_line = paragraph_format.first_line_indent
+        if profile.wrong_indent(actual_first_line, profile.first_line_indent_emu):
+            actual_first_cm = actual_first_line.cm if actual_first_line else 0.0
+            issues.append((
+                f"First-line indentation should be {profile.first_line_indent_cm} cm (found {actual_first_cm:.2f} cm)",
+                "indent.first_line", profile.first_line_indent_cm, round(actual_first_cm, 2)))
 
     # Left indent
-    actual_left_indent = paragraph.paragraph_format.left_indent
-    actual_left_cm = actual_left_indent.cm if actual_left_indent else 0.0
-    if abs(actual_left_cm - LEFT_INDENT_CM) > 1e-2:
-        highlight_alignment(paragraph, report,
-            f"Left indent should be {LEFT_INDENT_CM} cm (found {actual_left_cm:.2f} cm)")
+    actual_left_indent = paragraph_format.left_indent
+    if profile.wrong_indent(actual_left_indent, profile.left_indent_emu):
+        actual_left_cm = actual_left_indent.cm if actual_left_indent else 0.0
+        issues.append((
+            f"Left indent should be {profile.left_indent_cm} cm (found {actual_left_cm:.2f} cm)",
+            "indent.left", profile.left_indent_cm, round(actual_left_cm, 2)))
 
     # Right indent
-    actual_right_indent = paragraph.paragraph_format.right_indent
-    actual_right_cm = actual_right_indent.cm if actual_right_indent else 0.0
-    if abs(actual_right_cm - RIGHT_INDENT_CM) > 1e-2:
-        highlight_alignment(paragraph, report,
-            f"Right indent should be {RIGHT_INDENT_CM} cm (found {actual_right_cm:.2f} cm)")
+    actual_right_indent = paragraph_format.right_indent
+    if profile.wrong_indent(actual_right_indent, profile.right_indent_emu):
+        actual_right_cm = actual_right_indent.cm if actual_right_indent else 0.0
+        issues.append((
+            f"Right indent should be {profile.right_indent_cm} cm (found {actual_right_cm:.2f} cm)",
+            "indent.right", profile.right_indent_cm, round(actual_right_cm, 2)))
 
     # Line spacing
-    actual_line_spacing = paragraph.paragraph_format.line_spacing
+    actual_line_spacing = paragraph_format.line_spacing
     actual_spacing = actual_line_spacing if actual_line_spacing else 1.0
-    if abs(actual_spacing - LINE_SPACING) > 1e-2:
-        highlight_alignment(paragraph, report,
-            f"Line spacing should be {LINE_SPACING} (found {actual_spacing:.2f})")
+    if abs(actual_spacing - profile.line_spacing) > 1e-2:
+        issues.append((
+            f"Line spacing should be {profile.line_spacing} (found {actual_spacing:.2f})",
+            "spacing.line", profile.line_spacing, round(actual_spacing, 2)))
+
+    return issues
 
 
-def check_alignment_and_indent(docx: DocumentObject, report: List[ReportItem]) -> None:
+def check_paragraph_format(paragraph: Paragraph, report: List[ReportItem], check_first_line: bool = True,
+                           location: Optional[IssueLocation] = None,
+                           paragraph_text: Optional[str] = None,
+                           highlight: Highlight = True,
+                           styles: Optional[StyleResolver] = None,
+                           profile: RuleProfile = DEFAULT_PROFILE) -> None:
+    """
+    Check indentation and line spacing for a single paragraph.
+    Highlights issues in red and appends them to the report; the paragraph
+    is highlighted once, however many issues it has.
+    With a StyleResolver the effective (inherited) values are checked,
+    otherwise only the formatting set directly on the paragraph.
+    """
+    paragraph_format = styles.paragraph_format(paragraph._p) if styles is not None else paragraph.paragraph_format
+    _report_paragraph_issues(paragraph, report, _paragraph_format_issues(paragraph_format, check_first_line, profile),
+                             location, paragraph_text, highlight)
+
+
+def check_body_paragraph(paragraph: Paragraph, report: List[ReportItem],
+                         info: Optional[ParagraphInfo] = None,
+                         location: Optional[IssueLocation] = None,
+                         highlight: Highlight = True,
+                         styles: Optional[StyleResolver] = None,
+                         profile: RuleProfile = DEFAULT_PROFILE) -> None:
+    """
+    Check alignment, caption rules, indentation and line spacing
+    of a single top-level (non-table) paragraph outside the title page.
+    info is the paragraph's precomputed classification, if available.
+    All issues are collected first and the paragraph is highlighted once.
+    """
+    if info is None:
+        info = ParagraphInfo(paragraph.text)
+    if not info.stripped:
+        return
+    text = info.text
+    paragraph_format = styles.paragraph_format(paragraph._p) if styles is not None else paragraph.paragraph_format
+    alignment = paragraph_format.alignment
+    issues: List[ParagraphIssue] = []
+
+    # Image captions
+    if info.kind is ParagraphKind.IMAGE_CAPTION:
+        if alignment != WD_ALIGN_PARAGRAPH.CENTER:
+            issues.append(("Caption under image should be center aligned",
+                           "alignment.image_caption", "CENTER", _alignment_name(alignment)))
+    # Table captions
+    elif info.kind is ParagraphKind.TABLE_CAPTION:
+        if alignment != WD_ALIGN_PARAGRAPH.RIGHT:
+            issues.append(("Caption above table should be right aligned",
+                           "alignment.table_caption", "RIGHT", _alignment_name(alignment)))
+    # Normal text
+    elif alignment != WD_ALIGN_PARAGRAPH.JUSTIFY:
+        issues.append(("Normal text should be justified", "alignment.body", "JUSTIFY", _alignment_name(alignment)))
+
+    if info.is_caption:
+        # Check caption content
+        if not info.has_caption_text:
+            issues.append(("Caption must contain text after number", "caption.text", None, None))
+            _report_paragraph_issues(paragraph, report, issues, location, text, highlight)
+            return
+
+        # Check caption text format (plain)
+        for run in paragraph.runs:
+            font = styles.font(run._r, paragraph._p) if styles is not None else run.font
+            if font.bold or font.italic or font.underline:
+                issues.append(("Caption text must be plain (not bold, italic, or underlined)",
+                               "caption.plain", None, None))
+                break
+
+    # Check formatting (including first-line indentation)
+    issues.extend(_paragraph_format_issues(paragraph_format, True, profile))
+    _report_paragraph_issues(paragraph, report, issues, location, text, highlight)
+
+
+class AlignmentCheckVisitor(DocumentVisitor):
+    """
+    Traversal visitor checking alignment, indentation and line spacing.
+    Title page paragraphs are skipped; table paragraphs and paragraphs
+    outside the body (headers, footers, notes, text boxes) are checked
+    without the alignment and first-line indentation rules.
+    With highlight=False issues are only recorded, the document is not modified;
+    with a Highlighter, paragraphs are marked to be highlighted after the traversal.
+    With a StyleResolver, formatting inherited from styles is checked as well.
+    With FormatColumns extracted beforehand, paragraphs without violations are
+    skipped; captions are always checked.
+    """
+
+    def __init__(self, report: List[ReportItem], highlight: Highlight = True,
+                 styles: Optional[StyleResolver] = None, profile: RuleProfile = DEFAULT_PROFILE,
+                 columns: Optional[FormatColumns] = None):
+        self.report = report
+        self.highlight = highlight
+        self.styles = styles
+        self.profile = profile
+        self.columns = columns
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        columns = self.columns
+        if ctx.in_table or ctx.in_story:
+            if columns is not None and columns.paragraph_clean(ctx.paragraph._p, FORMAT_RULES):
+                return
+            check_paragraph_format(ctx.paragraph, self.report, check_first_line=False,
+                                   location=ctx.location(), paragraph_text=ctx.info.text,
+                                   highlight=self.highlight, styles=self.styles, profile=self.profile)
+        elif not ctx.in_title_page:
+            if (columns is not None and ctx.info.kind is ParagraphKind.BODY_TEXT
+                    and columns.paragraph_clean(ctx.paragraph._p, BODY_TEXT_RULES)):
+                return
+            check_body_paragraph(ctx.paragraph, self.report, ctx.info, ctx.location(), self.highlight,
+                                 self.styles, self.profile)
+
+
+def check_alignment_and_indent(docx: DocumentObject, report: List[ReportItem],
+                               profile: RuleProfile = DEFAULT_PROFILE) -> None:
     """
     Check all paragraphs and table cell paragraphs in a document for correct
-    alignment, indentation, and line spacing.
+    alignment, indentation, and line spacing, including inherited formatting.
     """
-    paragraphs = docx.paragraphs
-    skip_until_index = -1
-
-    # Detect the title page
-    for i, paragraph in enumerate(paragraphs):
-        if is_title_page(paragraphs, i):
-            skip_until_index = i
-            break
-
-    # Check regular paragraphs
-    for i, paragraph in enumerate(paragraphs):
-        if i <= skip_until_index:
-            continue  # skip title page
-
-        text = paragraph.text.strip()
-        if not text:
-            continue
-
-        # Image captions
-        if is_image_caption(paragraph):
-            if paragraph.alignment != WD_ALIGN_PARAGRAPH.CENTER:
-                highlight_alignment(paragraph, report, "Caption under image should be center aligned")
-        # Table captions
-        elif is_table_caption(paragraph):
-            if paragraph.alignment != WD_ALIGN_PARAGRAPH.RIGHT:
-                highlight_alignment(paragraph, report, "Caption above table should be right aligned")
-        # Normal text
-        elif paragraph.alignment != WD_ALIGN_PARAGRAPH.JUSTIFY:
-            highlight_alignment(paragraph, report, "Normal text should be justified")
-
-        if is_image_caption(paragraph) or is_table_caption(paragraph):
-            text = paragraph.text.strip()
-            # Check caption content
-            if is_image_caption(paragraph):
-                match = re.match(r"^Рис\.\s*\d+\.\s*(\S+.*)$", text)
-                if not match:
-                    highlight_alignment(paragraph, report, "Caption must contain text after number")
-                    continue
-            elif is_table_caption(paragraph):
-                match = re.match(r"^Табл\.\s*\d+\.\s*(\S+.*)$", text)
-                if not match:
-                    highlight_alignment(paragraph, report, "Caption must contain text after number")
-                    continue
-
-            # Check caption text format (plain)
-            for run in paragraph.runs:
-                if run.bold or run.italic or run.underline:
-                    highlight_alignment(paragraph, report, "Caption text must be plain (not bold, italic, or underlined)")
-                    break
-
-        # Check formatting (including first-line indentation)
-        check_paragraph_format(paragraph, report, check_first_line=True)
-
-    # Check paragraphs inside tables
-    for table in docx.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    check_paragraph_format(paragraph, report, check_first_line=False)
+    walk_document(docx, [AlignmentCheckVisitor(report, styles=StyleResolver.from_document(docx), profile=profile)],
+                  profile=profile)
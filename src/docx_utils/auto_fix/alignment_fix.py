@@ -2,86 +2,126 @@
 docx_utils/alignment_fix.py
 
 Module for fixing paragraph alignment, indentation, line spacing, and captions in a DOCX document.
+Only the values that alignment_check reports are written; conforming
+paragraphs are left untouched.
 """
 
-from docx.shared import Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.text.paragraph import Paragraph
 from docx.document import Document as DocumentObject
-import re
-from config.config import (
-    FIRST_LINE_INDENT_CM,
-    LEFT_INDENT_CM,
-    RIGHT_INDENT_CM,
-    LINE_SPACING,
-    TITLE_PAGE_PATTERN
+from typing import Optional
+from docx_utils.classification import (
+    ParagraphInfo,
+    ParagraphKind
 )
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.styles import StyleResolver
+from docx_utils.traversal import DocumentVisitor, ParagraphContext, walk_document
+from config.profiles import DEFAULT_PROFILE, RuleProfile
 
-def is_title_page(paragraphs, index) -> bool:
-    text = paragraphs[index].text.strip()
-    return bool(re.search(TITLE_PAGE_PATTERN, text))
-
-def is_image_caption(paragraph: Paragraph) -> bool:
-    text = paragraph.text.strip()
-    return bool(re.match(r"^Рис\.\s*\d*", text))
-
-def is_table_caption(paragraph: Paragraph) -> bool:
-    text = paragraph.text.strip()
-    return bool(re.match(r"^Табл\.\s*\d*", text))
-
-def fix_paragraph_format(paragraph: Paragraph, check_first_line: bool = True) -> None:
+def fix_paragraph_format(paragraph: Paragraph, check_first_line: bool = True,
+                         profile: RuleProfile = DEFAULT_PROFILE,
+                         styles: Optional[StyleResolver] = None) -> int:
     """
     Fix indentation and line spacing for a paragraph.
+    As in check_paragraph_format, the effective values are compared with a
+    StyleResolver, otherwise only the formatting set on the paragraph.
+
+    Returns:
+        int: Number of properties set.
     """
     fmt = paragraph.paragraph_format
-    if check_first_line:
-        fmt.first_line_indent = Cm(FIRST_LINE_INDENT_CM)
-    fmt.left_indent = Cm(LEFT_INDENT_CM)
-    fmt.right_indent = Cm(RIGHT_INDENT_CM)
-    fmt.line_spacing = LINE_SPACING
+    current = styles.paragraph_format(paragraph._p) if styles is not None else fmt
+    changed = 0
+    if check_first_line and profile.wrong_indent(current.first_line_indent, profile.first_line_indent_emu):
+        fmt.first_line_indent = profile.first_line_indent_emu
+        changed += 1
+    if profile.wrong_indent(current.left_indent, profile.left_indent_emu):
+        fmt.left_indent = profile.left_indent_emu
+        changed += 1
+    if profile.wrong_indent(current.right_indent, profile.right_indent_emu):
+        fmt.right_indent = profile.right_indent_emu
+        changed += 1
+    if abs((current.line_spacing or 1.0) - profile.line_spacing) > 1e-2:
+        fmt.line_spacing = profile.line_spacing
+        changed += 1
+    return changed
 
-def fix_alignment_and_indent(docx: DocumentObject) -> None:
+def fix_body_paragraph(paragraph: Paragraph, info: Optional[ParagraphInfo] = None,
+                       profile: RuleProfile = DEFAULT_PROFILE,
+                       styles: Optional[StyleResolver] = None) -> int:
     """
-    Fix all paragraphs and table cell paragraphs for alignment, indentation, and line spacing.
+    Fix alignment, caption formatting, indentation and line spacing
+    of a single top-level (non-table) paragraph outside the title page.
+    info is the paragraph's precomputed classification, if available.
+
+    Returns:
+        int: Number of properties set.
     """
-    paragraphs = docx.paragraphs
-    skip_until_index = -1
+    if info is None:
+        info = ParagraphInfo(paragraph.text)
+    if not info.stripped:
+        return 0
 
-    # Detect title page
-    for i, paragraph in enumerate(paragraphs):
-        if is_title_page(paragraphs, i):
-            skip_until_index = i
-            break
+    # Fix alignment
+    if info.kind is ParagraphKind.IMAGE_CAPTION:
+        alignment = WD_ALIGN_PARAGRAPH.CENTER
+    elif info.kind is ParagraphKind.TABLE_CAPTION:
+        alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    else:
+        alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    current = styles.paragraph_format(paragraph._p).alignment if styles is not None else paragraph.alignment
+    changed = 0
+    if current != alignment:
+        paragraph.alignment = alignment
+        changed += 1
 
-    for i, paragraph in enumerate(paragraphs):
-        if i <= skip_until_index:
-            continue  # skip title page
-        text = paragraph.text.strip()
-        if not text:
-            continue
+    # Fix caption text to be plain (remove bold/italic/underline)
+    if info.is_caption:
+        for run in paragraph.runs:
+            font = styles.font(run._r, paragraph._p) if styles is not None else run.font
+            for name in ("bold", "italic", "underline"):
+                if getattr(font, name):
+                    setattr(run, name, False)
+                    changed += 1
 
-        # Fix alignment
-        if is_image_caption(paragraph):
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        elif is_table_caption(paragraph):
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        else:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    # Fix indentation and line spacing
+    # check_first_line = not (is_image_caption(paragraph) or is_table_caption(paragraph))
+    return changed + fix_paragraph_format(paragraph, check_first_line=True, profile=profile, styles=styles)
+
+class AlignmentFixVisitor(DocumentVisitor):
+    """
+    Traversal visitor fixing alignment, indentation and line spacing.
+    With a StyleResolver, formatting inherited from styles is taken into account.
+
+    Attributes:
+        changes: the paragraphs changed so far.
+    """
 
-        # Fix caption text to be plain (remove bold/italic/underline)
-        if is_image_caption(paragraph) or is_table_caption(paragraph):
-            for run in paragraph.runs:
-                run.bold = False
-                run.italic = False
-                run.underline = False
+    def __init__(self, profile: RuleProfile = DEFAULT_PROFILE, styles: Optional[StyleResolver] = None,
+                 changes: Optional[FixChanges] = None):
+        self.profile = profile
+        self.styles = styles
+        self.changes = changes if changes is not None else FixChanges()
 
-        # Fix indentation and line spacing
-        # check_first_line = not (is_image_caption(paragraph) or is_table_caption(paragraph))
-        fix_paragraph_format(paragraph, check_first_line=True)
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        if ctx.in_table or ctx.in_story:
+            changed = fix_paragraph_format(ctx.paragraph, check_first_line=False, profile=self.profile,
+                                           styles=self.styles)
+        elif not ctx.in_title_page:
+            changed = fix_body_paragraph(ctx.paragraph, ctx.info, self.profile, self.styles)
+        else:
+            return
+        self.changes.add("paragraphs", ctx.paragraph._p, changed)
 
-    # Fix paragraphs inside tables
-    for table in docx.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    fix_paragraph_format(paragraph, check_first_line=False)
+def fix_alignment_and_indent(docx: DocumentObject, profile: RuleProfile = DEFAULT_PROFILE) -> FixChanges:
+    """
+    Fix all paragraphs and table cell paragraphs for alignment, indentation, and line spacing,
+    including inherited formatting.
+
+    Returns:
+        FixChanges: the changed paragraphs.
+    """
+    visitor = AlignmentFixVisitor(profile, StyleResolver.from_document(docx))
+    walk_document(docx, [visitor], profile=profile)
+    return visitor.changes
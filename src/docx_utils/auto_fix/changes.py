@@ -0,0 +1,58 @@
+"""
+docx_utils/auto_fix/changes.py
+
+Record of what an auto-fix changed.
+The fixers only write a property when the matching checker would report
+it, and record every element they wrote to. A document that already
+conforms is left untouched and its record stays empty.
+"""
+
+from typing import Dict, List, Set
+
+
+class FixChanges:
+    """
+    Elements changed by the fixers, by kind, in the order they were changed.
+    Elements are the XML elements of the fixed document: w:docDefaults and
+    w:style for styles, w:p, w:r and w:sectPr. An element is recorded once,
+    however many of its properties were changed.
+
+    Attributes:
+        styles, paragraphs, runs, sections: changed elements of each kind.
+        properties: number of properties removed or set.
+    """
+
+    KINDS = ("styles", "paragraphs", "runs", "sections")
+
+    def __init__(self):
+        self.styles: List = []
+        self.paragraphs: List = []
+        self.runs: List = []
+        self.sections: List = []
+        self.properties = 0
+        self._seen: Set = set()
+
+    def add(self, kind: str, element, properties: int = 1) -> None:
+        """
+        Record that properties properties of element were changed;
+        nothing is recorded if properties is 0.
+        """
+        if not properties:
+            return
+        self.properties += properties
+        if element not in self._seen:
+            self._seen.add(element)
+            getattr(self, kind).append(element)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of changed elements of each kind.
+        """
+        return {kind: len(getattr(self, kind)) for kind in self.KINDS}
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __repr__(self) -> str:
+        counts = ", ".join(f"{kind}={n}" for kind, n in self.counts().items())
+        return f"FixChanges({counts}, properties={self.properties})"
@@ -2,42 +2,91 @@
 docx_utils/font_fix.py
 
 Module for fixing fonts and font sizes in a DOCX document.
-Automatically sets all runs to the TARGET_FONT and a standard font size (e.g., 12pt).
+Sets runs with a wrong font to the profile's target font and runs with a
+wrong size to a standard font size (e.g., 12pt). Only the values that
+font_check reports are written; conforming runs are left untouched.
 """
 
-from docx.shared import Pt
-from config.config import TARGET_FONT, MIN_FONT_SIZE
+from typing import Optional
+from config.profiles import DEFAULT_PROFILE, RuleProfile
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 from docx.text.run import Run
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.highlight import HIGHLIGHT_COLOR
+from docx_utils.styles import StyleResolver
+from docx_utils.traversal import DocumentVisitor, ParagraphContext, iter_table_cells
 
 
-def fix_run_style(run: Run) -> None:
+def fix_run_style(run: Run, profile: RuleProfile = DEFAULT_PROFILE,
+                  styles: Optional[StyleResolver] = None,
+                  paragraph: Optional[Paragraph] = None) -> int:
     """
     Fix a single run to have the correct font family and size.
     Also resets any previous red highlighting.
+    As in check_run_style, the effective font is compared with a
+    StyleResolver (which needs the run's paragraph), otherwise only the
+    formatting set on the run.
+
+    Returns:
+        int: Number of properties set.
     """
-    run.font.name = TARGET_FONT
-    run.font.size = Pt(MIN_FONT_SIZE)  # Use minimum font size as standard
-    run.font.color.rgb = None  # Remove red highlighting if present
-    run.bold = False
-    run.italic = False
-    run.underline = False
+    font = run.font
+    current = styles.font(run._r, paragraph._p) if styles is not None else font
+    changed = 0
+    if current.name is not None and current.name != profile.target_font:
+        font.name = profile.target_font
+        changed += 1
+    if current.size is not None and profile.wrong_font_size(current.size):
+        font.size = profile.min_font_size_emu  # Use minimum font size as standard
+        changed += 1
+    if run._r.rPr is not None and run._r.rPr.color is not None and font.color.rgb == HIGHLIGHT_COLOR:
+        font.color.rgb = None  # Remove red highlighting
+        changed += 1
+    return changed
 
 
-def fix_paragraph_font(paragraph: Paragraph) -> None:
+def fix_paragraph_font(paragraph: Paragraph, profile: RuleProfile = DEFAULT_PROFILE,
+                       styles: Optional[StyleResolver] = None) -> int:
     """
     Fix all runs in a paragraph.
+
+    Returns:
+        int: Number of properties set.
     """
-    for run in paragraph.runs:
-        fix_run_style(run)
+    return sum(fix_run_style(run, profile, styles, paragraph) for run in paragraph.runs)
 
 
-def fix_table_font(table: Table) -> None:
+def fix_table_font(table: Table, profile: RuleProfile = DEFAULT_PROFILE,
+                   styles: Optional[StyleResolver] = None) -> int:
     """
     Fix all paragraphs inside all cells of a table.
+    Merged cells are fixed once; nested tables are included.
+
+    Returns:
+        int: Number of properties set.
+    """
+    changed = 0
+    for _, cell in iter_table_cells(table):
+        for paragraph in cell.paragraphs:
+            changed += fix_paragraph_font(paragraph, profile, styles)
+    return changed
+
+
+class FontFixVisitor(DocumentVisitor):
+    """
+    Traversal visitor fixing font family and size of every run.
+    With a StyleResolver, fonts inherited from styles are taken into account.
+
+    Attributes:
+        changes: the runs changed so far.
     """
-    for row in table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                fix_paragraph_font(paragraph)
+
+    def __init__(self, profile: RuleProfile = DEFAULT_PROFILE, styles: Optional[StyleResolver] = None,
+                 changes: Optional[FixChanges] = None):
+        self.profile = profile
+        self.styles = styles
+        self.changes = changes if changes is not None else FixChanges()
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        self.changes.add("runs", run._r, fix_run_style(run, self.profile, self.styles, ctx.paragraph))
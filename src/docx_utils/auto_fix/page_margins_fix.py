@@ -2,22 +2,63 @@
 docx_utils/page_margins_fix.py
 
 Module for fixing page margins in a DOCX document.
-Automatically sets all sections to the required margins.
+Sets the margins that page_margins reports to the required values;
+margins that are already right are left untouched.
 """
 
+from typing import Optional
 from docx.document import Document as DocumentObject
-from config.config import TOP_MARGIN_CM, BOTTOM_MARGIN_CM, LEFT_MARGIN_CM, RIGHT_MARGIN_CM
-from docx.shared import Cm
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx.section import Section
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.traversal import DocumentVisitor
 
-def fix_page_margins(docx: DocumentObject) -> None:
+def fix_section_margins(section: Section, profile: RuleProfile = DEFAULT_PROFILE) -> int:
+    """
+    Set the required page margins on a single section.
+
+    Args:
+        section: Section object to modify.
+        profile: rule profile with the required margins.
+
+    Returns:
+        int: Number of margins set.
+    """
+    changed = 0
+    for side, _, emu in profile.margins_emu:
+        name = f"{side}_margin"
+        if profile.wrong_margin(getattr(section, name), emu):
+            setattr(section, name, emu)
+            changed += 1
+    return changed
+
+class PageMarginsFixVisitor(DocumentVisitor):
+    """
+    Traversal visitor fixing the page margins of every section.
+
+    Attributes:
+        changes: the sections changed so far.
+    """
+
+    def __init__(self, profile: RuleProfile = DEFAULT_PROFILE, changes: Optional[FixChanges] = None):
+        self.profile = profile
+        self.changes = changes if changes is not None else FixChanges()
+
+    def visit_section(self, section: Section, index: int) -> None:
+        self.changes.add("sections", section._sectPr, fix_section_margins(section, self.profile))
+
+def fix_page_margins(docx: DocumentObject, profile: RuleProfile = DEFAULT_PROFILE) -> FixChanges:
     """
     Fix all sections of the document to have the required page margins.
-    
+
     Args:
         docx: Document object to modify.
+        profile: rule profile with the required margins.
+
+    Returns:
+        FixChanges: the changed sections.
     """
+    changes = FixChanges()
     for section in docx.sections:
-        section.top_margin = Cm(TOP_MARGIN_CM)
-        section.bottom_margin = Cm(BOTTOM_MARGIN_CM)
-        section.left_margin = Cm(LEFT_MARGIN_CM)
-        section.right_margin = Cm(RIGHT_MARGIN_CM)
+        changes.add("sections", section._sectPr, fix_section_margins(section, profile))
+    return changes
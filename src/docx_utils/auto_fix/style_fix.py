@@ -0,0 +1,460 @@
+"""
+docx_utils/auto_fix/style_fix.py
+
+Module for fixing formatting at the style level.
+The required font, size, alignment, indentation and line spacing are set
+once in the document defaults (w:docDefaults) and removed from the styles
+the paragraphs with issues use (by default, the styles any paragraph uses)
+where they override them with a wrong value, so paragraphs and runs inherit
+the correct formatting; styles nothing refers to are not touched. Direct
+formatting is then removed only where it violates a rule, and set
+explicitly only where inheritance cannot provide the required value (e.g.
+the alignment of captions).
+
+Formatting that already conforms, and emphasis outside captions, is left
+untouched, which keeps the fixed document close to the original. Every
+changed element is recorded in a FixChanges (see auto_fix.changes).
+"""
+
+from typing import Container, Optional, Sequence, Set
+from docx.document import Document as DocumentObject
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Emu, Length
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from config.profiles import DEFAULT_PROFILE, EMU_PER_TWIP, INDENT_TOLERANCE_EMU, RuleProfile
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.classification import DocumentClassification, ParagraphKind
+from docx_utils.highlight import HIGHLIGHT_COLOR
+from docx_utils.stories import iter_stories
+from docx_utils.styles import EffectiveParagraphFormat, StyleResolver, paragraph_props
+from docx_utils.traversal import DocumentVisitor, ParagraphContext
+
+_FONT_NAME_ATTRS = tuple(qn(f"w:{attr}") for attr in ("ascii", "hAnsi", "asciiTheme", "hAnsiTheme"))
+_EMPHASIS_TAGS = (qn("w:b"), qn("w:i"), qn("w:u"))
+_IND, _SPACING, _RFONTS = qn("w:ind"), qn("w:spacing"), qn("w:rFonts")
+# The properties set in the document defaults
+DEFAULT_PROPERTIES = ("name", "size", "alignment", "first_line_indent", "left_indent", "right_indent", "line_spacing")
+
+
+def _wrong_indent(value: Optional[Length], expected_emu: int) -> bool:
+    return value is not None and abs(value - expected_emu) > INDENT_TOLERANCE_EMU
+
+
+def _wrong_line_spacing(value, profile: RuleProfile) -> bool:
+    return value is not None and (isinstance(value, Length) or abs(value - profile.line_spacing) > 1e-2)
+
+
+def _wrong_font_name(name: Optional[str], profile: RuleProfile) -> bool:
+    return name is not None and name != profile.target_font
+
+
+def _wrong_size(size: Optional[Length], profile: RuleProfile) -> bool:
+    return size is not None and profile.wrong_font_size(size)
+
+
+def _expected_alignment(kind: ParagraphKind) -> WD_ALIGN_PARAGRAPH:
+    if kind is ParagraphKind.IMAGE_CAPTION:
+        return WD_ALIGN_PARAGRAPH.CENTER
+    if kind is ParagraphKind.TABLE_CAPTION:
+        return WD_ALIGN_PARAGRAPH.RIGHT
+    return WD_ALIGN_PARAGRAPH.JUSTIFY
+
+
+def _remove_if_empty(parent, tag: str) -> None:
+    """
+    Remove the child tag of parent if no attribute is left on it.
+    """
+    child = parent.find(tag)
+    if child is not None and not child.attrib and len(child) == 0:
+        parent.remove(child)
+
+
+def remove_wrong_paragraph_props(pPr, alignment: Optional[WD_ALIGN_PARAGRAPH] = None,
+                                 check_first_line: bool = True,
+                                 profile: RuleProfile = DEFAULT_PROFILE) -> Set[str]:
+    """
+    Remove the alignment (if it differs from alignment), indentation and
+    line spacing values set in a w:pPr element that violate the rules.
+
+    Returns:
+        Set[str]: Names of the removed properties.
+    """
+    removed: Set[str] = set()
+    if pPr is None:
+        return removed
+    props = paragraph_props(pPr)
+    if alignment is not None and props.get("alignment", alignment) != alignment:
+        pPr.jc_val = None
+        removed.add("alignment")
+    if check_first_line and _wrong_indent(props.get("first_line_indent"), profile.first_line_indent_emu):
+        pPr.first_line_indent = None
+        removed.add("first_line_indent")
+    if _wrong_indent(props.get("left_indent"), profile.left_indent_emu):
+        pPr.ind_left = None
+        removed.add("left_indent")
+    if _wrong_indent(props.get("right_indent"), profile.right_indent_emu):
+        pPr.ind_right = None
+        removed.add("right_indent")
+    if _wrong_line_spacing(props.get("line_spacing"), profile):
+        pPr.spacing_line = None
+        pPr.spacing_lineRule = None
+        removed.add("line_spacing")
+    if removed:
+        _remove_if_empty(pPr, _IND)
+        _remove_if_empty(pPr, _SPACING)
+    return removed
+
+
+def remove_wrong_run_props(rPr, styles: StyleResolver, plain: bool = False,
+                           profile: RuleProfile = DEFAULT_PROFILE) -> Set[str]:
+    """
+    Remove the font name and size set in a w:rPr element that violate the
+    rules, and with plain=True also bold, italic and underline.
+
+    Returns:
+        Set[str]: Names of the removed properties.
+    """
+    removed: Set[str] = set()
+    if rPr is None:
+        return removed
+    props = styles.run_props(rPr)
+    if _wrong_font_name(props.get("name"), profile):
+        rFonts = rPr.rFonts
+        for attr in _FONT_NAME_ATTRS:
+            rFonts.attrib.pop(attr, None)
+        _remove_if_empty(rPr, _RFONTS)
+        removed.add("name")
+    if _wrong_size(props.get("size"), profile):
+        rPr.sz_val = None
+        removed.add("size")
+    if plain:
+        for tag, name in zip(_EMPHASIS_TAGS, ("bold", "italic", "underline")):
+            if props.get(name):
+                rPr.remove(rPr.find(tag))
+                removed.add(name)
+    return removed
+
+
+def _set_if_different(element, name: str, value, tolerance: int = 0) -> int:
+    """
+    Set the property name of an oxml element unless it already has value.
+    Lengths within tolerance EMU of value count as equal, as the XML stores
+    them rounded (e.g. to twips).
+
+    Returns:
+        int: 1 if the property was set, else 0.
+    """
+    current = getattr(element, name)
+    if current == value or (tolerance and current is not None and abs(current - value) <= tolerance):
+        return 0
+    setattr(element, name, value)
+    return 1
+
+
+def _get_or_add(parent, tag: str, index: Optional[int] = None):
+    """
+    The child tag of parent, appended (or inserted at index) if missing.
+    """
+    child = parent.find(qn(tag))
+    if child is None:
+        child = OxmlElement(tag)
+        if index is None:
+            parent.append(child)
+        else:
+            parent.insert(index, child)
+    return child
+
+
+def _fix_doc_defaults(styles_element, profile: RuleProfile, names: Container[str] = DEFAULT_PROPERTIES) -> Set[str]:
+    """
+    Set the required formatting in w:docDefaults, creating it if missing.
+    Only the properties in names are looked at, and values that are
+    already right are not written again.
+
+    Returns:
+        Set[str]: Names of the changed properties.
+    """
+    changed: Set[str] = set()
+    if any(name in names for name in ("name", "size")):
+        doc_defaults = _get_or_add(styles_element, "w:docDefaults", 0)
+        rPr = _get_or_add(_get_or_add(doc_defaults, "w:rPrDefault", 0), "w:rPr")
+        rFonts = rPr.rFonts
+        if "name" in names and (
+                rFonts is None or rPr.rFonts_ascii != profile.target_font or rPr.rFonts_hAnsi != profile.target_font
+                or rFonts.get(qn("w:asciiTheme")) is not None or rFonts.get(qn("w:hAnsiTheme")) is not None):
+            rFonts = rPr.get_or_add_rFonts()
+            for attr in _FONT_NAME_ATTRS:
+                rFonts.attrib.pop(attr, None)
+            rPr.rFonts_ascii = profile.target_font
+            rPr.rFonts_hAnsi = profile.target_font
+            changed.add("name")
+        if "size" in names and (rPr.sz_val is None or _wrong_size(rPr.sz_val, profile)):
+            rPr.sz_val = profile.min_font_size_emu
+            changed.add("size")
+
+    required = (
+        ("alignment", "jc_val", WD_ALIGN_PARAGRAPH.JUSTIFY, 0),
+        ("first_line_indent", "first_line_indent", profile.first_line_indent_emu, EMU_PER_TWIP),
+        ("left_indent", "ind_left", profile.left_indent_emu, EMU_PER_TWIP),
+        ("right_indent", "ind_right", profile.right_indent_emu, EMU_PER_TWIP),
+        ("line_spacing", "spacing_line", profile.line_spacing_emu, EMU_PER_TWIP),
+        ("line_spacing", "spacing_lineRule", WD_LINE_SPACING.MULTIPLE, 0),
+    )
+    if any(name in names for name, *_ in required):
+        doc_defaults = _get_or_add(styles_element, "w:docDefaults", 0)
+        r_default = doc_defaults.find(qn("w:rPrDefault"))
+        p_default = _get_or_add(doc_defaults, "w:pPrDefault", 1 if r_default is not None else 0)
+        pPr = _get_or_add(p_default, "w:pPr")
+        for name, attr, value, tolerance in required:
+            # An unset indentation is no indentation
+            if name not in names or (attr.startswith("ind_") and value == 0 and getattr(pPr, attr) is None):
+                continue
+            if _set_if_different(pPr, attr, value, tolerance):
+                changed.add(name)
+    return changed
+
+
+def _inherited_from_defaults(styles_element, styles: StyleResolver, style_ids: Optional[Set[str]]) -> Set[str]:
+    """
+    Names of the properties that paragraphs of the given paragraph styles
+    inherit from w:docDefaults, because no style of their basedOn chain
+    sets them; all properties if there is no such paragraph style.
+    """
+    definitions = {style.get(qn("w:styleId")): style for style in styles_element.iterchildren(qn("w:style"))}
+    paragraph_styles = [style_id for style_id, style in definitions.items()
+                        if style.get(qn("w:type")) == "paragraph" and (style_ids is None or style_id in style_ids)]
+    if not paragraph_styles:
+        return set(DEFAULT_PROPERTIES)
+    inherited: Set[str] = set()
+    for style_id in paragraph_styles:
+        names: Set[str] = set()
+        for chain_id in styles.style_chain(style_id):
+            style = definitions.get(chain_id)
+            if style is None:
+                continue
+            names.update(paragraph_props(style.pPr))
+            rPr = style.rPr
+            if rPr is not None:
+                rFonts = rPr.rFonts
+                if rFonts is not None and any(rFonts.get(attr) is not None for attr in _FONT_NAME_ATTRS):
+                    names.add("name")
+                if rPr.sz_val is not None:
+                    names.add("size")
+        inherited.update(name for name in DEFAULT_PROPERTIES if name not in names)
+    return inherited
+
+
+def pin_paragraph_format(paragraph: Paragraph, before: EffectiveParagraphFormat,
+                         after: EffectiveParagraphFormat) -> int:
+    """
+    Keep the look of a paragraph the rules do not apply to: set directly
+    every property whose inherited value changed with the styles.
+
+    Returns:
+        int: Number of properties set.
+    """
+    fmt = paragraph.paragraph_format
+    changed = 0
+    # An unset property looks like its default: left aligned, no indentation, single line spacing
+    alignment = before.alignment if before.alignment is not None else WD_ALIGN_PARAGRAPH.LEFT
+    if alignment != (after.alignment if after.alignment is not None else WD_ALIGN_PARAGRAPH.LEFT):
+        fmt.alignment = alignment
+        changed += 1
+    for name in ("first_line_indent", "left_indent", "right_indent"):
+        value = getattr(before, name) or Emu(0)
+        if value != (getattr(after, name) or 0):
+            setattr(fmt, name, value)
+            changed += 1
+    line_spacing = before.line_spacing if before.line_spacing is not None else 1.0
+    if line_spacing != (after.line_spacing if after.line_spacing is not None else 1.0):
+        fmt.line_spacing = line_spacing
+        changed += 1
+    return changed
+
+
+def used_styles(docx: DocumentObject, styles: StyleResolver) -> Set[str]:
+    """
+    Ids of the styles the paragraphs of the body, headers, footers and
+    notes inherit formatting from (see StyleResolver.referenced_styles).
+    """
+    style_ids: Set[str] = set()
+    for element in [docx.element.body] + [story.element for story in iter_stories(docx)]:
+        for p in element.iter(qn("w:p")):
+            style_ids.update(styles.referenced_styles(p))
+    return style_ids
+
+
+def fix_styles(docx: DocumentObject, paragraphs: Sequence[Paragraph],
+               classification: DocumentClassification,
+               profile: RuleProfile = DEFAULT_PROFILE,
+               changes: Optional[FixChanges] = None,
+               style_ids: Optional[Set[str]] = None) -> StyleResolver:
+    """
+    Fix formatting at the style level: set the required formatting in the
+    document defaults and remove wrong values from the given styles.
+    Caption styles lose bold, italic and underline; table styles get no
+    first-line indentation. Title page paragraphs keep their previous look.
+
+    Args:
+        docx: Document to fix.
+        paragraphs: top-level body paragraphs of docx.
+        classification: classification of these paragraphs.
+        profile: rule profile with the required formatting.
+        changes: records the changed styles and title page paragraphs.
+        style_ids: ids of the styles to fix, e.g. those of the paragraphs
+            with issues (see IssueBlocksVisitor); if omitted, the styles
+            used by the paragraphs of the document (see used_styles).
+            Nothing is changed if empty.
+
+    Returns:
+        StyleResolver: resolver for the fixed styles.
+    """
+    styles_before = StyleResolver.from_document(docx)
+    title_page = paragraphs[:classification.title_page_end + 1]
+    title_page_formats = [styles_before.paragraph_format(p._p) for p in title_page]
+
+    caption_styles: Set[Optional[str]] = set()
+    for index, paragraph in enumerate(paragraphs):
+        if index > classification.title_page_end and classification[index].is_caption:
+            caption_styles.add(paragraph.style.style_id)
+
+    if changes is None:
+        changes = FixChanges()
+    if style_ids is None:
+        style_ids = used_styles(docx, styles_before)
+    fix_style_definitions(docx.styles.element, styles_before, caption_styles, profile, changes, style_ids)
+
+    styles = StyleResolver.from_document(docx)
+    for paragraph, before in zip(title_page, title_page_formats):
+        changes.add("paragraphs", paragraph._p,
+                    pin_paragraph_format(paragraph, before, styles.paragraph_format(paragraph._p)))
+    return styles
+
+
+def fix_style_definitions(styles_element, styles_before: StyleResolver, caption_styles: Set[Optional[str]],
+                          profile: RuleProfile = DEFAULT_PROFILE, changes: Optional[FixChanges] = None,
+                          style_ids: Optional[Set[str]] = None) -> None:
+    """
+    The style level part of fix_styles, on the w:styles element of a
+    styles part: set the required formatting in the document defaults and
+    remove wrong values from the given styles.
+
+    Args:
+        styles_element: root of the styles part, fixed in place.
+        styles_before: resolver of the styles before the fix.
+        caption_styles: ids of the paragraph styles used by captions.
+        profile: rule profile with the required formatting.
+        changes: records the changed styles.
+        style_ids: ids of the styles to fix; all styles if omitted. With an
+            empty set, the document defaults are not changed either.
+    """
+    if changes is None:
+        changes = FixChanges()
+    if style_ids is not None and not style_ids:
+        return
+    table_styles = []
+    for style in styles_element.iterchildren(qn("w:style")):
+        if style_ids is not None and style.get(qn("w:styleId")) not in style_ids:
+            continue
+        style_type = style.get(qn("w:type"))
+        changed = len(remove_wrong_run_props(style.rPr, styles_before,
+                                             style.get(qn("w:styleId")) in caption_styles, profile))
+        if style_type == "paragraph":
+            changed += len(remove_wrong_paragraph_props(style.pPr, WD_ALIGN_PARAGRAPH.JUSTIFY, profile=profile))
+        elif style_type == "table":
+            changed += len(remove_wrong_paragraph_props(style.pPr, check_first_line=False, profile=profile))
+            table_styles.append(style)
+        changes.add("styles", style, changed)
+
+    # The defaults only matter for what the fixed styles leave unset
+    defaults = _fix_doc_defaults(styles_element, profile,
+                                 _inherited_from_defaults(styles_element, styles_before, style_ids))
+    changes.add("styles", styles_element.find(qn("w:docDefaults")), len(defaults))
+    if "first_line_indent" in defaults:
+        # Table paragraphs get no first-line indentation from the new defaults
+        for style in table_styles:
+            changes.add("styles", style, _set_if_different(style.get_or_add_pPr(), "first_line_indent", Emu(0)))
+
+
+class StyleFixVisitor(DocumentVisitor):
+    """
+    Traversal visitor removing direct formatting that violates the rules,
+    to be run after fix_styles with the resolver it returned. Where the
+    inherited value is still wrong, the required value is set directly.
+    Red highlighting left by a previous check is removed.
+
+    Attributes:
+        changes: the paragraphs and runs changed so far.
+    """
+
+    def __init__(self, styles: StyleResolver, profile: RuleProfile = DEFAULT_PROFILE,
+                 changes: Optional[FixChanges] = None):
+        self.styles = styles
+        self.profile = profile
+        self.changes = changes if changes is not None else FixChanges()
+        self._plain = False
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        p = ctx.paragraph._p
+        self._plain = False
+        if ctx.in_table or ctx.in_story:
+            changed = remove_wrong_paragraph_props(p.pPr, check_first_line=False, profile=self.profile)
+            changed |= self._set_wrong_format(ctx.paragraph, check_first_line=False)
+        elif not ctx.in_title_page and ctx.info.stripped:
+            alignment = _expected_alignment(ctx.info.kind)
+            self._plain = ctx.info.is_caption
+            changed = remove_wrong_paragraph_props(p.pPr, alignment, profile=self.profile)
+            changed |= self._set_wrong_format(ctx.paragraph, alignment=alignment)
+        else:
+            return
+        # A wrong value replaced by the required one is one changed property
+        self.changes.add("paragraphs", p, len(changed))
+
+    def _set_wrong_format(self, paragraph: Paragraph, check_first_line: bool = True,
+                          alignment: Optional[WD_ALIGN_PARAGRAPH] = None) -> Set[str]:
+        effective = self.styles.paragraph_format(paragraph._p)
+        fmt = paragraph.paragraph_format
+        profile = self.profile
+        changed: Set[str] = set()
+        if alignment is not None and effective.alignment != alignment:
+            fmt.alignment = alignment
+            changed.add("alignment")
+        if check_first_line and (effective.first_line_indent is None
+                                 or _wrong_indent(effective.first_line_indent, profile.first_line_indent_emu)):
+            fmt.first_line_indent = profile.first_line_indent_emu
+            changed.add("first_line_indent")
+        if _wrong_indent(effective.left_indent, profile.left_indent_emu):
+            fmt.left_indent = profile.left_indent_emu
+            changed.add("left_indent")
+        if _wrong_indent(effective.right_indent, profile.right_indent_emu):
+            fmt.right_indent = profile.right_indent_emu
+            changed.add("right_indent")
+        if effective.line_spacing is None or _wrong_line_spacing(effective.line_spacing, profile):
+            fmt.line_spacing = profile.line_spacing
+            changed.add("line_spacing")
+        return changed
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        r = run._r
+        changed = remove_wrong_run_props(r.rPr, self.styles, self._plain, self.profile)
+        font = run.font
+        if r.rPr is not None and r.rPr.color is not None and font.color.rgb == HIGHLIGHT_COLOR:
+            font.color.rgb = None
+            changed.add("color")
+
+        effective = self.styles.font(r, ctx.paragraph._p)
+        if _wrong_font_name(effective.name, self.profile):
+            font.name = self.profile.target_font
+            changed.add("name")
+        if _wrong_size(effective.size, self.profile):
+            font.size = self.profile.min_font_size_emu
+            changed.add("size")
+        if self._plain:
+            for name in ("bold", "italic", "underline"):
+                if getattr(effective, name):
+                    setattr(font, name, False)
+                    changed.add(name)
+        self.changes.add("runs", r, len(changed))
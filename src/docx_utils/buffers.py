@@ -0,0 +1,91 @@
+"""
+docx_utils/buffers.py
+
+In-memory input and output of DOCX documents.
+Documents can be read from a path, from bytes-like objects (bytes,
+bytearray, memoryview) or from binary file objects, and written to bytes,
+so callers that receive documents from a queue or a socket need no
+temporary files. Bytes-like inputs are wrapped without copying them.
+"""
+
+import io
+import os
+from typing import IO, Union
+
+
+# Where a document can be read from: a path, its contents or a binary file object
+DocxSource = Union[str, os.PathLike, bytes, bytearray, memoryview, IO[bytes]]
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable binary file over a bytes-like object, without copying it.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        end = min(self._position + len(b), len(self._view))
+        n = end - self._position
+        b[:n] = self._view[self._position:end]
+        self._position = end
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def open_source(source: DocxSource) -> Union[str, IO[bytes]]:
+    """
+    Turn a DocxSource into something python-docx and zipfile can open:
+    a path string or a seekable binary file object positioned at the
+    start of the document.
+
+    Bytes are wrapped in a BytesIO, which shares their buffer; bytearrays
+    and memoryviews are read through a BufferReader. A non-seekable file
+    object (e.g. a pipe) is read into memory once.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return BufferReader(source)
+    if not source.seekable():
+        return io.BytesIO(source.read())
+    return source
+
+
+def read_once(source: Union[str, IO[bytes]]) -> IO[bytes]:
+    """
+    A file object for an opened source that is read several times (e.g.
+    pre-scanned and then parsed): a file on disk is read into memory once
+    instead of being opened again for each reader.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return io.BytesIO(f.read())
+    return source
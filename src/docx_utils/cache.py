@@ -0,0 +1,202 @@
+"""
+docx_utils/cache.py
+
+On-disk cache of analysis results for repeated submissions.
+Entries are keyed by a hash of the document bytes, the rule settings from
+config/config.py and the analysis options, so a resubmitted unchanged
+document is answered without parsing it, while any change to the document
+or to the rules is a cache miss. Each entry stores the report and the
+checked and fixed documents that were built. The cache is bounded in size;
+least recently used entries are evicted first.
+
+Layout: <cache dir>/<key>/report.jsonl, checked.docx, fixed.docx.
+Entries are written to a temporary folder and renamed into place, so
+several worker processes can share one cache directory.
+
+python-docx is imported only on a cache miss, so answering a resubmitted
+document does not pay for loading it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Union
+from config.config import ReportItem
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx_utils.instrumentation import active_instrumentation
+from docx_utils.modes import AnalysisMode
+
+if TYPE_CHECKING:
+    from docx.document import Document as DocumentObject
+    from docx_utils.incremental import IncrementalState
+
+
+# Bump when the stored format or the checks change in a way that
+# makes existing entries invalid
+CACHE_FORMAT_VERSION = 5
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+REPORT_FILE = "report.jsonl"
+CHECKED_FILE = "checked.docx"
+FIXED_FILE = "fixed.docx"
+
+
+class CachedResult(NamedTuple):
+    """
+    Result of an analysis as stored in the cache: the report and the
+    serialized checked and fixed documents (None if not built).
+    """
+    report: List[ReportItem]
+    checked: Optional[bytes]
+    fixed: Optional[bytes]
+
+
+def document_bytes(docx: Optional["DocumentObject"]) -> Optional[bytes]:
+    """
+    Serialize a Document to .docx bytes, or return None for no document.
+    """
+    if docx is None:
+        return None
+    from docx_utils.docx_operations import save_docx
+    return save_docx(docx)
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of CachedResult entries.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, data: bytes, mode: Union[AnalysisMode, str] = AnalysisMode.FULL,
+            max_issues: Optional[int] = None, profile: RuleProfile = DEFAULT_PROFILE,
+            comments: bool = False, pages: bool = False, prescan: bool = False) -> str:
+        """
+        Cache key of a document's bytes analyzed with the given options
+        under the rules of profile. The pre-scan is part of the key since
+        it leaves out the fixed copy of a clean document.
+        """
+        digest = hashlib.sha256()
+        options = [CACHE_FORMAT_VERSION, AnalysisMode(mode).value, max_issues, profile.fingerprint]
+        if prescan:
+            options.append("prescan")
+        if comments:
+            options.append("comments")
+        if pages:
+            options.append("pages")
+        digest.update(json.dumps(options, ensure_ascii=False).encode("utf-8"))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """
+        Return the cached result for key, or None on a miss.
+        A hit marks the entry as recently used.
+        """
+        entry = self.directory / key
+        try:
+            with open(entry / REPORT_FILE, encoding="utf-8") as f:
+                report = [ReportItem.from_dict(json.loads(line)) for line in f]
+            checked = self._read_optional(entry / CHECKED_FILE)
+            fixed = self._read_optional(entry / FIXED_FILE)
+            os.utime(entry / REPORT_FILE)
+        except (OSError, ValueError, TypeError):
+            return None  # missing, evicted meanwhile or corrupt
+        return CachedResult(report, checked, fixed)
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """
+        Store a result and evict old entries if the cache grew too big.
+        """
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.directory))
+        try:
+            with open(tmp / REPORT_FILE, "w", encoding="utf-8") as f:
+                for issue in result.report:
+                    f.write(json.dumps(issue.to_dict(), ensure_ascii=False))
+                    f.write("\n")
+            if result.checked is not None:
+                (tmp / CHECKED_FILE).write_bytes(result.checked)
+            if result.fixed is not None:
+                (tmp / FIXED_FILE).write_bytes(result.fixed)
+            os.rename(tmp, self.directory / key)
+        except OSError:
+            # Another process stored the same entry first, or the disk is full
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        total = 0
+        for entry in self.directory.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                files = list(entry.iterdir())
+                size = sum(f.stat().st_size for f in files)
+                last_used = (entry / REPORT_FILE).stat().st_mtime
+            except OSError:
+                continue
+            entries.append((last_used, size, entry))
+            total += size
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    def _read_optional(path: Path) -> Optional[bytes]:
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+
+def cached_analyze_docx(docx_path: Union[str, Path], cache: ResultCache,
+                        mode: Union[AnalysisMode, str] = AnalysisMode.FULL,
+                        max_issues: Optional[int] = None,
+                        prescan: bool = False,
+                        incremental: Optional["IncrementalState"] = None,
+                        profile: RuleProfile = DEFAULT_PROFILE,
+                        comments: bool = False, pages: bool = False) -> CachedResult:
+    """
+    analyze_docx through the cache. On a hit the document is not parsed.
+
+    Args:
+        docx_path: Path to the DOCX file.
+        cache: Cache to look up and store the result in.
+        mode, max_issues, prescan, incremental, profile, comments, pages: Passed to analyze_docx.
+
+    Returns:
+        CachedResult: The report and the serialized checked and fixed documents.
+    """
+    data = Path(docx_path).read_bytes()
+    key = cache.key(data, mode, max_issues, profile, comments, pages, prescan)
+    result = cache.get(key)
+    instrumentation = active_instrumentation()
+    if instrumentation is not None:
+        instrumentation.count("cache_misses" if result is None else "cache_hits")
+        if result is not None:
+            # A hit reports the same issues per rule as the analysis did
+            instrumentation.count_issues(result.report)
+    if result is None:
+        from docx_utils.docx_operations import analyze_docx
+        # The bytes read for the key are analyzed directly, the file is read only once
+        report, docx_checked, docx_fixed = analyze_docx(data, None, mode, max_issues, prescan, incremental,
+                                                        profile=profile, comments=comments, pages=pages)
+        result = CachedResult(report, document_bytes(docx_checked), document_bytes(docx_fixed))
+        cache.put(key, result)
+    return result
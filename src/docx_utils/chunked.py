@@ -0,0 +1,609 @@
+"""
+docx_utils/chunked.py
+
+Chunked processing of very large documents in bounded memory.
+analyze_docx builds the python-docx model of the whole document (twice in
+full mode), so its memory grows with the length of the document.
+analyze_docx_chunked streams the main document part instead: the body is
+parsed in windows of top-level paragraphs and tables, and each window is
+checked and highlighted, written to the output package and dropped before
+the next one is read. The fix, which only touches the styles and blocks
+with issues, reads the body a second time once the whole document was
+checked. Only the styles, one window of the body, the indices of the
+blocks with issues and, at the end, the headers, footers and notes are in
+memory at a time.
+
+A first streaming pass over the body finds what the windows need to know
+beforehand: the title page marker, the styles used by captions (the style
+fix changes them) and the headers and footers the sections refer to.
+The report has the same issues as the one of analyze_docx, in a different
+order: the margins of a section follow its last block, and the headers,
+footers, notes and their text boxes come last.
+
+Comments, max_issues, the pre-scan, incremental checks and page estimation
+are not available in chunked mode.
+"""
+
+import copy
+import os
+import shutil
+import zipfile
+from functools import partial
+from typing import IO, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from lxml import etree
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup, parse_xml
+from docx.section import Section
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx_utils.alignment_check import AlignmentCheckVisitor
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.auto_fix.page_margins_fix import PageMarginsFixVisitor
+from docx_utils.auto_fix.style_fix import StyleFixVisitor, fix_style_definitions, pin_paragraph_format
+from docx_utils.buffers import DocxSource, open_source
+from docx_utils.classification import ParagraphKind, StreamingClassification, caption_kind, paragraph_text
+from docx_utils.columns import FormatColumns
+from docx_utils.docx_operations import ReportSink
+from docx_utils.font_check import FontCheckVisitor
+from docx_utils.highlight import Highlighter
+from docx_utils.instrumentation import CountingReport, Instrumentation, active_instrumentation, measure
+from docx_utils.modes import DEFAULT_CHUNK_BLOCKS, AnalysisMode
+from docx_utils.page_margins import PageMarginsCheckVisitor
+from docx_utils.prescan import main_part_name, part_relationships
+from docx_utils.stories import Story
+from docx_utils.styles import StyleResolver
+from docx_utils.traversal import BodyWalker, CountingVisitor, DocumentVisitor, IssueBlocksVisitor, visit_story
+
+W_BODY, W_P, W_TBL, W_PPR, W_SECT_PR = qn("w:body"), qn("w:p"), qn("w:tbl"), qn("w:pPr"), qn("w:sectPr")
+W_TXBX_CONTENT, W_TYPE, R_ID = qn("w:txbxContent"), qn("w:type"), qn("r:id")
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_REFERENCES = {qn("w:headerReference"): "header", qn("w:footerReference"): "footer"}
+_NOTES = {RT.FOOTNOTES: "footnote", RT.ENDNOTES: "endnote"}
+
+# Bytes read from the package at a time
+READ_SIZE = 1 << 16
+
+# Where an output package is written to: a path or a binary file object
+DocxTarget = Union[str, os.PathLike, IO[bytes]]
+
+
+class _BodyScan(NamedTuple):
+    title_page_end: int
+    caption_styles: Set[Optional[str]]
+    references: List[Tuple[str, str]]  # (story kind, relationship id) of the header and footer references
+
+
+def _scan_body(package: zipfile.ZipFile, main_part: str, styles: StyleResolver, profile: RuleProfile) -> _BodyScan:
+    """
+    Stream the main document part once, keeping at most one top-level block in memory.
+    """
+    title_page_end = -1
+    captions: List[Tuple[int, Optional[str]]] = []
+    references: List[Tuple[str, str]] = []
+    index = 0
+    with package.open(main_part) as xml:
+        for _, elem in etree.iterparse(xml, tag=(W_P, W_TBL, W_SECT_PR), resolve_entities=False, huge_tree=True):
+            parent = elem.getparent()
+            if elem.tag == W_SECT_PR:
+                # The sections of the document: the last one and those ending with a body paragraph
+                if parent.tag == W_BODY or (parent.tag == W_PPR and parent.getparent().getparent().tag == W_BODY):
+                    references.extend((_REFERENCES[child.tag], child.get(R_ID))
+                                      for child in elem if child.tag in _REFERENCES)
+                continue
+            if parent.tag != W_BODY:
+                continue
+            if elem.tag == W_P:
+                text = paragraph_text(elem)
+                if title_page_end < 0 and profile.title_page_re.search(text):
+                    title_page_end = index
+                elif caption_kind(text.strip()) is not ParagraphKind.BODY_TEXT:
+                    captions.append((index, styles.paragraph_style_id(elem)))
+                index += 1
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+    caption_styles = {style_id for i, style_id in captions if i > title_page_end}
+    return _BodyScan(title_page_end, caption_styles, references)
+
+
+class _BodyReader:
+    """
+    Incremental parser of the main document part.
+
+    Attributes:
+        head: the serialized document up to the content of w:body, known
+            once the first window is read.
+        tail: the serialized document after the content of w:body.
+        nsmap: namespaces declared on w:body and its ancestors.
+    """
+
+    def __init__(self, xml: IO[bytes], chunk_blocks: int):
+        self.xml = xml
+        self.chunk_blocks = chunk_blocks
+        self.head = b""
+        self.tail = b""
+        self.nsmap: Dict[Optional[str], str] = {}
+
+    def _read_frame(self, body) -> None:
+        # The root with what precedes the body, and an empty body marking where the windows go
+        root = body.getparent()
+        shell = etree.Element(root.tag, dict(root.attrib), nsmap=root.nsmap)
+        for child in root:
+            if child is body:
+                break
+            shell.append(copy.deepcopy(child))
+        etree.SubElement(shell, body.tag, dict(body.attrib)).append(etree.Comment("body"))
+        self.head, self.tail = etree.tostring(shell, encoding="UTF-8", standalone=True).split(b"<!--body-->")
+        self.nsmap = body.nsmap
+
+    def windows(self) -> Iterator[List]:
+        """
+        Yield the children of w:body as python-docx elements, chunk_blocks
+        paragraphs and tables at a time. The elements of a window are
+        removed from the tree when the next one is requested, unless they
+        were moved out of it before (see serialize_window).
+        """
+        parser = etree.XMLPullParser(events=("start", "end"), remove_blank_text=True, resolve_entities=False,
+                                     huge_tree=True)
+        parser.set_element_class_lookup(element_class_lookup)
+        body = None
+        depth = 0
+        window: List = []
+        blocks = 0
+        for data in iter(partial(self.xml.read, READ_SIZE), b""):
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and elem.tag == W_BODY:
+                        body = elem
+                        self._read_frame(body)
+                    continue
+                depth -= 1
+                if depth != 2 or body is None or elem.getparent() is not body:
+                    continue
+                window.append(elem)
+                if elem.tag == W_P or elem.tag == W_TBL:
+                    blocks += 1
+                if blocks == self.chunk_blocks:
+                    yield window
+                    _drop(window, body)
+                    window, blocks = [], 0
+        parser.close()
+        if body is None:
+            raise ValueError("The main document part has no body")
+        if window:
+            yield window
+            _drop(window, body)
+
+
+def _drop(window: List, body) -> None:
+    for elem in window:
+        if elem.getparent() is body:
+            body.remove(elem)
+
+
+def serialize_window(elements: List, nsmap: Dict[Optional[str], str]) -> bytes:
+    """
+    Serialize consecutive body elements without repeating the namespace
+    declarations of the document on each of them (lxml declares them on
+    every element serialized on its own). The elements are moved out of
+    their tree.
+    """
+    wrapper = etree.Element(W_BODY, nsmap=nsmap)
+    wrapper.extend(elements)
+    data = etree.tostring(wrapper, encoding="UTF-8")
+    return data[data.index(b">") + 1:data.rindex(b"</")]
+
+
+def _sections(window: List) -> List:
+    sections = []
+    for elem in window:
+        if elem.tag == W_SECT_PR:
+            sections.append(elem)
+        elif elem.tag == W_P:
+            pPr = elem.find(W_PPR)
+            sectPr = pPr.find(W_SECT_PR) if pPr is not None else None
+            if sectPr is not None:
+                sections.append(sectPr)
+    return sections
+
+
+def _textboxes(elements: List) -> List:
+    # The VML copy of a text box (mc:Fallback) is skipped, as in iter_stories
+    return [textbox for elem in elements for textbox in elem.iter(W_TXBX_CONTENT)
+            if not any(ancestor.tag == MC_FALLBACK for ancestor in textbox.iterancestors())]
+
+
+def _story_elements(kind: str, root) -> List:
+    if kind in ("header", "footer"):
+        return [root]
+    tag = qn(f"w:{kind}")
+    # Separator notes are not stories
+    return [note for note in root.iterchildren(tag) if note.get(W_TYPE, "normal") == "normal"]
+
+
+def _compared_columns(elements: List, sections: List, styles: StyleResolver, profile: RuleProfile) -> FormatColumns:
+    columns = FormatColumns(styles, profile)
+    for elem in elements:
+        for p in elem.iter(W_P):
+            columns.add_paragraph(p)
+    for sectPr in sections:
+        columns.add_section(sectPr)
+    columns.compare()
+    return columns
+
+
+class _Pass:
+    """
+    One traversal of the windows (the check or the fix), numbering blocks,
+    sections and text boxes across windows.
+    """
+
+    def __init__(self, visitors: List[DocumentVisitor], classification: StreamingClassification):
+        self.visitors = visitors
+        self.walker = BodyWalker(visitors, classification)
+        self.section_index = 0
+        self.textbox_index = 0
+
+    def visit_window(self, window: List, blocks: Optional[Set[int]] = None) -> None:
+        """
+        Visit the blocks, text boxes and sections of a window; of the
+        blocks, only those with an index in blocks if given.
+        """
+        for elem in window:
+            skip = blocks is not None and self.walker.block_index not in blocks
+            if elem.tag == W_P:
+                self.walker.visit(Paragraph(elem, None), skip)
+            elif elem.tag == W_TBL:
+                self.walker.visit(Table(elem, None), skip)
+        self.visit_textboxes(window)
+        for sectPr in _sections(window):
+            section = Section(sectPr, None)
+            for visitor in self.visitors:
+                visitor.visit_section(section, self.section_index)
+            self.section_index += 1
+
+    def visit_textboxes(self, elements: List) -> None:
+        for textbox in _textboxes(elements):
+            visit_story(Story("textbox", self.textbox_index, textbox, None), self.visitors)
+            self.textbox_index += 1
+
+
+def _copy_parts(source: zipfile.ZipFile, target: zipfile.ZipFile, skip: Set[str]) -> None:
+    """
+    Copy the parts of source that are not in skip, READ_SIZE bytes at a time.
+    """
+    for info in source.infolist():
+        if info.filename in skip or info.is_dir():
+            continue
+        out_info = zipfile.ZipInfo(info.filename, info.date_time)
+        out_info.compress_type = zipfile.ZIP_DEFLATED
+        with source.open(info) as src, \
+                target.open(out_info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+            shutil.copyfileobj(src, dst, READ_SIZE)
+
+
+class _IssueCount:
+    """
+    Report that only counts the issues appended to it, for the check the
+    fix needs in fix mode.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def append(self, issue) -> None:
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class _ChunkedAnalysis:
+    """
+    State of one analyze_docx_chunked call: the styles, the check and fix
+    passes and the number of changed elements.
+    """
+
+    def __init__(self, package: zipfile.ZipFile, sink: ReportSink, mode: AnalysisMode, chunk_blocks: int,
+                 profile: RuleProfile, instrumentation: Optional[Instrumentation]):
+        self.package = package
+        self.chunk_blocks = chunk_blocks
+        self.profile = profile
+        self.instrumentation = instrumentation
+        self.fix = mode in (AnalysisMode.FIX, AnalysisMode.FULL)
+        self.highlighter = Highlighter() if mode in (AnalysisMode.HIGHLIGHT, AnalysisMode.FULL) else None
+
+        self.main_part = main_part_name(package)
+        self.relationships = part_relationships(package, self.main_part)
+        parts = {reltype: name for reltype, name in self.relationships.values() if name in package.NameToInfo}
+        self.styles_part = parts.get(RT.STYLES)
+        self.styles_xml = package.read(self.styles_part) if self.styles_part is not None else None
+        self.theme = etree.fromstring(package.read(parts[RT.THEME])) if RT.THEME in parts else None
+        self.styles = StyleResolver(self._parse_styles(), self.theme)
+
+        with measure(instrumentation, "scan"):
+            self.scan = _scan_body(package, self.main_part, self.styles, profile)
+        self.story_parts = self._story_parts()
+        self.classification = StreamingClassification(self.scan.title_page_end)
+
+        # The fix needs to know what the checkers reported, so fix mode checks
+        # the document too, without keeping the issues
+        report = sink if mode is not AnalysisMode.FIX else _IssueCount()
+        marks = self.highlighter if self.highlighter is not None else False
+        self.checkers: List[DocumentVisitor] = [
+            FontCheckVisitor(report, marks, self.styles, profile),
+            AlignmentCheckVisitor(report, marks, self.styles, profile),
+            PageMarginsCheckVisitor(report, profile),
+        ]
+        visitors = list(self.checkers)
+        if instrumentation is not None and mode is not AnalysisMode.FIX:
+            visitors.append(CountingVisitor(instrumentation))
+        self.flagged: Optional[IssueBlocksVisitor] = None
+        if self.fix:
+            # The fixers only need to look at the blocks and styles the checkers reported
+            self.flagged = IssueBlocksVisitor(report, self.styles)
+            visitors.append(self.flagged)
+        self.checking = _Pass(visitors, self.classification)
+
+        self.fixing: Optional[_Pass] = None
+        self.fixed_styles: Optional[StyleResolver] = None
+        self.fixed_styles_xml: Optional[bytes] = None
+        self.changed = dict.fromkeys(FixChanges.KINDS, 0)
+        self.changes = FixChanges()
+
+    def _parse_styles(self):
+        return parse_xml(self.styles_xml) if self.styles_xml is not None else None
+
+    def _story_parts(self) -> List[Tuple[str, str]]:
+        """
+        The header and footer parts in the order the sections refer to
+        them, each once, then the footnotes and endnotes parts.
+        """
+        story_parts: List[Tuple[str, str]] = []
+        for kind, rid in self.scan.references:
+            reltype, name = self.relationships.get(rid, (None, None))
+            if reltype in (RT.HEADER, RT.FOOTER) and (kind, name) not in story_parts:
+                story_parts.append((kind, name))
+        for note_type, kind in _NOTES.items():
+            story_parts.extend((kind, name) for reltype, name in self.relationships.values() if reltype == note_type)
+        return [(kind, name) for kind, name in story_parts if name in self.package.NameToInfo]
+
+    def _start_fix(self) -> None:
+        """
+        Fix the styles the paragraphs with issues use, once the whole
+        document was checked, and set up the fix pass.
+        """
+        with measure(self.instrumentation, "fix"):
+            fixed_styles = self._parse_styles()
+            if fixed_styles is not None:
+                fix_style_definitions(fixed_styles, self.styles, self.scan.caption_styles, self.profile,
+                                      self.changes, self.flagged.style_ids)
+                self.fixed_styles_xml = etree.tostring(fixed_styles, encoding="UTF-8", standalone=True)
+            self.fixed_styles = StyleResolver(fixed_styles, self.theme)
+        self.fixing = _Pass([StyleFixVisitor(self.fixed_styles, self.profile, self.changes),
+                             PageMarginsFixVisitor(self.profile, self.changes)], self.classification)
+        self._count_changes()
+
+    def _count_changes(self) -> None:
+        # The changed elements are counted and let go with their window
+        for kind, count in self.changes.counts().items():
+            self.changed[kind] += count
+        self.changes = FixChanges()
+        for fixer in self.fixing.visitors:
+            fixer.changes = self.changes
+
+    def _check(self, elements: List, sections: List, visit: Callable[[], None]) -> None:
+        with measure(self.instrumentation, "check"):
+            columns = _compared_columns(elements, sections, self.styles, self.profile)
+            for checker in self.checkers:
+                checker.columns = columns
+            visit()
+        if self.highlighter is not None:
+            self.highlighter.apply()
+
+    def run(self, checked: Optional[zipfile.ZipFile], fixed: Optional[zipfile.ZipFile]) -> None:
+        rewritten = {self.main_part} | {name for _, name in self.story_parts}
+        with measure(self.instrumentation, "write"):
+            if checked is not None:
+                _copy_parts(self.package, checked, rewritten)
+        self._process_body(checked, self._check_window)
+        self._process_stories(checked, self._check_stories)
+        if fixed is None:
+            return
+        if not self.flagged.found:
+            # Nothing to fix: the fixed document is the original
+            with measure(self.instrumentation, "write"):
+                _copy_parts(self.package, fixed, set())
+            return
+        self._start_fix()
+        with measure(self.instrumentation, "write"):
+            _copy_parts(self.package, fixed, rewritten | {self.styles_part})
+        self._process_body(fixed, self._fix_window)
+        self._process_stories(fixed, self._fix_stories)
+        if self.fixed_styles_xml is not None:
+            with measure(self.instrumentation, "write"):
+                fixed.writestr(self.styles_part, self.fixed_styles_xml)
+        if self.instrumentation is not None:
+            for kind, count in self.changed.items():
+                self.instrumentation.count(f"{kind}_fixed", count)
+
+    def _process_body(self, output: Optional[zipfile.ZipFile], process_window: Callable[[List], None]) -> None:
+        """
+        Read the body one window at a time, process each window and write
+        it to output, if any.
+        """
+        info = self.package.getinfo(self.main_part)
+        # The highlighted or fixed part may be larger than the original
+        force_zip64 = info.file_size > zipfile.ZIP64_LIMIT // 2
+        xml_out = output.open(self.main_part, "w", force_zip64=force_zip64) if output is not None else None
+        try:
+            with self.package.open(info) as xml:
+                reader = _BodyReader(xml, self.chunk_blocks)
+                started = False
+                for window in reader.windows():
+                    if not started and xml_out is not None:
+                        xml_out.write(reader.head)
+                    started = True
+                    self._classify(window)
+                    process_window(window)
+                    if xml_out is not None:
+                        with measure(self.instrumentation, "write"):
+                            xml_out.write(serialize_window(window, reader.nsmap))
+                    self.classification.clear()
+            if xml_out is not None:
+                if not started:
+                    xml_out.write(reader.head)
+                xml_out.write(reader.tail)
+        finally:
+            if xml_out is not None:
+                xml_out.close()
+
+    def _classify(self, window: List) -> None:
+        walker = (self.fixing or self.checking).walker
+        self.classification.clear()
+        for index, p in enumerate((elem for elem in window if elem.tag == W_P), walker.paragraph_index):
+            self.classification.add(index, Paragraph(p, None))
+
+    def _check_window(self, window: List) -> None:
+        self._check(window, _sections(window), partial(self.checking.visit_window, window))
+
+    def _fix_window(self, window: List) -> None:
+        with measure(self.instrumentation, "fix"):
+            first_index = self.fixing.walker.paragraph_index
+            paragraphs = [elem for elem in window if elem.tag == W_P]
+            for p in paragraphs[:max(self.scan.title_page_end + 1 - first_index, 0)]:
+                # Title page paragraphs keep the look they had before the styles were fixed
+                self.changes.add("paragraphs", p, pin_paragraph_format(
+                    Paragraph(p, None), self.styles.paragraph_format(p), self.fixed_styles.paragraph_format(p)))
+
+            # Caption styles lose their alignment and emphasis in the style fix,
+            # so captions may need direct formatting even if they passed the check
+            blocks: Set[int] = set()
+            block_index = self.fixing.walker.block_index
+            index = first_index
+            for elem in window:
+                if elem.tag == W_P:
+                    if index > self.scan.title_page_end and self.classification[index].is_caption:
+                        blocks.add(block_index)
+                    index += 1
+                if elem.tag == W_P or elem.tag == W_TBL:
+                    if block_index in self.flagged.blocks:
+                        blocks.add(block_index)
+                    block_index += 1
+            self.fixing.visit_window(window, blocks)
+            self._count_changes()
+
+    def _process_stories(self, output: Optional[zipfile.ZipFile],
+                         process: Callable[[List[Tuple[str, object]]], None]) -> None:
+        """
+        Parse the headers, footers and notes, process them in memory with
+        their text boxes and write the parts to output, if any.
+        """
+        roots = [(kind, parse_xml(self.package.read(name))) for kind, name in self.story_parts]
+        process(roots)
+        if output is not None:
+            with measure(self.instrumentation, "write"):
+                for (_, name), (_, root) in zip(self.story_parts, roots):
+                    output.writestr(name, etree.tostring(root, encoding="UTF-8", standalone=True))
+
+    def _check_stories(self, roots: List[Tuple[str, object]]) -> None:
+        counts: Dict[str, int] = {}
+        stories: List[Story] = []
+        for kind, root in roots:
+            for element in _story_elements(kind, root):
+                stories.append(Story(kind, counts.get(kind, 0), element, None))
+                counts[kind] = counts.get(kind, 0) + 1
+        elements = [story.element for story in stories]
+
+        def visit() -> None:
+            for story in stories:
+                visit_story(story, self.checking.visitors)
+            self.checking.visit_textboxes(elements)
+
+        self._check(elements, [], visit)
+
+    def _fix_stories(self, roots: List[Tuple[str, object]]) -> None:
+        stories = [Story(kind, 0, element, None) for kind, root in roots for element in _story_elements(kind, root)]
+        with measure(self.instrumentation, "fix"):
+            for story in stories:
+                visit_story(story, self.fixing.visitors)
+            self.fixing.visit_textboxes([story.element for story in stories])
+            self._count_changes()
+
+
+def analyze_docx_chunked(docx_path: DocxSource,
+                         report: Optional[ReportSink] = None,
+                         mode: Union[AnalysisMode, str] = AnalysisMode.REPORT,
+                         checked_output: Optional[DocxTarget] = None,
+                         fixed_output: Optional[DocxTarget] = None,
+                         chunk_blocks: int = DEFAULT_CHUNK_BLOCKS,
+                         profile: Optional[RuleProfile] = None,
+                         instrumentation: Optional[Instrumentation] = None) -> ReportSink:
+    """
+    analyze_docx in bounded memory: the body is processed chunk_blocks
+    top-level blocks at a time, and the highlighted and fixed documents are
+    written to checked_output and fixed_output while it is read.
+
+    Args:
+        docx_path (DocxSource): The original DOCX file, see analyze_docx.
+        report (ReportSink, optional): Where to put found issues; a streaming
+            ReportWriter keeps the report out of memory as well. A new list if omitted.
+        mode (AnalysisMode | str): Which outputs to build, see AnalysisMode.
+        checked_output (DocxTarget, optional): Path or binary file the document with
+            highlighted issues is written to; required in highlight and full mode.
+        fixed_output (DocxTarget, optional): Path or binary file the auto-fixed document
+            is written to; required in fix and full mode.
+        chunk_blocks (int): Top-level paragraphs and tables per window.
+        profile (RuleProfile, optional): The rules to check and fix against.
+        instrumentation (Instrumentation, optional): Records the time of each stage
+            (scan, check, highlight, fix, write), the visited elements, the issues
+            per rule and the number of changed elements.
+
+    Returns:
+        ReportSink: The report with all discrepancies.
+
+    Raises:
+        ValueError: An output of the mode is missing, or chunk_blocks is not positive.
+    """
+    mode = AnalysisMode(mode)
+    if mode in (AnalysisMode.HIGHLIGHT, AnalysisMode.FULL) and checked_output is None:
+        raise ValueError(f"Mode '{mode.value}' needs checked_output")
+    if mode in (AnalysisMode.FIX, AnalysisMode.FULL) and fixed_output is None:
+        raise ValueError(f"Mode '{mode.value}' needs fixed_output")
+    if chunk_blocks < 1:
+        raise ValueError("chunk_blocks must be positive")
+    if report is None:
+        report = []
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if instrumentation is None:
+        instrumentation = active_instrumentation()
+    if instrumentation is None:
+        _analyze_chunked(docx_path, report, mode, checked_output, fixed_output, chunk_blocks, profile, None)
+        return report
+
+    with instrumentation.activate(), instrumentation.stage("analyze"):
+        _analyze_chunked(docx_path, CountingReport(report, instrumentation), mode, checked_output, fixed_output,
+                         chunk_blocks, profile, instrumentation)
+    return report
+
+
+def _analyze_chunked(docx_path: DocxSource, sink: ReportSink, mode: AnalysisMode,
+                     checked_output: Optional[DocxTarget], fixed_output: Optional[DocxTarget], chunk_blocks: int,
+                     profile: RuleProfile, instrumentation: Optional[Instrumentation]) -> None:
+    with zipfile.ZipFile(open_source(docx_path)) as package:
+        analysis = _ChunkedAnalysis(package, sink, mode, chunk_blocks, profile, instrumentation)
+        checked = zipfile.ZipFile(checked_output, "w", zipfile.ZIP_DEFLATED) \
+            if analysis.highlighter is not None else None
+        fixed = zipfile.ZipFile(fixed_output, "w", zipfile.ZIP_DEFLATED) if analysis.fix else None
+        try:
+            analysis.run(checked, fixed)
+        finally:
+            for output in (checked, fixed):
+                if output is not None:
+                    output.close()
@@ -0,0 +1,227 @@
+"""
+docx_utils/classification.py
+
+Module for classifying paragraphs of a DOCX document.
+Each paragraph's text is extracted once and the paragraph is assigned
+a kind (title page, image caption, table caption or body text) that is
+shared by all checkers and fixers. All patterns are compiled at import,
+except the title page pattern, which comes compiled with the rule profile.
+"""
+
+import re
+from enum import Enum
+from typing import Dict, List, Optional, Sequence
+from lxml import etree
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+
+
+# Title page marker of the default profile
+TITLE_PAGE_RE = DEFAULT_PROFILE.title_page_re
+IMAGE_CAPTION_RE = re.compile(r"^Рис\.\s*\d*")
+TABLE_CAPTION_RE = re.compile(r"^Табл\.\s*\d*")
+IMAGE_CAPTION_TEXT_RE = re.compile(r"^Рис\.\s*\d+\.\s*(\S+.*)$")
+TABLE_CAPTION_TEXT_RE = re.compile(r"^Табл\.\s*\d+\.\s*(\S+.*)$")
+
+W_R, W_HYPERLINK, W_BR, W_TYPE = qn("w:r"), qn("w:hyperlink"), qn("w:br"), qn("w:type")
+# Run content translated to text the same way python-docx does
+_RUN_TEXT = {qn("w:t"): None, qn("w:tab"): "\t", qn("w:ptab"): "\t", qn("w:cr"): "\n", qn("w:noBreakHyphen"): "-"}
+
+
+def run_text(r: etree._Element) -> str:
+    """
+    Text of a w:r element as returned by python-docx's Run.text, without
+    its XPath query; also works on plain lxml elements.
+    """
+    parts = []
+    for child in r:
+        if child.tag in _RUN_TEXT:
+            text = _RUN_TEXT[child.tag]
+            parts.append((child.text or "") if text is None else text)
+        elif child.tag == W_BR and child.get(W_TYPE, "textWrapping") == "textWrapping":
+            parts.append("\n")
+    return "".join(parts)
+
+
+def paragraph_text(p: etree._Element) -> str:
+    """
+    Text of a w:p element as returned by python-docx's Paragraph.text.
+    """
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+
+class ParagraphKind(Enum):
+    TITLE_PAGE = "title_page"
+    IMAGE_CAPTION = "image_caption"
+    TABLE_CAPTION = "table_caption"
+    BODY_TEXT = "body_text"
+
+
+class ParagraphInfo:
+    """
+    Text and kind of a paragraph, computed once.
+
+    Attributes:
+        text: full paragraph text, as returned by Paragraph.text.
+        stripped: text without leading and trailing whitespace.
+        kind: ParagraphKind of the paragraph.
+    """
+
+    __slots__ = ("text", "stripped", "kind")
+
+    def __init__(self, text: str, kind: Optional["ParagraphKind"] = None):
+        self.text = text
+        self.stripped = text.strip()
+        self.kind = kind if kind is not None else caption_kind(self.stripped)
+
+    @property
+    def is_caption(self) -> bool:
+        return self.kind in (ParagraphKind.IMAGE_CAPTION, ParagraphKind.TABLE_CAPTION)
+
+    @property
+    def has_caption_text(self) -> bool:
+        """
+        True if a caption contains text after its number (e.g. 'Рис. 1. Text').
+        """
+        if self.kind is ParagraphKind.IMAGE_CAPTION:
+            return IMAGE_CAPTION_TEXT_RE.match(self.stripped) is not None
+        if self.kind is ParagraphKind.TABLE_CAPTION:
+            return TABLE_CAPTION_TEXT_RE.match(self.stripped) is not None
+        return False
+
+
+def caption_kind(stripped_text: str) -> ParagraphKind:
+    """
+    Classify a stripped paragraph text as image caption, table caption or body text.
+    """
+    if IMAGE_CAPTION_RE.match(stripped_text):
+        return ParagraphKind.IMAGE_CAPTION
+    if TABLE_CAPTION_RE.match(stripped_text):
+        return ParagraphKind.TABLE_CAPTION
+    return ParagraphKind.BODY_TEXT
+
+
+def find_title_page_end(texts: Sequence[str], profile: RuleProfile = DEFAULT_PROFILE) -> int:
+    """
+    Return the index of the paragraph that ends the title page (the first
+    one matching the profile's title page pattern), or -1 if there is none.
+    """
+    title_page_re = profile.title_page_re
+    for i, text in enumerate(texts):
+        if title_page_re.search(text):
+            return i
+    return -1
+
+
+class DocumentClassification:
+    """
+    Lazy classification of the top-level body paragraphs of a document.
+
+    Paragraphs up to and including the title page marker are of kind
+    TITLE_PAGE. Each paragraph's text is read at most once, and only when
+    its info is requested or while searching for the title page marker
+    (the search stops at the marker). The same object can be reused for a
+    cloned document, whose paragraphs have the same text.
+    """
+
+    def __init__(self, paragraphs: Sequence[Paragraph], title_page_end: Optional[int] = None,
+                 profile: RuleProfile = DEFAULT_PROFILE):
+        """
+        Args:
+            paragraphs: top-level body paragraphs, in document order.
+            title_page_end: index of the title page marker if already known
+                (-1 for none); searched for if omitted.
+            profile: rule profile defining the title page marker.
+        """
+        self._paragraphs = paragraphs
+        self._infos: List[Optional[ParagraphInfo]] = [None] * len(paragraphs)
+        if title_page_end is None:
+            title_page_end = -1
+            for i, paragraph in enumerate(paragraphs):
+                text = paragraph_text(paragraph._p)
+                self._infos[i] = ParagraphInfo(text, ParagraphKind.TITLE_PAGE)
+                if profile.title_page_re.search(text):
+                    title_page_end = i
+                    break
+            else:
+                # No title page: the texts read so far belong to body paragraphs
+                self._infos = [ParagraphInfo(info.text) for info in self._infos]
+        self.title_page_end = title_page_end
+
+    def __len__(self) -> int:
+        return len(self._infos)
+
+    def __getitem__(self, index: int) -> ParagraphInfo:
+        info = self._infos[index]
+        if info is None:
+            kind = ParagraphKind.TITLE_PAGE if index <= self.title_page_end else None
+            info = ParagraphInfo(paragraph_text(self._paragraphs[index]._p), kind)
+            self._infos[index] = info
+        return info
+
+
+class StreamingClassification:
+    """
+    Classification of top-level body paragraphs read one window at a time
+    (see docx_utils.chunked), with the title page marker found beforehand.
+    Only the paragraphs added since the last clear() can be looked up; each
+    paragraph's text is read at most once, on first access.
+    """
+
+    def __init__(self, title_page_end: int):
+        self.title_page_end = title_page_end
+        self._paragraphs: Dict[int, Paragraph] = {}
+        self._infos: Dict[int, ParagraphInfo] = {}
+
+    def add(self, index: int, paragraph: Paragraph) -> None:
+        self._paragraphs[index] = paragraph
+
+    def clear(self) -> None:
+        self._paragraphs.clear()
+        self._infos.clear()
+
+    def __getitem__(self, index: int) -> ParagraphInfo:
+        info = self._infos.get(index)
+        if info is None:
+            kind = ParagraphKind.TITLE_PAGE if index <= self.title_page_end else None
+            info = ParagraphInfo(paragraph_text(self._paragraphs[index]._p), kind)
+            self._infos[index] = info
+        return info
+
+
+def classify_paragraphs(paragraphs: Sequence[Paragraph],
+                        title_page_end: Optional[int] = None,
+                        profile: RuleProfile = DEFAULT_PROFILE) -> DocumentClassification:
+    """
+    Classify top-level body paragraphs. Paragraphs up to and including the
+    title page marker are of kind TITLE_PAGE.
+    """
+    return DocumentClassification(paragraphs, title_page_end, profile)
+
+
+def is_title_page(paragraphs: Sequence[Paragraph], index: int, profile: RuleProfile = DEFAULT_PROFILE) -> bool:
+    """
+    Determine if a paragraph belongs to the title page based on the profile's title page pattern.
+    """
+    return profile.title_page_re.search(paragraphs[index].text.strip()) is not None
+
+
+def is_image_caption(paragraph: Paragraph) -> bool:
+    """
+    Check if the paragraph is a caption under an image (starts with 'Рис.').
+    """
+    return IMAGE_CAPTION_RE.match(paragraph.text.strip()) is not None
+
+
+def is_table_caption(paragraph: Paragraph) -> bool:
+    """
+    Check if the paragraph is a caption above a table (starts with 'Табл.').
+    """
+    return TABLE_CAPTION_RE.match(paragraph.text.strip()) is not None
@@ -0,0 +1,236 @@
+"""
+docx_utils/columns.py
+
+Columnar extraction of the formatting the checkers compare.
+One pass over the paragraphs of the checked blocks and stories resolves
+the effective indents, line spacing and alignment of every paragraph, the
+font name and size of every run (with the StyleResolver) and the margins of
+every section, and stores them in compact arrays (array module, one column
+per property). The tolerance comparisons of font_check, alignment_check and
+page_margins then run once over whole columns and leave a small bit mask
+of violated rules per row. The checkers look up the row of the element they
+visit and build report entries only for rows with violations; for every
+other element the visit is a dictionary lookup.
+
+The columns are plain arrays rather than NumPy ones: NumPy is not a
+dependency, and the visitors consume the masks row by row anyway.
+"""
+
+from array import array
+from typing import Container, Dict, Iterable, List, Optional
+from docx.document import Document as DocumentObject
+from docx.exceptions import InvalidXmlError
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import Length
+from config.profiles import DEFAULT_PROFILE, INDENT_TOLERANCE_EMU, MARGIN_TOLERANCE_EMU, RuleProfile
+from docx_utils.stories import iter_stories
+from docx_utils.styles import EffectiveFont, StyleResolver
+
+W_P, W_R, W_TBL = qn("w:p"), qn("w:r"), qn("w:tbl")
+
+# Bits of the paragraph masks
+FIRST_LINE_INDENT, LEFT_INDENT, RIGHT_INDENT, LINE_SPACING, NOT_JUSTIFIED = 1, 2, 4, 8, 16
+# Rules of table paragraphs and of paragraphs outside the body
+FORMAT_RULES = LEFT_INDENT | RIGHT_INDENT | LINE_SPACING
+# Rules of body text paragraphs (captions have rules of their own)
+BODY_TEXT_RULES = FORMAT_RULES | FIRST_LINE_INDENT | NOT_JUSTIFIED
+
+# Bits of the run masks
+FONT_NAME, FONT_SIZE = 1, 2
+
+# Stored for values not set anywhere in the style hierarchy
+NOT_SET = -1
+MARGIN_NOT_SET = -(1 << 63)
+
+_JUSTIFY = WD_ALIGN_PARAGRAPH.JUSTIFY.value
+_EXTRACT_ERRORS = (ValueError, TypeError, InvalidXmlError)
+
+
+class FormatColumns:
+    """
+    Effective formatting of paragraphs, runs and sections, one array per
+    property, with the rules they violate.
+
+    Elements missing from the rows (not extracted, or with formatting that
+    could not be read) are not covered; the checkers check them one by one.
+
+    Attributes:
+        paragraph_rows / run_rows / section_rows: row of each w:p, w:r and w:sectPr element.
+        alignment: WD_ALIGN_PARAGRAPH value of each paragraph, NOT_SET if none.
+        first_line_indent, left_indent, right_indent: indents in EMU, 0 if not set.
+        line_spacing: line spacing as a multiple of single spacing (or in EMU
+            for exact spacing), 1.0 if not set.
+        font_name: index into names of each run's font, NOT_SET if none.
+        font_size: font size of each run in EMU, NOT_SET if none.
+        margins: margin in EMU of each section, by side, MARGIN_NOT_SET if none.
+        paragraph_flags / run_flags / section_flags: violated rules of each row,
+            filled by compare(); one bit per margin in the order of profile.margins_emu.
+    """
+
+    def __init__(self, styles: StyleResolver, profile: RuleProfile = DEFAULT_PROFILE):
+        self.styles = styles
+        self.profile = profile
+        self.paragraph_rows: Dict[object, int] = {}
+        self.alignment = array("b")
+        self.first_line_indent = array("q")
+        self.left_indent = array("q")
+        self.right_indent = array("q")
+        self.line_spacing = array("d")
+        self.run_rows: Dict[object, int] = {}
+        self.font_name = array("l")
+        self.font_size = array("q")
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.section_rows: Dict[object, int] = {}
+        self.margins: Dict[str, array] = {side: array("q") for side, _, _ in profile.margins_emu}
+        self.paragraph_flags = array("B")
+        self.run_flags = array("B")
+        self.section_flags = array("B")
+
+    def add_paragraph(self, p) -> None:
+        """
+        Append the formatting of a w:p element and of its runs.
+        """
+        if p in self.paragraph_rows:
+            return
+        runs = p.findall(W_R)
+        try:
+            fmt = self.styles.paragraph_format(p)
+            fonts = self.styles.fonts(runs, p)
+        except _EXTRACT_ERRORS:
+            return
+        self.paragraph_rows[p] = len(self.alignment)
+        self.alignment.append(fmt.alignment.value if fmt.alignment is not None else NOT_SET)
+        self.first_line_indent.append(fmt.first_line_indent or 0)
+        self.left_indent.append(fmt.left_indent or 0)
+        self.right_indent.append(fmt.right_indent or 0)
+        self.line_spacing.append(fmt.line_spacing or 1.0)
+
+        run_rows = self.run_rows
+        for r, font in zip(runs, fonts):
+            run_rows[r] = len(self.font_size)
+            self.font_name.append(self._name_id(font.name))
+            self.font_size.append(font.size if font.size is not None else NOT_SET)
+
+    def _name_id(self, name: Optional[str]) -> int:
+        if name is None:
+            return NOT_SET
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add_section(self, sectPr) -> None:
+        """
+        Append the page margins of a w:sectPr element.
+        """
+        if sectPr in self.section_rows:
+            return
+        pgMar = sectPr.pgMar
+        try:
+            values = [getattr(pgMar, side) if pgMar is not None else None for side in self.margins]
+        except _EXTRACT_ERRORS:
+            return
+        self.section_rows[sectPr] = len(self.section_rows)
+        values = [value if value is not None else MARGIN_NOT_SET for value in values]
+        for column, value in zip(self.margins.values(), values):
+            column.append(value)
+
+    def compare(self) -> None:
+        """
+        Compare all columns with the profile's required values at once and
+        fill the masks of violated rules.
+        """
+        profile = self.profile
+        tolerance = INDENT_TOLERANCE_EMU
+        first_line, left, right = (profile.first_line_indent_emu, profile.left_indent_emu,
+                                   profile.right_indent_emu)
+        line_spacing = profile.line_spacing
+        self.paragraph_flags = array("B", [
+            (abs(f - first_line) > tolerance)
+            | (abs(le - left) > tolerance) << 1
+            | (abs(ri - right) > tolerance) << 2
+            | (abs(s - line_spacing) > 1e-2) << 3
+            | (a != _JUSTIFY) << 4
+            for f, le, ri, s, a in zip(self.first_line_indent, self.left_indent, self.right_indent,
+                                       self.line_spacing, self.alignment)])
+
+        wrong_name = array("B", [name != profile.target_font for name in self.names])
+        low, high = profile.min_font_size_emu, profile.max_font_size_emu
+        self.run_flags = array("B", [
+            (n != NOT_SET and wrong_name[n]) | (z != NOT_SET and not low <= z <= high) << 1
+            for n, z in zip(self.font_name, self.font_size)])
+
+        flags = [0] * len(self.section_rows)
+        for bit, (side, _, expected) in enumerate(profile.margins_emu):
+            for row, value in enumerate(self.margins[side]):
+                if value == MARGIN_NOT_SET or abs(value - expected) >= MARGIN_TOLERANCE_EMU:
+                    flags[row] |= 1 << bit
+        self.section_flags = array("B", flags)
+
+    def paragraph_clean(self, p, rules: int) -> bool:
+        """
+        True if the w:p element is covered and violates none of rules.
+        """
+        row = self.paragraph_rows.get(p)
+        return row is not None and not self.paragraph_flags[row] & rules
+
+    def run_violations(self, r) -> Optional[int]:
+        """
+        Violated rules (FONT_NAME, FONT_SIZE) of a w:r element, None if not covered.
+        """
+        row = self.run_rows.get(r)
+        return self.run_flags[row] if row is not None else None
+
+    def font(self, r) -> EffectiveFont:
+        """
+        Font name and size of a covered w:r element.
+        """
+        row = self.run_rows[r]
+        name, size = self.font_name[row], self.font_size[row]
+        return EffectiveFont(name=self.names[name] if name != NOT_SET else None,
+                             size=Length(size) if size != NOT_SET else None)
+
+    def section_violations(self, sectPr) -> Optional[int]:
+        """
+        Violated margin rules of a w:sectPr element, None if not covered.
+        """
+        row = self.section_rows.get(sectPr)
+        return self.section_flags[row] if row is not None else None
+
+
+def extract_columns(docx: DocumentObject, styles: StyleResolver, profile: RuleProfile = DEFAULT_PROFILE,
+                    blocks: Optional[Container[int]] = None, stories: bool = True) -> FormatColumns:
+    """
+    Extract the formatting of the paragraphs, runs and sections walk_document
+    visits with the same arguments, and compare it with the profile.
+
+    Args:
+        docx: Document object.
+        styles: resolver of inherited formatting.
+        profile: rules to compare with.
+        blocks: indices of the top-level body blocks to extract; all if omitted.
+        stories: whether to extract headers, footers, notes and text boxes.
+
+    Returns:
+        FormatColumns: the columns, compared.
+    """
+    columns = FormatColumns(styles, profile)
+    body_blocks = (child for child in docx.element.body if child.tag == W_P or child.tag == W_TBL)
+    for block_index, block in enumerate(body_blocks):
+        if blocks is None or block_index in blocks:
+            _add_paragraphs(columns, block.iter(W_P))
+    if stories:
+        for story in iter_stories(docx):
+            _add_paragraphs(columns, story.element.iter(W_P))
+    for section in docx.sections:
+        columns.add_section(section._sectPr)
+    columns.compare()
+    return columns
+
+
+def _add_paragraphs(columns: FormatColumns, paragraphs: Iterable) -> None:
+    for p in paragraphs:
+        columns.add_paragraph(p)
@@ -1,64 +1,407 @@
-""" 
-docx_utils/docx_operations.py 
+"""
+docx_utils/docx_operations.py
 
-Module for checking DOCX documents for font compliance. 
-Highlights runs with incorrect fonts in red and returns the total number of discrepancies. 
+Checking and auto-fixing of whole documents against a rule profile.
+analyze_docx parses a document once and, depending on the AnalysisMode,
+builds the report of fonts, alignment, indentation, line spacing and
+margins issues, a copy with the issues highlighted and an auto-fixed copy
+(cloned from the same parse with clone_docx). find_issues and fix_docx do
+the check and the fix of an already parsed document; the fix touches only
+the blocks and styles the check reported. Documents are read from and
+written to paths, bytes or binary file objects (save_docx), so everything
+can stay in memory.
 """
 
-from typing import List, Tuple, Dict
+import copy
+import io
+import os
+import zipfile
+from typing import IO, List, Optional, Set, Tuple, Dict, Union
 from docx.document import Document as DocumentObject
-from docx.text.run import Run
 from docx import Document
-from docx_utils.font_check import check_paragraph_font, check_table_font
+from docx.opc.exceptions import PackageNotFoundError
+from lxml import etree
+from docx_utils.font_check import FontCheckVisitor
 from config.config import ReportItem
-from docx_utils.alignment_check import check_alignment_and_indent
-from docx_utils.page_margins import check_page_margins
-from docx_utils.auto_fix.font_fix import fix_paragraph_font, fix_table_font
-from docx_utils.auto_fix.page_margins_fix import fix_page_margins
-from docx_utils.auto_fix.alignment_fix import fix_alignment_and_indent
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx_utils.alignment_check import AlignmentCheckVisitor
+from docx_utils.page_margins import PageMarginsCheckVisitor
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.auto_fix.page_margins_fix import PageMarginsFixVisitor
+from docx_utils.auto_fix.style_fix import StyleFixVisitor, fix_styles
+from docx_utils.modes import AnalysisMode
+from docx_utils.traversal import (
+    CountingVisitor,
+    DocumentVisitor,
+    IssueBlocksVisitor,
+    IssueLimitVisitor,
+    TimedVisitor,
+    walk_document
+)
+from docx_utils.report import ReportWriter
+from docx_utils.highlight import Highlighter
+from docx_utils.prescan import PrescanResult, prescan_docx
+from docx_utils.classification import DocumentClassification, classify_paragraphs
+from docx_utils.incremental import IncrementalCheckVisitor, IncrementalState
+from docx_utils.styles import StyleResolver
+from docx_utils.stories import register_note_parts
+from docx_utils.columns import FormatColumns, extract_columns
+from docx_utils.layout import PageLayout, estimate_pages
+from docx_utils.buffers import DocxSource, open_source, read_once
+from docx_utils.instrumentation import CountingReport, Instrumentation, active_instrumentation, measure, timed
+from docx.text.paragraph import Paragraph
+
+# Anything issues can be appended to: a plain list or a streaming report writer
+ReportSink = Union[List[ReportItem], ReportWriter]
+
+# Errors of zipfile, python-docx and lxml for input that is not a readable package
+PACKAGE_ERRORS = (zipfile.BadZipFile, PackageNotFoundError, KeyError, ValueError, etree.XMLSyntaxError)
+
+
+class InvalidDocxError(ValueError):
+    """
+    Raised when the input cannot be opened as a .docx package: not a zip
+    archive, missing parts, a wrong content type or malformed part XML.
+    Errors raised later, while the document is checked, are not wrapped.
+    """
+
+
+def clone_docx(docx: DocumentObject) -> DocumentObject:
+    """
+    Creates an independent in-memory copy of an already parsed Document.
+
+    The XML trees of all parts are copied, while immutable binary parts
+    (images, fonts, etc.) are shared between the copies. This is noticeably
+    cheaper than unzipping and parsing the same file a second time.
+
+    Args:
+        docx (DocumentObject): The parsed Document to copy.
+
+    Returns:
+        DocumentObject: A copy that can be modified without affecting the original.
+    """
+    return copy.deepcopy(docx)
+
+
+def _timed_visitors(visitors: Dict[str, DocumentVisitor],
+                    instrumentation: Optional[Instrumentation]) -> List[DocumentVisitor]:
+    """
+    The visitors, each timed under its stage name if instrumentation is on.
+    """
+    if instrumentation is None:
+        return list(visitors.values())
+    return [TimedVisitor(visitor, stage, instrumentation) for stage, visitor in visitors.items()]
+
+
+def find_issues(docx: DocumentObject, classification: Optional[DocumentClassification] = None,
+                instrumentation: Optional[Instrumentation] = None,
+                profile: RuleProfile = DEFAULT_PROFILE) -> Tuple[IssueBlocksVisitor, DocumentClassification]:
+    """
+    Runs the checkers over a Document without keeping the issues, to find
+    what fix_docx has to look at.
+
+    Args:
+        docx (DocumentObject): The Document to check; it is not modified.
+        classification (DocumentClassification, optional): Classification of the
+            document's body paragraphs from a previous walk; computed if omitted.
+        instrumentation (Instrumentation, optional): Records the time of the check.
+        profile (RuleProfile): The rules to check the document against.
+
+    Returns:
+        Tuple[IssueBlocksVisitor, DocumentClassification]: The blocks, sections and
+        styles with issues, and the classification of the body paragraphs.
+    """
+    issues: List[ReportItem] = []
+    with measure(instrumentation, "fix.check"):
+        styles = StyleResolver.from_document(docx)
+        columns = extract_columns(docx, styles, profile)
+        flagged = IssueBlocksVisitor(issues, styles)
+        checkers = [
+            FontCheckVisitor(issues, False, styles, profile, columns),
+            AlignmentCheckVisitor(issues, False, styles, profile, columns),
+            PageMarginsCheckVisitor(issues, profile, columns),
+            flagged,
+        ]
+        classification = walk_document(docx, checkers, classification, profile=profile)
+    return flagged, classification
+
 
-def analyze_docx(docx_path: str) -> Tuple[List[ReportItem], DocumentObject]:
+def fix_docx(docx: DocumentObject, classification: Optional[DocumentClassification] = None,
+             instrumentation: Optional[Instrumentation] = None,
+             profile: RuleProfile = DEFAULT_PROFILE,
+             flagged: Optional[IssueBlocksVisitor] = None) -> FixChanges:
     """
-    Checks a DOCX file for font compliance with TARGET_FONT.
-    Highlights runs with incorrect fonts in red in memory only.
+    Auto-fixes a Document in place: styles first (see auto_fix.style_fix),
+    then the direct formatting of paragraphs and runs, and page margins.
+    Only what the checkers reported is fixed, and only values that violate
+    a rule are written, so a conforming document is saved unchanged.
+
+    Args:
+        docx (DocumentObject): The Document to fix.
+        classification (DocumentClassification, optional): Classification of the
+            document's body paragraphs from a previous walk; computed if omitted.
+        instrumentation (Instrumentation, optional): Records the time of each fix
+            and the number of changed elements.
+        profile (RuleProfile): The rules to fix the document to.
+        flagged (IssueBlocksVisitor, optional): What the checkers reported issues for
+            in this document or in the one it was cloned from, with the styles of the
+            paragraphs with issues; only these styles and top-level body blocks are
+            fixed, headers, footers, notes and text boxes always are. The document
+            is checked first if omitted (see find_issues).
+
+    Returns:
+        FixChanges: The changed styles, paragraphs, runs and sections.
+    """
+    changes = FixChanges()
+    with measure(instrumentation, "fix"):
+        if flagged is None:
+            flagged, classification = find_issues(docx, classification, instrumentation, profile)
+        if not flagged.found:
+            return changes
+        body_blocks = list(docx.iter_inner_content())
+        paragraphs = [block for block in body_blocks if isinstance(block, Paragraph)]
+        if classification is None:
+            classification = classify_paragraphs(paragraphs, profile=profile)
+        with measure(instrumentation, "fix.styles"):
+            styles = fix_styles(docx, paragraphs, classification, profile, changes, flagged.style_ids)
+        # Caption styles lose their alignment and emphasis in fix_styles,
+        # so captions may need direct formatting even if they passed the check
+        blocks = set(flagged.blocks)
+        paragraph_blocks = (i for i, block in enumerate(body_blocks) if isinstance(block, Paragraph))
+        for index, block_index in enumerate(paragraph_blocks):
+            if index > classification.title_page_end and classification[index].is_caption:
+                blocks.add(block_index)
+        fixers = _timed_visitors({
+            "fix.runs": StyleFixVisitor(styles, profile, changes),
+            "fix.page_margins": PageMarginsFixVisitor(profile, changes),
+        }, instrumentation)
+        walk_document(docx, fixers, classification, blocks)
+    if instrumentation is not None:
+        for kind, count in changes.counts().items():
+            instrumentation.count(f"{kind}_fixed", count)
+    return changes
+
+
+def analyze_docx(docx_path: DocxSource,
+                 report: Optional[ReportSink] = None,
+                 mode: Union[AnalysisMode, str] = AnalysisMode.FULL,
+                 max_issues: Optional[int] = None,
+                 prescan: bool = False,
+                 incremental: Optional[IncrementalState] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 profile: Optional[RuleProfile] = None,
+                 comments: bool = False,
+                 pages: bool = False,
+                 page_range: Optional[Tuple[int, int]] = None
+                 ) -> Tuple[ReportSink, Optional[DocumentObject], Optional[DocumentObject]]:
+    """
+    Checks a DOCX file for compliance with a rule profile (fonts, alignment,
+    indentation, line spacing and page margins).
+    Highlights runs with incorrect fonts in red in memory only. Issues are
+    collected during the check and every run is highlighted once afterwards.
+
+    The package is parsed only once; the document used for auto-fixing is
+    cloned from that parse before any highlighting is applied. Modes other
+    than FULL need a single document and skip the clone entirely.
     
     Args:
-        docx_path (str): Path to the original DOCX file.
+        docx_path (DocxSource): The original DOCX file: a path, its contents as bytes,
+            bytearray or memoryview (used without copying), or a binary file object.
+            The input is read only once, also when it is pre-scanned.
+        report (ReportSink, optional): Where to put found issues, e.g. a streaming
+            ReportWriter from docx_utils.report. A new list is used if omitted.
+        mode (AnalysisMode | str): Which outputs to build, see AnalysisMode.
+        max_issues (int, optional): Stop checking as soon as at least this many issues
+            were found (fail fast). The fixed copy, if built, is still fixed completely.
+        prescan (bool): Pre-scan the raw XML first (see docx_utils.prescan) and run the
+            checkers only on blocks and sections that may violate a rule. A clean
+            document is not parsed at all in REPORT mode, and gets no fixed copy
+            (docx_fixed is None) in FULL mode since there is nothing to fix.
+        incremental (IncrementalState, optional): Results of the previous run of this
+            document (see docx_utils.incremental). Only changed paragraphs are checked
+            again; the state is updated with the results of this run.
+        instrumentation (Instrumentation, optional): Records stage timings, visited
+            element counts and issues per rule (see docx_utils.instrumentation).
+            Defaults to the active instrumentation, if any; no overhead without one.
+        profile (RuleProfile, optional): The rules to check and fix against, see
+            config.profiles. Defaults to the rules in config.config.
+        comments (bool): Add a Word comment listing the issues to every highlighted
+            paragraph of the checked document.
+        pages (bool): Estimate the page of every body paragraph and section (see
+            docx_utils.layout) and store it in the issue locations.
+        page_range (Tuple[int, int], optional): Check only the body blocks and sections
+            starting on these estimated pages (first and last, inclusive), e.g. to
+            validate a huge document in chunks; implies pages. Headers, footers, notes
+            and text boxes are checked with the range that starts on page 1. The fixed
+            copy, if built, is fixed completely.
     
     Returns:
-        Tuple[List[ReportItem], DocumentObject]: A tuple containing a list of runs with font discrepancies and the loaded Document object with highlights.
-    """
-    docx_checked: DocumentObject = Document(docx_path)
-    docx_fixed: DocumentObject = Document(docx_path)
-    report: List[ReportItem] = []
-
-    # Check all paragraphs
-    for paragraph_checked, paragraph_fixed in zip(docx_checked.paragraphs, docx_fixed.paragraphs):
-        # Analyze for issues
-        check_paragraph_font(paragraph_checked, report)
-        # Apply fixes in the fixed document
-        fix_paragraph_font(paragraph_fixed)
-
-    # Check all tables
-    for table_checked, table_fixed in zip(docx_checked.tables, docx_fixed.tables):
-            check_table_font(table_checked, report)
-            fix_table_font(table_fixed)
-
-    check_alignment_and_indent(docx_checked, report)
-    fix_alignment_and_indent(docx_fixed)
-    
-    check_page_margins(docx_checked, report)
-    fix_page_margins(docx_fixed)
+        Tuple[ReportSink, DocumentObject | None, DocumentObject | None]: A tuple containing the report
+        with all discrepancies, the Document object with highlights and the auto-fixed Document object.
+        Documents not built in the chosen mode are None.
+
+    Raises:
+        InvalidDocxError: docx_path cannot be opened as a .docx package.
+    """
+    mode = AnalysisMode(mode)
+    if report is None:
+        report = []
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if instrumentation is None:
+        instrumentation = active_instrumentation()
+    if instrumentation is None:
+        return _analyze(docx_path, report, report, mode, max_issues, prescan, incremental, None, profile,
+                        comments, pages, page_range)
 
+    with instrumentation.activate(), instrumentation.stage("analyze"):
+        return _analyze(docx_path, report, CountingReport(report, instrumentation), mode, max_issues,
+                        prescan, incremental, instrumentation, profile, comments, pages, page_range)
+
+
+def _analyze(docx_path: DocxSource, report: ReportSink, sink: ReportSink, mode: AnalysisMode,
+             max_issues: Optional[int], prescan: bool, incremental: Optional[IncrementalState],
+             instrumentation: Optional[Instrumentation], profile: RuleProfile, comments: bool = False,
+             pages: bool = False, page_range: Optional[Tuple[int, int]] = None
+             ) -> Tuple[ReportSink, Optional[DocumentObject], Optional[DocumentObject]]:
+    """
+    analyze_docx with issues appended to sink, which is report itself or
+    a wrapper of it; report is what gets returned.
+    """
+    source = open_source(docx_path)
+    scan: Optional[PrescanResult] = None
+    if prescan and mode is not AnalysisMode.FIX:
+        source = read_once(source)
+        start = source.tell()
+        with measure(instrumentation, "prescan"):
+            try:
+                scan = prescan_docx(source, profile)
+            except PACKAGE_ERRORS as exc:
+                raise InvalidDocxError(str(exc)) from exc
+        if scan.clean and mode is AnalysisMode.REPORT:
+            return report, None, None
+        source.seek(start)
+
+    register_note_parts()
+    with measure(instrumentation, "parse"):
+        try:
+            docx: DocumentObject = Document(source)
+        except PACKAGE_ERRORS as exc:
+            raise InvalidDocxError(str(exc)) from exc
+
+    if mode is AnalysisMode.FIX:
+        fix_docx(docx, instrumentation=instrumentation, profile=profile)
+        return report, None, docx
+
+    if scan is not None and scan.clean:
+        return report, docx, None
+
+    docx_fixed: Optional[DocumentObject] = None
+    if mode is AnalysisMode.FULL:
+        with measure(instrumentation, "clone"):
+            docx_fixed = clone_docx(docx)
+
+    # One pass over the checked document runs every checker,
+    # one pass over the fixed copy runs every fixer. The copy has the same
+    # paragraphs, so the paragraph classification is computed only once.
+    highlight = mode is not AnalysisMode.REPORT
+    # The checkers only mark what to highlight; the marks are applied in one pass after the check
+    highlighter = Highlighter(comments) if highlight else None
+    marks = highlighter if highlighter is not None else False
+    # In incremental mode the checkers write to a buffer that the
+    # incremental visitor moves to the report paragraph by paragraph
+    checked_report = sink if incremental is None else []
+    with measure(instrumentation, "styles"):
+        styles = StyleResolver.from_document(docx)
+
+    # What the check visits: the blocks and sections the pre-scan flagged,
+    # narrowed down to the requested pages
+    blocks: Optional[Set[int]] = scan.suspicious_blocks if scan is not None else None
+    sections: Union[bool, Set[int]] = scan.sections_suspicious if scan is not None else True
+    stories = scan.stories_suspicious if scan is not None else True
+    layout: Optional[PageLayout] = None
+    if pages or page_range is not None:
+        with measure(instrumentation, "layout"):
+            layout = estimate_pages(docx, styles)
+    if page_range is not None:
+        first, last = page_range
+        in_range = layout.blocks_in_pages(first, last)
+        blocks = in_range if blocks is None else blocks & in_range
+        sections = layout.sections_in_pages(first, last) if sections else False
+        stories = stories and first <= 1
+    # The formatting of everything the check visits is extracted into columns
+    # and compared in one go; the checkers then only report the violations.
+    # Incremental runs and runs stopping at max_issues check few paragraphs
+    # and look at them one by one.
+    columns: Optional[FormatColumns] = None
+    if incremental is None and max_issues is None:
+        with measure(instrumentation, "extract"):
+            columns = extract_columns(docx, styles, profile, blocks, stories)
+    checkers = _timed_visitors({
+        "check.font": FontCheckVisitor(checked_report, marks, styles, profile, columns),
+        "check.alignment": AlignmentCheckVisitor(checked_report, marks, styles, profile, columns),
+        "check.page_margins": PageMarginsCheckVisitor(checked_report, profile, columns, layout),
+    }, instrumentation)
+
+    paragraphs: List[Paragraph] = []
+    classification: Optional[DocumentClassification] = None
+    flagged: Optional[IssueBlocksVisitor] = None
+    if incremental is not None:
+        incremental.use_rules(profile)
+    if scan is not None or incremental is not None:
+        paragraphs = [block for block in docx.iter_inner_content() if isinstance(block, Paragraph)]
+        title_page_end = scan.title_page_end if scan is not None else incremental.known_title_page_end(paragraphs)
+        classification = DocumentClassification(paragraphs, title_page_end, profile)
+    if incremental is not None:
+        incremental.use_styles(styles.fingerprint)
+        tracker = IncrementalCheckVisitor(checkers, checked_report, sink, incremental, highlight)
+        checkers = [tracker]
+
+    if max_issues is not None:
+        checkers.append(IssueLimitVisitor(sink, max_issues))
+    if instrumentation is not None:
+        checkers.append(CountingVisitor(instrumentation))
+    if docx_fixed is not None and max_issues is None and page_range is None:
+        # The fixers only need to look at the blocks and styles the checkers reported
+        flagged = IssueBlocksVisitor(sink, styles)
+        checkers.append(flagged)
+    with measure(instrumentation, "check"):
+        classification = walk_document(docx, checkers, classification, blocks, sections, profile,
+                                       stories=stories, layout=layout)
+    if incremental is not None:
+        incremental.update(tracker.results, paragraphs, classification.title_page_end)
+        if instrumentation is not None:
+            instrumentation.count("paragraphs_checked", tracker.checked)
+            instrumentation.count("paragraphs_reused", tracker.reused)
+
+    if highlighter is not None:
+        highlighter.apply(docx)
+
+    if docx_fixed is not None:
+        # Without a complete check, the fixed copy is checked on its own
+        fix_docx(docx_fixed, classification, instrumentation, profile, flagged)
+
+    docx_checked = docx if highlight else None
     return report, docx_checked, docx_fixed  # Return doc object for optional saving
 
 
-def save_docx(docx: DocumentObject, output_path: str):
+@timed("save")
+def save_docx(docx: DocumentObject, output_path: Union[str, os.PathLike, IO[bytes], None] = None
+              ) -> Optional[bytes]:
     """
-    Saves a DOCX Document object to the specified file.
+    Saves a DOCX Document object to the specified file, or to memory.
 
     Args:
         docx (DocumentObject): The Document object to save.
-        output_path (str): Path to save the DOCX file.
+        output_path (str | PathLike | IO[bytes], optional): Path or binary file object
+            to save the DOCX file to. If omitted, the file is returned as bytes.
+
+    Returns:
+        bytes | None: The DOCX file when no output_path is given, else None.
     """
-    docx.save(output_path)
+    if output_path is not None:
+        docx.save(output_path)
+        return None
+    buffer = io.BytesIO()
+    docx.save(buffer)
+    return buffer.getvalue()
@@ -3,76 +3,171 @@ docx_utils/font_check.py
 
 Module for checking fonts and font sizes in a DOCX document.
 Highlights runs with incorrect fonts/sizes in red and records discrepancies
-as tuples (run, reason) in the report list.
+as ReportItem records in the report list. With a Highlighter the runs are
+only marked and highlighted after the check (see docx_utils.highlight).
+With FormatColumns the fonts are compared beforehand, column by column
+(see docx_utils.columns), and only violating runs are looked at.
 """
 
-from typing import List, Optional
-from docx.shared import RGBColor, Pt
-from config.config import TARGET_FONT, ReportItem, MIN_FONT_SIZE, MAX_FONT_SIZE
+from dataclasses import replace
+from typing import List, Optional, Union
+from docx.shared import Pt
+from docx.text.font import Font
+from config.config import ReportItem, IssueLocation
+from config.profiles import DEFAULT_PROFILE, RuleProfile
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 from docx.text.run import Run
+from docx_utils.classification import run_text
+from docx_utils.columns import FormatColumns
+from docx_utils.highlight import Highlighter, color_runs_red
+from docx_utils.styles import EffectiveFont, StyleResolver
+from docx_utils.traversal import DocumentVisitor, ParagraphContext, iter_table_cells
 
+# Whether and how to highlight issues: True colors the runs at once,
+# a Highlighter marks them to be colored after the check, False does neither
+Highlight = Union[bool, Highlighter]
 
-def highlight_run(run: Run, paragraph: Paragraph, report: List[ReportItem], reason: str) -> None:
+
+def highlight_run(run: Run, paragraph: Paragraph, report: List[ReportItem], reason: str,
+                  rule: str = "font", expected: Union[str, float, None] = None,
+                  actual: Union[str, float, None] = None,
+                  location: Optional[IssueLocation] = None,
+                  paragraph_text: Optional[str] = None,
+                  highlight: Highlight = True) -> None:
     """
-    Highlight the given run in red and append a reasoned dictionary to report.
+    Highlight the given run in red and append a ReportItem to report.
+    With highlight=False the issue is only recorded and the run is left untouched;
+    with a Highlighter the run is marked for highlighting after the check.
 
     Args:
         run: docx.text.run.Run object to highlight.
         paragraph: the Paragraph object containing this run (for context)
-        report: list that collects dicts with run, paragraph_text, and reason.
+        report: list that collects ReportItem records.
         reason: short textual description why this run is considered incorrect.
+        rule: identifier of the violated rule.
+        expected: required value.
+        actual: value found in the document.
+        location: where the run is located in the document.
+        paragraph_text: text of the paragraph, if already known.
+        highlight: whether to color the run red, or the Highlighter to mark it in.
     """
-    run.font.color.rgb = RGBColor(255, 0, 0)
-    report.append({
-        "run": run,
-        "paragraph_text": paragraph.text,
-        "reason": reason
-    })
+    if isinstance(highlight, Highlighter):
+        highlight.mark_run(run, paragraph, reason)
+    elif highlight:
+        color_runs_red((run,))
+    report.append(ReportItem(
+        rule=rule,
+        reason=reason,
+        text=run_text(run._r),
+        paragraph_text=paragraph_text if paragraph_text is not None else paragraph.text,
+        expected=expected,
+        actual=actual,
+        location=location if location is not None else IssueLocation()
+    ))
 
 
-def check_run_style(run: Run, paragraph: Paragraph, report: List[ReportItem]) -> None:
+def check_run_style(run: Run, paragraph: Paragraph, report: List[ReportItem],
+                    location: Optional[IssueLocation] = None,
+                    paragraph_text: Optional[str] = None,
+                    highlight: Highlight = True,
+                    styles: Optional[StyleResolver] = None,
+                    profile: RuleProfile = DEFAULT_PROFILE) -> None:
     """
     Check a single run for font family and font size rules and highlight it
-    if any rule is violated. Appends (run, reason) to report for each violation.
+    if any rule is violated. Appends a ReportItem to report for each violation.
+    With a StyleResolver the effective (inherited) font is checked, otherwise
+    only the formatting set directly on the run.
 
-    Rules:
-      - Font size must be between 12 and 14 pt (inclusive)
-      - Font family must equal TARGET_FONT when explicitly set
+    Rules (values from the profile):
+      - Font size must be between min_font_size and max_font_size pt (inclusive)
+      - Font family must equal target_font when set
     """
-    font = run.font
+    font = styles.font(run._r, paragraph._p) if styles is not None else run.font
+    _check_font(run, paragraph, report, font, location, paragraph_text, highlight, profile)
+
 
+def _check_font(run: Run, paragraph: Paragraph, report: List[ReportItem],
+                font: Union[EffectiveFont, Font],
+                location: Optional[IssueLocation] = None,
+                paragraph_text: Optional[str] = None,
+                highlight: Highlight = True,
+                profile: RuleProfile = DEFAULT_PROFILE) -> None:
     # Font family check
     font_name: Optional[str] = font.name
-    if font_name is not None and font_name != TARGET_FONT:
+    target_font = profile.target_font
+    if font_name is not None and font_name != target_font:
         highlight_run(run, paragraph, report,
-                      f"Wrong font family: {font_name} (expected {TARGET_FONT})")
+                      f"Wrong font family: {font_name} (expected {target_font})",
+                      "font.family", target_font, font_name, location, paragraph_text, highlight)
 
     # Font size check
     size: Optional[Pt] = font.size
     if size is None:
-        return  # No explicit size (inherits style) — treat as OK
+        return  # No size set anywhere (application default) — treat as OK
 
-    size_pt = size.pt
-    if not (MIN_FONT_SIZE <= size_pt <= MAX_FONT_SIZE):
+    if profile.wrong_font_size(size):
+        size_pt = size.pt
+        size_range = f"{profile.min_font_size}-{profile.max_font_size}"
         highlight_run(run, paragraph, report,
-                      f"Text should be {MIN_FONT_SIZE}-{MAX_FONT_SIZE} pt (found {size_pt} pt)")
+                      f"Text should be {size_range} pt (found {size_pt} pt)",
+                      "font.size", size_range, size_pt, location, paragraph_text, highlight)
 
 
-def check_paragraph_font(paragraph: Paragraph, report: List[ReportItem]) -> None:
+def check_paragraph_font(paragraph: Paragraph, report: List[ReportItem],
+                         location: Optional[IssueLocation] = None,
+                         styles: Optional[StyleResolver] = None,
+                         profile: RuleProfile = DEFAULT_PROFILE) -> None:
     """
     Check all runs in a paragraph for font-family and size issues.
+    location, if given, is the paragraph's location; run indices are filled in.
     """
-    for run in paragraph.runs:
-        check_run_style(run, paragraph, report)
+    base = location if location is not None else IssueLocation()
+    for run_index, run in enumerate(paragraph.runs):
+        check_run_style(run, paragraph, report, replace(base, run_index=run_index), styles=styles,
+                        profile=profile)
 
 
-def check_table_font(table: Table, report: List[ReportItem]) -> None:
+def check_table_font(table: Table, report: List[ReportItem], styles: Optional[StyleResolver] = None,
+                     profile: RuleProfile = DEFAULT_PROFILE) -> None:
     """
     Check all paragraphs inside all cells of a table.
+    Merged cells are checked once; nested tables are included.
+    """
+    for position, cell in iter_table_cells(table):
+        for index, paragraph in enumerate(cell.paragraphs):
+            check_paragraph_font(paragraph, report, IssueLocation(
+                paragraph_index=index, table_index=position.table_index,
+                row_index=position.row_index, cell_index=position.cell_index), styles, profile)
+
+
+class FontCheckVisitor(DocumentVisitor):
+    """
+    Traversal visitor checking font family and size of every run,
+    in body paragraphs and in table cells alike.
+    With highlight=False issues are only recorded, the document is not modified;
+    with a Highlighter, runs are marked to be highlighted after the traversal.
+    With a StyleResolver, fonts inherited from styles are checked as well.
+    With FormatColumns extracted beforehand, runs without violations are skipped.
     """
-    for row in table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                check_paragraph_font(paragraph, report)
+
+    def __init__(self, report: List[ReportItem], highlight: Highlight = True,
+                 styles: Optional[StyleResolver] = None, profile: RuleProfile = DEFAULT_PROFILE,
+                 columns: Optional[FormatColumns] = None):
+        self.report = report
+        self.highlight = highlight
+        self.styles = styles
+        self.profile = profile
+        self.columns = columns
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        if self.columns is not None:
+            violations = self.columns.run_violations(run._r)
+            if violations == 0:
+                return
+            if violations is not None:
+                _check_font(run, ctx.paragraph, self.report, self.columns.font(run._r),
+                            ctx.location(run_index), ctx.info.text, self.highlight, self.profile)
+                return
+        check_run_style(run, ctx.paragraph, self.report, ctx.location(run_index), ctx.info.text,
+                        self.highlight, self.styles, self.profile)
@@ -0,0 +1,109 @@
+"""
+docx_utils/highlight.py
+
+Highlighting of the issues found by the checkers.
+The checkers do not modify the document while checking; they mark the
+runs and paragraphs with issues in a Highlighter, which collects the
+marks per paragraph. After the check, apply() colors every marked run red
+exactly once, however many issues it has, and can add one Word comment
+per paragraph listing all of its issues. Comments are only added in the
+main document part (body and its text boxes); headers, footers and notes
+are highlighted without them.
+"""
+
+from typing import Dict, Iterable, List, Optional
+from docx.document import Document as DocumentObject
+from docx.shared import RGBColor
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from docx_utils.instrumentation import timed
+
+
+HIGHLIGHT_COLOR = RGBColor(255, 0, 0)
+
+COMMENT_AUTHOR = "DOCX Format Validator"
+
+
+class _ParagraphMarks:
+    """
+    Marks of one paragraph: the whole paragraph or some of its runs,
+    and the reasons of all issues, without duplicates.
+    """
+
+    __slots__ = ("paragraph", "whole", "runs", "reasons")
+
+    def __init__(self, paragraph: Paragraph):
+        self.paragraph = paragraph
+        self.whole = False
+        self.runs: Dict[object, Run] = {}
+        self.reasons: Dict[str, None] = {}
+
+
+class Highlighter:
+    """
+    Collects the runs and paragraphs to highlight during a check and
+    highlights them in one pass afterwards.
+
+    Attributes:
+        comments: whether apply() adds a Word comment to every marked paragraph.
+    """
+
+    def __init__(self, comments: bool = False):
+        self.comments = comments
+        self._marks: Dict[object, _ParagraphMarks] = {}
+
+    def _marks_of(self, paragraph: Paragraph) -> _ParagraphMarks:
+        marks = self._marks.get(paragraph._p)
+        if marks is None:
+            marks = self._marks[paragraph._p] = _ParagraphMarks(paragraph)
+        return marks
+
+    def mark_run(self, run: Run, paragraph: Paragraph, reason: str) -> None:
+        """
+        Highlight run, a run of paragraph, for the given reason.
+        """
+        marks = self._marks_of(paragraph)
+        marks.runs.setdefault(run._r, run)
+        marks.reasons[reason] = None
+
+    def mark_paragraph(self, paragraph: Paragraph, reason: str) -> None:
+        """
+        Highlight all runs of paragraph for the given reason.
+        """
+        marks = self._marks_of(paragraph)
+        marks.whole = True
+        marks.reasons[reason] = None
+
+    @timed("highlight")
+    def apply(self, docx: Optional[DocumentObject] = None) -> int:
+        """
+        Color every marked run red once and, with comments enabled, add a
+        comment listing the reasons to every marked paragraph. The marks
+        are cleared afterwards.
+
+        Args:
+            docx: the checked Document; needed for comments only.
+
+        Returns:
+            int: Number of runs colored.
+        """
+        colored = 0
+        for marks in self._marks.values():
+            runs: List[Run] = marks.paragraph.runs if marks.whole else list(marks.runs.values())
+            color_runs_red(runs)
+            colored += len(runs)
+            if self.comments and docx is not None and runs and marks.paragraph.part is docx.part:
+                reasons = list(marks.reasons)
+                comment = docx.add_comment(runs, reasons[0], author=COMMENT_AUTHOR, initials="")
+                for reason in reasons[1:]:
+                    comment.add_paragraph(reason)
+        self._marks.clear()
+        return colored
+
+
+def color_runs_red(runs: Iterable[Run]) -> None:
+    """
+    Mark runs as incorrect by coloring their text red.
+    """
+    for run in runs:
+        run.font.color.rgb = HIGHLIGHT_COLOR
@@ -0,0 +1,225 @@
+"""
+docx_utils/incremental.py
+
+Incremental re-validation of edited documents.
+Each paragraph is fingerprinted by a digest of its XML, which covers its
+text, paragraph properties (pPr) and run properties (rPr). The issues found
+in every paragraph are stored together with its fingerprint; on the next
+run of the same document only paragraphs whose fingerprint is unknown are
+checked again, the stored issues of the others are reused. The title page
+marker is searched for again only when a paragraph up to it changed.
+
+Sections are cheap and always checked.
+
+The state is saved as JSON: fingerprints in hex and issues as
+ReportItem.to_dict() dicts, the same form as the entries of the result
+cache (see docx_utils.cache).
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+from lxml import etree
+from docx.section import Section
+from docx.table import _Cell
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from config.config import ReportItem
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx_utils.traversal import CellPosition, DocumentVisitor, ParagraphContext
+
+# Bump when the stored format or the checks change in a way that
+# makes saved states invalid
+STATE_VERSION = 2
+
+
+def paragraph_fingerprint(paragraph: Paragraph) -> bytes:
+    """
+    Digest of the paragraph XML (text, pPr and the rPr of its runs).
+    """
+    return hashlib.blake2b(etree.tostring(paragraph._p), digest_size=16).digest()
+
+
+def _context_fingerprint(ctx: ParagraphContext) -> bytes:
+    # The same paragraph is checked differently in a table (or outside the body,
+    # which has the same rules) or on the title page
+    return paragraph_fingerprint(ctx.paragraph) + bytes((ctx.in_table or ctx.in_story, ctx.in_title_page))
+
+
+class IncrementalState:
+    """
+    Results of the previous run of a document, saved between runs.
+
+    Attributes:
+        rules: rule settings the results were computed with; results for
+            other settings are discarded on load.
+        styles: fingerprint of the document's styles; inherited formatting
+            affects every paragraph, so results are discarded when it changes.
+        paragraphs: issues of each paragraph, by context fingerprint. Issue
+            locations are those of the previous run and are updated on reuse.
+        title_page: fingerprints of the paragraphs up to the title page marker.
+        title_page_end: index of the title page marker, or -1.
+    """
+
+    def __init__(self, profile: RuleProfile = DEFAULT_PROFILE):
+        self.rules = profile.fingerprint
+        self.styles: Optional[str] = None
+        self.paragraphs: Dict[bytes, List[ReportItem]] = {}
+        self.title_page: List[bytes] = []
+        self.title_page_end = -1
+
+    @classmethod
+    def load(cls, path: Union[str, Path], profile: RuleProfile = DEFAULT_PROFILE) -> "IncrementalState":
+        """
+        Load a saved state; returns an empty state if there is none, it
+        cannot be read, it was saved by another STATE_VERSION or it was
+        computed with the rules of a different profile.
+        """
+        state = cls(profile)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["version"] != STATE_VERSION or data["rules"] != profile.fingerprint:
+                return state
+            paragraphs = {bytes.fromhex(key): [ReportItem.from_dict(issue) for issue in issues]
+                          for key, issues in data["paragraphs"].items()}
+            title_page = [bytes.fromhex(fingerprint) for fingerprint in data["title_page"]]
+            title_page_end = int(data["title_page_end"])
+            styles = data["styles"]
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return state  # missing or corrupt
+        state.styles = styles
+        state.paragraphs = paragraphs
+        state.title_page = title_page
+        state.title_page_end = title_page_end
+        return state
+
+    def save(self, path: Union[str, Path]) -> None:
+        data = {
+            "version": STATE_VERSION,
+            "rules": self.rules,
+            "styles": self.styles,
+            "paragraphs": {key.hex(): [issue.to_dict() for issue in issues]
+                           for key, issues in self.paragraphs.items()},
+            "title_page": [fingerprint.hex() for fingerprint in self.title_page],
+            "title_page_end": self.title_page_end,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def use_rules(self, profile: RuleProfile) -> None:
+        """
+        Discard the stored results if they were computed with other rules.
+        """
+        if profile.fingerprint != self.rules:
+            self.paragraphs = {}
+            self.title_page = []
+            self.title_page_end = -1
+            self.rules = profile.fingerprint
+
+    def use_styles(self, fingerprint: str) -> None:
+        """
+        Discard the stored results if the document's styles changed.
+        """
+        if fingerprint != self.styles:
+            self.paragraphs = {}
+            self.styles = fingerprint
+
+    def known_title_page_end(self, paragraphs: Sequence[Paragraph]) -> Optional[int]:
+        """
+        Title page marker index of the previous run if no paragraph up to
+        it changed, None if it has to be searched for again.
+        """
+        end = self.title_page_end
+        if end < 0 or end >= len(paragraphs):
+            return None
+        for paragraph, fingerprint in zip(paragraphs, self.title_page):
+            if paragraph_fingerprint(paragraph) != fingerprint:
+                return None
+        return end
+
+    def update(self, results: Dict[bytes, List[ReportItem]],
+               paragraphs: Sequence[Paragraph], title_page_end: int) -> None:
+        """
+        Replace the stored results with those of the current run.
+        """
+        self.paragraphs = results
+        self.title_page_end = title_page_end
+        self.title_page = [paragraph_fingerprint(p) for p in paragraphs[:title_page_end + 1]]
+
+
+def state_path(state_dir: Union[str, Path], docx_path: Union[str, Path]) -> Path:
+    """
+    File holding the incremental state of a document inside state_dir.
+    """
+    name = hashlib.sha1(str(Path(docx_path).resolve()).encode("utf-8")).hexdigest()
+    return Path(state_dir) / f"{name}.state"
+
+
+class IncrementalCheckVisitor(DocumentVisitor):
+    """
+    Runs the wrapped checkers only on paragraphs that are not in the
+    previous run's state and reuses the stored issues of the others.
+
+    The checkers must append to buffer; their issues are moved to report
+    once the paragraph is done. With highlight=True, unchanged paragraphs
+    that had issues are checked again so they get highlighted.
+    """
+
+    def __init__(self, checkers: Sequence[DocumentVisitor], buffer: List[ReportItem],
+                 report: List[ReportItem], state: IncrementalState, highlight: bool = True):
+        self.checkers = checkers
+        self.buffer = buffer
+        self.report = report
+        self.state = state
+        self.highlight = highlight
+        self.results: Dict[bytes, List[ReportItem]] = {}
+        self.checked = 0
+        self.reused = 0
+        self._key: Optional[bytes] = None
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        key = _context_fingerprint(ctx)
+        issues = self.state.paragraphs.get(key)
+        if issues is not None and not (self.highlight and issues):
+            self._key = None
+            self.results[key] = issues
+            self.report.extend(replace(issue, location=ctx.location(issue.location.run_index))
+                               for issue in issues)
+            self.reused += 1
+            return
+
+        self._key = key
+        self.checked += 1
+        for checker in self.checkers:
+            checker.visit_paragraph(ctx)
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        if self._key is not None:
+            for checker in self.checkers:
+                checker.visit_run(run, run_index, ctx)
+
+    def leave_paragraph(self, ctx: ParagraphContext) -> None:
+        if self._key is None:
+            return
+        for checker in self.checkers:
+            checker.leave_paragraph(ctx)
+        issues = list(self.buffer)
+        self.buffer.clear()
+        self.results[self._key] = issues
+        self.report.extend(issues)
+
+    def visit_cell(self, cell: _Cell, position: CellPosition) -> None:
+        for checker in self.checkers:
+            checker.visit_cell(cell, position)
+
+    def visit_section(self, section: Section, index: int) -> None:
+        for checker in self.checkers:
+            checker.visit_section(section, index)
+        self.report.extend(self.buffer)
+        self.buffer.clear()
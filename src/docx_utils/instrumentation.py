@@ -0,0 +1,194 @@
+"""
+docx_utils/instrumentation.py
+
+Timing and counter instrumentation of the analysis.
+An Instrumentation collects the wall time of each stage (parse, each
+check, each fix, highlight, save), the number of paragraphs, runs, cells
+and sections visited and the number of issues per rule, and hands them to
+a sink as one record per document. A sink is any callable taking a dict,
+e.g. log_sink for structured logging or JsonLinesSink for a metrics file.
+
+Instrumentation is off unless an Instrumentation is passed to analyze_docx
+or activated around the work. When it is off, no visitors or wrappers are
+added to the traversal; the only remaining cost is one context variable
+lookup per highlighted document and per save.
+
+Stages may nest: the check stages are part of "check", which also includes the
+traversal itself. The visitors timing rules and counting visited elements
+(TimedVisitor, CountingVisitor) live in docx_utils.traversal; this module
+does not import python-docx.
+"""
+
+import functools
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar, Union
+from config.config import ReportItem
+
+
+MetricsSink = Callable[[Dict[str, Any]], None]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_active: ContextVar[Optional["Instrumentation"]] = ContextVar("instrumentation", default=None)
+
+
+def active_instrumentation() -> Optional["Instrumentation"]:
+    """
+    The Instrumentation activated in the current context, or None.
+    """
+    return _active.get()
+
+
+class Instrumentation:
+    """
+    Collects stage timings and counters of one document at a time.
+
+    Attributes:
+        sink: called with the record of each document by emit(); may be None
+            to only read the record returned by emit().
+        timings: seconds spent per stage.
+        counters: number of paragraphs, runs, cells and sections visited.
+        issues: number of issues per rule.
+    """
+
+    def __init__(self, sink: Optional[MetricsSink] = None):
+        self.sink = sink
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.issues: Dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_issues(self, issues: Iterable[ReportItem]) -> None:
+        """
+        Add issues found without a CountingReport, e.g. those of a cached
+        report, to the number of issues per rule.
+        """
+        for issue in issues:
+            self.issues[issue.rule] = self.issues.get(issue.rule, 0) + 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Add the wall time of the with-block to stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    @contextmanager
+    def activate(self) -> Iterator["Instrumentation"]:
+        """
+        Make this the active instrumentation inside the with-block, so that
+        functions decorated with timed() report into it.
+        """
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    def emit(self, **fields: Any) -> Dict[str, Any]:
+        """
+        Send the record of the current document to the sink and start
+        collecting a new one.
+
+        Args:
+            **fields: extra fields of the record, e.g. document=path.
+
+        Returns:
+            dict: the record: fields, timings, counters and issues.
+        """
+        record = {
+            **fields,
+            "timings": {stage: round(seconds, 6) for stage, seconds in self.timings.items()},
+            "counters": dict(self.counters),
+            "issues": dict(self.issues),
+        }
+        self.timings, self.counters, self.issues = {}, {}, {}
+        if self.sink is not None:
+            self.sink(record)
+        return record
+
+
+def measure(instrumentation: Optional[Instrumentation], stage: str):
+    """
+    instrumentation.stage(stage), or a no-op context without instrumentation.
+    """
+    return instrumentation.stage(stage) if instrumentation is not None else nullcontext()
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """
+    Decorator adding the wall time of every call to stage of the active
+    instrumentation. Without an active instrumentation the function is
+    called directly.
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            instrumentation = _active.get()
+            if instrumentation is None:
+                return func(*args, **kwargs)
+            with instrumentation.stage(stage):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+class CountingReport:
+    """
+    Report sink counting issues per rule before passing them on to report.
+    """
+
+    def __init__(self, report, instrumentation: Instrumentation):
+        self.report = report
+        self.issues = instrumentation.issues
+
+    def append(self, issue: ReportItem) -> None:
+        self.issues[issue.rule] = self.issues.get(issue.rule, 0) + 1
+        self.report.append(issue)
+
+    def extend(self, issues: Iterable[ReportItem]) -> None:
+        for issue in issues:
+            self.append(issue)
+
+    def __len__(self) -> int:
+        return len(self.report)
+
+
+def log_sink(logger: Optional[logging.Logger] = None, level: int = logging.INFO) -> MetricsSink:
+    """
+    Sink logging each record as a JSON message. The record is also attached
+    to the log record as its "metrics" attribute for structured handlers.
+    """
+    logger = logger or logging.getLogger("docx_utils.metrics")
+
+    def sink(record: Dict[str, Any]) -> None:
+        logger.log(level, json.dumps(record, ensure_ascii=False), extra={"metrics": record})
+    return sink
+
+
+class JsonLinesSink:
+    """
+    Sink appending each record as a line of a JSON Lines file. Every record
+    is written with a single append, so worker processes can share a file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
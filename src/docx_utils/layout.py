@@ -0,0 +1,370 @@
+"""
+docx_utils/layout.py
+
+Estimation of the page every top-level block of the body starts on.
+A .docx file does not store its page layout, so the pages are estimated
+in one cumulative pass over the body: a paragraph is as high as its
+number of lines (the width of its text, measured with a per-font table
+of character widths, divided by the width of the text area of its
+section minus the indents) times its line height (font size and line
+spacing), plus its inline pictures; a table row is as high as its highest
+cell. Blocks flow onto the next page when the text area (page size minus
+margins) is full; explicit page breaks, "page break before" paragraphs and
+section breaks other than continuous ones start a new page.
+
+The estimate ignores the space before and after paragraphs, widow
+control, floating objects, headers, footers and kerning. It is meant for
+grouping issues by approximate page, not for reproducing Word's layout.
+"""
+
+import functools
+import math
+from array import array
+from itertools import repeat
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from docx.document import Document as DocumentObject
+from docx.enum.section import WD_SECTION_START
+from docx.exceptions import InvalidXmlError
+from docx.oxml.ns import qn
+from docx.shared import Inches, Length, Pt, Twips
+from docx_utils.styles import StyleResolver
+
+W_P, W_R, W_TBL, W_TR, W_TC = qn("w:p"), qn("w:r"), qn("w:tbl"), qn("w:tr"), qn("w:tc")
+W_PPR, W_SECT_PR, W_HYPERLINK = qn("w:pPr"), qn("w:sectPr"), qn("w:hyperlink")
+W_T, W_TAB, W_BR, W_CR, W_DRAWING = qn("w:t"), qn("w:tab"), qn("w:br"), qn("w:cr"), qn("w:drawing")
+W_TYPE, W_VAL, W_W = qn("w:type"), qn("w:val"), qn("w:w")
+W_PAGE_BREAK_BEFORE, W_TC_PR, W_TC_W = qn("w:pageBreakBefore"), qn("w:tcPr"), qn("w:tcW")
+W_TR_PR, W_TR_HEIGHT = qn("w:trPr"), qn("w:trHeight")
+WP_INLINE, WP_EXTENT = qn("wp:inline"), qn("wp:extent")
+
+# Page geometry Word uses when a section does not set it (US Letter, 1 inch margins)
+DEFAULT_PAGE_WIDTH, DEFAULT_PAGE_HEIGHT = Inches(8.5), Inches(11)
+DEFAULT_MARGIN = Inches(1)
+# Font size of text without any size in the style hierarchy
+DEFAULT_FONT_SIZE = Pt(10)
+# Height of a single-spaced line as a multiple of the font size
+LINE_HEIGHT = 1.15
+# Average width, in em, of characters missing from the width tables (e.g. CJK text is wider)
+DEFAULT_CHAR_WIDTH = 0.6
+
+# Width of the fonts relative to the generic proportional table
+FONT_SCALE = {
+    "Times New Roman": 0.9, "Cambria": 0.97, "Georgia": 1.03, "Arial": 1.0, "Helvetica": 1.0,
+    "Calibri": 0.92, "Tahoma": 1.02, "Segoe UI": 1.0, "Verdana": 1.12,
+}
+MONOSPACE_FONTS = frozenset(("Courier New", "Courier", "Consolas", "Lucida Console", "Menlo"))
+MONOSPACE_WIDTH = 0.6
+
+# Characters whose width differs from their class average, in em
+_NARROW_CHARS = dict.fromkeys("ijlI.,:;'|!`", 0.26)
+_NARROW_CHARS.update(dict.fromkeys("frt()[]{}-\"/", 0.35))
+_WIDE_CHARS = dict.fromkeys("mwMWшщжюыфШЩЖЮМФ", 0.82)
+# Characters covered by the width tables: Latin, Greek and Cyrillic
+_TABLE_CHARS = [chr(code) for code in range(0x20, 0x530)] + ["\t"]
+
+_EXTRACT_ERRORS = (ValueError, TypeError, InvalidXmlError)
+
+
+@functools.lru_cache(maxsize=None)
+def char_widths(font_name: Optional[str]) -> Dict[str, float]:
+    """
+    Approximate advance width, in em, of the characters of a font; built
+    once per font name.
+
+    Args:
+        font_name: font family name, or None for an unknown font.
+
+    Returns:
+        Dict[str, float]: width of every Latin, Greek and Cyrillic character.
+    """
+    if font_name in MONOSPACE_FONTS:
+        return dict.fromkeys(_TABLE_CHARS, MONOSPACE_WIDTH)
+    scale = FONT_SCALE.get(font_name, 1.0)
+    widths = {}
+    for char in _TABLE_CHARS:
+        if char in _NARROW_CHARS:
+            width = _NARROW_CHARS[char]
+        elif char in _WIDE_CHARS:
+            width = _WIDE_CHARS[char]
+        elif char == "\t":
+            width = 2.0
+        elif char.isspace():
+            width = 0.25
+        elif char.isupper():
+            width = 0.66
+        elif char.islower() or char.isdigit():
+            width = 0.5
+        else:
+            width = 0.45
+        widths[char] = width * scale
+    return widths
+
+
+def text_width(text: str, widths: Dict[str, float]) -> float:
+    """
+    Width of a line of text in em, with the widths of char_widths.
+    """
+    return sum(map(widths.get, text, repeat(DEFAULT_CHAR_WIDTH)))
+
+
+class PageLayout:
+    """
+    Estimated pages of a document's body.
+
+    Attributes:
+        block_pages: page (1-based) each top-level body block (paragraphs and
+            tables counted together, as in walk_document) starts on.
+        section_pages: page each section starts on.
+        page_count: estimated number of pages.
+    """
+
+    def __init__(self):
+        self.block_pages = array("l")
+        self.section_pages = array("l")
+        self.page_count = 1
+
+    def blocks_in_pages(self, first: int, last: int) -> Set[int]:
+        """
+        Indices of the top-level blocks starting on pages first to last (inclusive).
+        """
+        return {i for i, page in enumerate(self.block_pages) if first <= page <= last}
+
+    def sections_in_pages(self, first: int, last: int) -> Set[int]:
+        """
+        Indices of the sections starting on pages first to last (inclusive).
+        """
+        return {i for i, page in enumerate(self.section_pages) if first <= page <= last}
+
+
+class _TextArea(NamedTuple):
+    """
+    Size of the text area of a section's pages and how the section starts.
+    """
+    width: int
+    height: int
+    start: Optional[WD_SECTION_START]
+
+
+_DEFAULT_AREA = _TextArea(DEFAULT_PAGE_WIDTH - 2 * DEFAULT_MARGIN, DEFAULT_PAGE_HEIGHT - 2 * DEFAULT_MARGIN,
+                          WD_SECTION_START.NEW_PAGE)
+
+
+def _text_area(section) -> _TextArea:
+    try:
+        page_width = section.page_width or DEFAULT_PAGE_WIDTH
+        page_height = section.page_height or DEFAULT_PAGE_HEIGHT
+        margins = [getattr(section, f"{side}_margin") for side in ("left", "right", "top", "bottom")]
+        start = section.start_type
+    except _EXTRACT_ERRORS:
+        page_width, page_height, margins, start = DEFAULT_PAGE_WIDTH, DEFAULT_PAGE_HEIGHT, [None] * 4, None
+    left, right, top, bottom = (DEFAULT_MARGIN if margin is None else margin for margin in margins)
+    # Degenerate geometry still gets a usable area
+    return _TextArea(max(page_width - left - right, Inches(1)), max(page_height - top - bottom, Inches(1)), start)
+
+
+class _PageCursor:
+    """
+    Current page and the height already filled on it.
+    """
+
+    def __init__(self, area: _TextArea):
+        self.area = area
+        self.page = 1
+        self.used = 0
+
+    def new_page(self) -> None:
+        self.page += 1
+        self.used = 0
+
+    def place(self, height: int, first_line: int) -> int:
+        """
+        Lay out content of the given height whose first line (or row) is
+        first_line high, and return the page it starts on.
+        """
+        area_height = self.area.height
+        if self.used and self.used + first_line > area_height:
+            self.new_page()
+        start = self.page
+        self.used += height
+        while self.used > area_height:
+            self.used -= area_height
+            self.page += 1
+        return start
+
+
+class _Measurer:
+    """
+    Heights of paragraphs and tables at a given text width.
+    """
+
+    def __init__(self, styles: StyleResolver):
+        self.styles = styles
+
+    def paragraph(self, p, width: int) -> Tuple[List[int], int]:
+        """
+        Heights of the parts of a w:p element separated by page breaks, and
+        the height of its first line.
+        """
+        styles = self.styles
+        runs = list(_runs(p))
+        try:
+            font = styles.font(runs[0], p) if runs else styles.mark_font(p)
+            fmt = styles.paragraph_format(p)
+        except _EXTRACT_ERRORS:
+            font, fmt = None, None
+        size = (font.size if font is not None else None) or DEFAULT_FONT_SIZE
+        spacing = (fmt.line_spacing if fmt is not None else None) or 1.0
+        line_height = int(spacing) if isinstance(spacing, Length) else int(size * LINE_HEIGHT * spacing)
+        width -= (fmt.left_indent or 0) + (fmt.right_indent or 0) if fmt is not None else 0
+        width = max(width, Inches(0.5))
+        first_line_indent = (fmt.first_line_indent or 0) if fmt is not None else 0
+
+        widths = char_widths(font.name if font is not None else None)
+        text, pictures = _layout_text(runs)
+        heights = []
+        for part in text.split("\f"):
+            lines = 0
+            for line in part.split("\n"):
+                line_width = text_width(line, widths) * size + first_line_indent
+                lines += max(1, math.ceil(line_width / width))
+                first_line_indent = 0
+            heights.append(lines * line_height)
+        heights[-1] += pictures
+        # A single line holding a picture cannot be split from it
+        return heights, heights[0] if len(heights) == 1 and lines == 1 else line_height
+
+    def table(self, tbl, width: int) -> Tuple[int, int]:
+        """
+        Height of a w:tbl element and of its first row.
+        """
+        height, first_row = 0, 0
+        for tr in tbl.iterchildren(W_TR):
+            cells = list(tr.iterchildren(W_TC))
+            row_height = _row_min_height(tr)
+            for tc in cells:
+                cell_width = _cell_width(tc, width, len(cells))
+                row_height = max(row_height, self.blocks(tc, cell_width))
+            height += row_height
+            first_row = first_row or row_height
+        return height, first_row
+
+    def blocks(self, container, width: int) -> int:
+        """
+        Total height of the paragraphs and tables directly inside container.
+        """
+        height = 0
+        for child in container:
+            if child.tag == W_P:
+                height += sum(self.paragraph(child, width)[0])
+            elif child.tag == W_TBL:
+                height += self.table(child, width)[0]
+        return height
+
+
+def _runs(p) -> Iterable:
+    for child in p:
+        if child.tag == W_R:
+            yield child
+        elif child.tag == W_HYPERLINK:
+            yield from child.iterchildren(W_R)
+
+
+def _layout_text(runs: Iterable) -> Tuple[str, int]:
+    """
+    Text of runs with line breaks as "\\n" and page breaks as "\\f", and the
+    height of their inline pictures in EMU.
+    """
+    parts = []
+    pictures = 0
+    for r in runs:
+        for child in r:
+            tag = child.tag
+            if tag == W_T:
+                parts.append(child.text or "")
+            elif tag == W_TAB:
+                parts.append("\t")
+            elif tag == W_BR:
+                parts.append("\f" if child.get(W_TYPE) == "page" else "\n")
+            elif tag == W_CR:
+                parts.append("\n")
+            elif tag == W_DRAWING:
+                for inline in child.iterchildren(WP_INLINE):
+                    extent = inline.find(WP_EXTENT)
+                    if extent is not None and extent.get("cy", "").isdigit():
+                        pictures += int(extent.get("cy"))
+    return "".join(parts), pictures
+
+
+def _row_min_height(tr) -> int:
+    trPr = tr.find(W_TR_PR)
+    height = trPr.find(W_TR_HEIGHT) if trPr is not None else None
+    value = height.get(W_VAL) if height is not None else None
+    return Twips(int(value)) if value is not None and value.isdigit() else 0
+
+
+def _cell_width(tc, table_width: int, cell_count: int) -> int:
+    tcPr = tc.find(W_TC_PR)
+    tcW = tcPr.find(W_TC_W) if tcPr is not None else None
+    if tcW is not None and tcW.get(W_TYPE, "dxa") == "dxa" and (tcW.get(W_W) or "").isdigit():
+        width = Twips(int(tcW.get(W_W)))
+        if width:
+            return width
+    return table_width // max(cell_count, 1)
+
+
+def _page_break_before(p) -> bool:
+    pPr = p.find(W_PPR)
+    flag = pPr.find(W_PAGE_BREAK_BEFORE) if pPr is not None else None
+    return flag is not None and flag.get(W_VAL, "true") not in ("0", "false", "off")
+
+
+def estimate_pages(docx: DocumentObject, styles: Optional[StyleResolver] = None) -> PageLayout:
+    """
+    Estimate the page every top-level body block and every section starts on.
+    The body is measured once, from the first block to the last.
+
+    Args:
+        docx: Document object.
+        styles: resolver of inherited formatting; built from the document if omitted.
+
+    Returns:
+        PageLayout: the estimated pages.
+    """
+    if styles is None:
+        styles = StyleResolver.from_document(docx)
+    areas = [_text_area(section) for section in docx.sections] or [_DEFAULT_AREA]
+    measure = _Measurer(styles)
+    layout = PageLayout()
+    cursor = _PageCursor(areas[0])
+    layout.section_pages.append(1)
+
+    body_blocks = (child for child in docx.element.body if child.tag == W_P or child.tag == W_TBL)
+    for block in body_blocks:
+        width = cursor.area.width
+        if block.tag == W_TBL:
+            height, first_row = measure.table(block, width)
+            layout.block_pages.append(cursor.place(height, first_row))
+            continue
+
+        if _page_break_before(block) and cursor.used:
+            cursor.new_page()
+        heights, first_line = measure.paragraph(block, width)
+        layout.block_pages.append(cursor.place(heights[0], first_line))
+        for height in heights[1:]:
+            cursor.new_page()
+            cursor.place(height, 0)
+
+        pPr = block.find(W_PPR)
+        if pPr is not None and pPr.find(W_SECT_PR) is not None and len(layout.section_pages) < len(areas):
+            # The paragraph ends its section; the next one starts after it
+            area = areas[len(layout.section_pages)]
+            cursor.area = area
+            if area.start not in (WD_SECTION_START.CONTINUOUS, WD_SECTION_START.NEW_COLUMN):
+                cursor.new_page()
+                if (area.start is WD_SECTION_START.ODD_PAGE and cursor.page % 2 == 0
+                        or area.start is WD_SECTION_START.EVEN_PAGE and cursor.page % 2 == 1):
+                    cursor.new_page()
+            layout.section_pages.append(cursor.page)
+
+    layout.page_count = cursor.page
+    return layout
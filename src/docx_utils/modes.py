@@ -0,0 +1,22 @@
+"""
+docx_utils/modes.py
+
+Analysis modes. Kept free of python-docx imports, so entry points can
+parse their options and answer from the result cache without loading it.
+"""
+
+from enum import Enum
+
+
+class AnalysisMode(str, Enum):
+    """
+    What analyze_docx produces. Each mode skips the work the others need.
+    """
+    FULL = "full"            # report, highlighted copy and auto-fixed copy
+    REPORT = "report"        # report only; the document is not modified
+    HIGHLIGHT = "highlight"  # report and highlighted copy
+    FIX = "fix"              # auto-fixed copy only; no issues are reported
+
+
+# Top-level paragraphs and tables per window of chunked processing (see docx_utils.chunked)
+DEFAULT_CHUNK_BLOCKS = 200
@@ -5,42 +5,75 @@ Module for checking page margins in a DOCX document.
 Adds entries to the report if margins do not match the required values.
 """
 
-from typing import List
+from typing import List, Optional
 from docx.document import Document as DocumentObject
-from config.config import ReportItem
-from docx.shared import Cm
-from config.config import TOP_MARGIN_CM, BOTTOM_MARGIN_CM, LEFT_MARGIN_CM, RIGHT_MARGIN_CM
+from config.config import ReportItem, IssueLocation
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx.section import Section
+from docx_utils.columns import FormatColumns
+from docx_utils.layout import PageLayout
+from docx_utils.traversal import DocumentVisitor
 
-def check_page_margins(docx: DocumentObject, report: List[ReportItem]) -> None:
+
+def check_section_margins(section: Section, index: int, report: List[ReportItem],
+                          profile: RuleProfile = DEFAULT_PROFILE, page: Optional[int] = None) -> None:
+    """
+    Check that a single section has the required page margins.
+    Margins are compared in EMU against the profile's precomputed values,
+    rounded to 0.01 cm.
+
+    Args:
+        section: Section object.
+        index: zero-based index of the section in the document.
+        report: List to append any margin inconsistencies.
+        profile: rule profile with the required margins.
+        page: estimated page the section starts on, if known.
+    """
+    for side, expected_cm, expected_emu in profile.margins_emu:
+        margin = getattr(section, f"{side}_margin")
+        if not profile.wrong_margin(margin, expected_emu):
+            continue
+        actual_cm = margin.cm if margin is not None else 0.0
+        report.append(ReportItem(
+            rule=f"margin.{side}",
+            reason=f"{side.capitalize()} margin should be {expected_cm} cm (found {actual_cm:.2f} cm)",
+            paragraph_text=f"Section {index+1}",
+            expected=expected_cm,
+            actual=round(actual_cm, 2),
+            location=IssueLocation(section_index=index, page=page)
+        ))
+
+
+class PageMarginsCheckVisitor(DocumentVisitor):
+    """
+    Traversal visitor checking the page margins of every section.
+    With FormatColumns extracted beforehand, sections without violations are skipped;
+    with a PageLayout, issues get the page the section starts on.
+    """
+
+    def __init__(self, report: List[ReportItem], profile: RuleProfile = DEFAULT_PROFILE,
+                 columns: Optional[FormatColumns] = None, layout: Optional[PageLayout] = None):
+        self.report = report
+        self.profile = profile
+        self.columns = columns
+        self.layout = layout
+
+    def visit_section(self, section: Section, index: int) -> None:
+        if self.columns is not None and self.columns.section_violations(section._sectPr) == 0:
+            return
+        page = self.layout.section_pages[index] if self.layout is not None else None
+        check_section_margins(section, index, self.report, self.profile, page)
+
+
+def check_page_margins(docx: DocumentObject, report: List[ReportItem],
+                       profile: RuleProfile = DEFAULT_PROFILE) -> None:
     """
     Check that all sections of the document have the required page margins.
 
     Args:
         docx: Document object.
         report: List to append any margin inconsistencies.
+        profile: rule profile with the required margins.
     """
     for i, section in enumerate(docx.sections):
-        if round(section.top_margin.cm, 2) != TOP_MARGIN_CM:
-            report.append({
-                "run": None,
-                "paragraph_text": f"Section {i+1}",
-                "reason": f"Top margin should be {TOP_MARGIN_CM} cm (found {section.top_margin.cm:.2f} cm)"
-            })
-        if round(section.bottom_margin.cm, 2) != BOTTOM_MARGIN_CM:
-            report.append({
-                "run": None,
-                "paragraph_text": f"Section {i+1}",
-                "reason": f"Bottom margin should be {BOTTOM_MARGIN_CM} cm (found {section.bottom_margin.cm:.2f} cm)"
-            })
-        if round(section.left_margin.cm, 2) != LEFT_MARGIN_CM:
-            report.append({
-                "run": None,
-                "paragraph_text": f"Section {i+1}",
-                "reason": f"Left margin should be {LEFT_MARGIN_CM} cm (found {section.left_margin.cm:.2f} cm)"
-            })
-        if round(section.right_margin.cm, 2) != RIGHT_MARGIN_CM:
-            report.append({
-                "run": None,
-                "paragraph_text": f"Section {i+1}",
-                "reason": f"Right margin should be {RIGHT_MARGIN_CM} cm (found {section.right_margin.cm:.2f} cm)"
-            })
+        check_section_margins(section, i, report, profile)
@@ -0,0 +1,388 @@
+"""
+docx_utils/prescan.py
+
+Fast pre-scan of the raw main document XML.
+Streams word/document.xml straight from the zip package with lxml iterparse
+and checks the formatting behind font_check, alignment_check and page_margins
+(fonts, alignment, indents, line spacing and margins) without building the
+python-docx object model. Only one paragraph, or table row, is kept in
+memory at a time. Inherited formatting is resolved with the same
+StyleResolver the checkers use. The small header, footer, footnotes and
+endnotes parts and the text boxes are scanned as a whole: the result only
+says whether any of them may violate a rule.
+
+The pre-scan interprets formatting exactly like the checkers do, and
+errs on the side of flagging: a block it reports as clean has no issues,
+while a flagged block may still turn out to be fine in the full check.
+"""
+
+import posixpath
+import zipfile
+from typing import IO, Dict, List, Sequence, Set, Tuple, Union
+from lxml import etree
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.exceptions import InvalidXmlError
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.simpletypes import ST_SignedTwipsMeasure
+from config.profiles import DEFAULT_PROFILE, MARGIN_TOLERANCE_EMU, RuleProfile
+from docx_utils.classification import ParagraphInfo, ParagraphKind, paragraph_text
+from docx_utils.styles import EffectiveFont, EffectiveParagraphFormat, StyleResolver
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def _w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY, W_P, W_TBL, W_TR, W_TC = _w("body"), _w("p"), _w("tbl"), _w("tr"), _w("tc")
+W_R, W_HYPERLINK, W_PPR, W_RPR = _w("r"), _w("hyperlink"), _w("pPr"), _w("rPr")
+W_SECTPR, W_PGMAR = _w("sectPr"), _w("pgMar")
+W_TCPR, W_VMERGE, W_HMERGE = _w("tcPr"), _w("vMerge"), _w("hMerge")
+W_VAL = _w("val")
+W_TXBX_CONTENT, W_FOOTNOTE, W_ENDNOTE, W_TYPE = _w("txbxContent"), _w("footnote"), _w("endnote"), _w("type")
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+# Parts holding the stories of stories.iter_stories, apart from the text boxes
+STORY_RELS = (RT.HEADER, RT.FOOTER, RT.FOOTNOTES, RT.ENDNOTES)
+
+
+class PrescanResult:
+    """
+    Outcome of a pre-scan.
+
+    Attributes:
+        suspicious_blocks: indices of top-level body blocks (paragraphs and
+            tables, counted together) that may violate a rule.
+        sections_suspicious: True if any section may have wrong margins.
+        title_page_end: index of the title page marker among top-level body
+            paragraphs, or -1 if there is none.
+        stories_suspicious: True if any header, footer, note or text box
+            may violate a rule.
+    """
+
+    __slots__ = ("suspicious_blocks", "sections_suspicious", "title_page_end", "stories_suspicious")
+
+    def __init__(self, suspicious_blocks: Set[int], sections_suspicious: bool, title_page_end: int,
+                 stories_suspicious: bool = False):
+        self.suspicious_blocks = suspicious_blocks
+        self.sections_suspicious = sections_suspicious
+        self.title_page_end = title_page_end
+        self.stories_suspicious = stories_suspicious
+
+    @property
+    def clean(self) -> bool:
+        return not self.suspicious_blocks and not self.sections_suspicious and not self.stories_suspicious
+
+
+def main_part_name(package: zipfile.ZipFile) -> str:
+    """
+    Find the main document part through the package relationships.
+    """
+    try:
+        rels = etree.fromstring(package.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+        if rel.get("Type") == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get("Target").lstrip("/"))
+    return "word/document.xml"
+
+
+def _runs(p: etree._Element) -> List[etree._Element]:
+    runs = [child for child in p if child.tag == W_R]
+    for hyperlink in p.iterchildren(W_HYPERLINK):
+        runs.extend(hyperlink.iterchildren(W_R))
+    return runs
+
+
+def _merge_continuation(tc: etree._Element) -> bool:
+    """
+    Same as traversal._is_merge_continuation: such cells are not checked.
+    """
+    tcPr = tc.find(W_TCPR)
+    if tcPr is None:
+        return False
+    return any(merge is not None and merge.get(W_VAL, "continue") == "continue"
+               for merge in (tcPr.find(W_VMERGE), tcPr.find(W_HMERGE)))
+
+
+def _release(elem: etree._Element) -> None:
+    """
+    Drop a processed element to keep memory bounded: clear it and remove
+    the processed siblings of the same kind before it.
+    """
+    elem.clear()
+    parent = elem.getparent()
+    previous = elem.getprevious()
+    while previous is not None and previous.tag == elem.tag:
+        parent.remove(previous)
+        previous = elem.getprevious()
+
+
+def _runs_suspicious(fonts: Sequence[EffectiveFont], profile: RuleProfile) -> bool:
+    """
+    Font family and size rules of font_check.
+    """
+    for font in fonts:
+        if font.name is not None and font.name != profile.target_font:
+            return True
+        if font.size is not None and profile.wrong_font_size(font.size):
+            return True
+    return False
+
+
+def _format_suspicious(paragraph_format: EffectiveParagraphFormat, check_first_line: bool,
+                       profile: RuleProfile) -> bool:
+    """
+    Indentation and line spacing rules of alignment_check.check_paragraph_format.
+    """
+    if check_first_line and profile.wrong_indent(paragraph_format.first_line_indent, profile.first_line_indent_emu):
+        return True
+    if profile.wrong_indent(paragraph_format.left_indent, profile.left_indent_emu):
+        return True
+    if profile.wrong_indent(paragraph_format.right_indent, profile.right_indent_emu):
+        return True
+    line_spacing = paragraph_format.line_spacing if paragraph_format.line_spacing else 1.0
+    return abs(line_spacing - profile.line_spacing) > 1e-2
+
+
+def _body_paragraph_suspicious(info: ParagraphInfo, paragraph_format: EffectiveParagraphFormat,
+                               fonts: Sequence[EffectiveFont], profile: RuleProfile) -> bool:
+    """
+    Alignment, caption and format rules of alignment_check.check_body_paragraph.
+    """
+    if not info.stripped:
+        return False
+
+    if info.kind is ParagraphKind.IMAGE_CAPTION:
+        expected = WD_ALIGN_PARAGRAPH.CENTER
+    elif info.kind is ParagraphKind.TABLE_CAPTION:
+        expected = WD_ALIGN_PARAGRAPH.RIGHT
+    else:
+        expected = WD_ALIGN_PARAGRAPH.JUSTIFY
+    if paragraph_format.alignment != expected:
+        return True
+
+    if info.is_caption:
+        if not info.has_caption_text:
+            return True
+        if any(font.bold or font.italic or font.underline for font in fonts):
+            return True
+
+    return _format_suspicious(paragraph_format, True, profile)
+
+
+def _table_paragraph_suspicious(p: etree._Element, styles: StyleResolver, profile: RuleProfile) -> bool:
+    """
+    Rules of table paragraphs: fonts and format, never the first-line rule.
+    """
+    try:
+        style_id = styles.paragraph_style_id(p)
+        return (_runs_suspicious(styles.fonts(_runs(p), p, style_id), profile)
+                or _format_suspicious(styles.paragraph_format(p, style_id), False, profile))
+    except (ValueError, TypeError, InvalidXmlError):
+        return True
+
+
+def _story_paragraph_suspicious(p: etree._Element, styles: StyleResolver, profile: RuleProfile) -> bool:
+    """
+    Rules of paragraphs outside the body, the same as for table paragraphs.
+    """
+    parent = p.getparent()
+    if parent is not None and parent.tag == W_TC and _merge_continuation(parent):
+        return False
+    return _table_paragraph_suspicious(p, styles, profile)
+
+
+def _story_parts_suspicious(package: zipfile.ZipFile, parts: Dict[str, List[str]], styles: StyleResolver,
+                            profile: RuleProfile) -> bool:
+    """
+    Whether any paragraph of the header, footer, footnotes or endnotes parts
+    may violate a rule. Separator notes are skipped like in stories.iter_stories.
+    """
+    for reltype in STORY_RELS:
+        for name in parts.get(reltype, ()):
+            try:
+                root = etree.fromstring(package.read(name))
+            except KeyError:
+                continue
+            if reltype in (RT.FOOTNOTES, RT.ENDNOTES):
+                stories = [note for note in root.iterchildren(W_FOOTNOTE, W_ENDNOTE)
+                           if note.get(W_TYPE, "normal") == "normal"]
+            else:
+                stories = [root]
+            for story in stories:
+                if any(_story_paragraph_suspicious(p, styles, profile) for p in story.iter(W_P)):
+                    return True
+    return False
+
+
+def _margins_suspicious(sectPr: etree._Element, profile: RuleProfile) -> bool:
+    """
+    Margin rules of page_margins.check_section_margins.
+    """
+    pgMar = sectPr.find(W_PGMAR)
+    if pgMar is None:
+        return True
+    for side, _, expected_emu in profile.margins_emu:
+        value = pgMar.get(_w(side))
+        if value is None or abs(ST_SignedTwipsMeasure.convert_from_xml(value) - expected_emu) >= MARGIN_TOLERANCE_EMU:
+            return True
+    return False
+
+
+def part_relationships(package: zipfile.ZipFile, part: str) -> Dict[str, Tuple[str, str]]:
+    """
+    The internal relationships of a part: relationship type and target part
+    name, by relationship id.
+    """
+    folder = posixpath.dirname(part)
+    relationships: Dict[str, Tuple[str, str]] = {}
+    try:
+        rels = etree.fromstring(package.read(posixpath.join(folder, "_rels", posixpath.basename(part) + ".rels")))
+    except KeyError:
+        return relationships
+    for rel in rels.iter(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+        if rel.get("TargetMode") != "External":
+            target = rel.get("Target")
+            name = target.lstrip("/") if target.startswith("/") else posixpath.join(folder, target)
+            relationships[rel.get("Id")] = (rel.get("Type"), posixpath.normpath(name))
+    return relationships
+
+
+def _related_parts(package: zipfile.ZipFile, main_part: str) -> Dict[str, List[str]]:
+    """
+    Names of the internal parts related to the main document part, by relationship type.
+    """
+    parts: Dict[str, List[str]] = {}
+    for reltype, name in part_relationships(package, main_part).values():
+        parts.setdefault(reltype, []).append(name)
+    return parts
+
+
+def _style_resolver(package: zipfile.ZipFile, parts: Dict[str, List[str]]) -> StyleResolver:
+    """
+    Build a StyleResolver from the styles and theme parts of the main document part.
+    """
+    roots = {}
+    for reltype in (RT.STYLES, RT.THEME):
+        for name in parts.get(reltype, ()):
+            try:
+                roots[reltype] = etree.fromstring(package.read(name))
+            except KeyError:
+                pass
+    return StyleResolver(roots.get(RT.STYLES), roots.get(RT.THEME))
+
+
+def prescan_docx(docx_file: Union[str, IO[bytes]], profile: RuleProfile = DEFAULT_PROFILE) -> PrescanResult:
+    """
+    Pre-scan a DOCX file and report which parts may violate a rule.
+
+    Args:
+        docx_file: Path to the DOCX file or a binary file object.
+        profile: rule profile to check against.
+
+    Returns:
+        PrescanResult: suspicious blocks, sections and stories, and the title page marker.
+    """
+    suspicious_blocks: Set[int] = set()
+    sections_suspicious = False
+    # Depth of nested text boxes and of alternate content fallbacks (the VML
+    # copies of text boxes, not checked) around the current element
+    textbox_depth = 0
+    fallback_depth = 0
+    title_page_end = -1
+    # Paragraphs flagged only by rules that do not apply to the title page,
+    # kept until we know whether a title page marker follows them
+    pending: List[int] = []
+
+    block_index = 0
+    paragraph_index = 0
+    table_suspicious = False
+
+    with zipfile.ZipFile(docx_file) as package:
+        main_part = main_part_name(package)
+        parts = _related_parts(package, main_part)
+        styles = _style_resolver(package, parts)
+        stories_suspicious = _story_parts_suspicious(package, parts, styles, profile)
+        with package.open(main_part) as xml:
+            for event, elem in etree.iterparse(xml, events=("start", "end"),
+                                               tag=(W_P, W_TBL, W_TR, W_SECTPR, W_TXBX_CONTENT, MC_FALLBACK)):
+                if elem.tag == W_TXBX_CONTENT:
+                    textbox_depth += 1 if event == "start" else -1
+                    continue
+                if elem.tag == MC_FALLBACK:
+                    fallback_depth += 1 if event == "start" else -1
+                    continue
+                if event == "start":
+                    continue
+                if textbox_depth:
+                    # Text box paragraphs (and tables) belong to a story of their own
+                    if elem.tag == W_P and not stories_suspicious and not fallback_depth:
+                        stories_suspicious = _story_paragraph_suspicious(elem, styles, profile)
+                    continue
+
+                parent = elem.getparent()
+                parent_tag = parent.tag if parent is not None else None
+
+                if elem.tag == W_SECTPR:
+                    if parent_tag == W_BODY or (parent_tag == W_PPR and parent.getparent().getparent().tag == W_BODY):
+                        sections_suspicious = sections_suspicious or _margins_suspicious(elem, profile)
+                    continue
+
+                if elem.tag == W_TR:
+                    # The paragraphs of the row were checked at their end events
+                    _release(elem)
+                    continue
+
+                if elem.tag == W_P and parent_tag == W_TC:
+                    # The cell's tcPr comes before its paragraphs, so they can be dropped
+                    if not table_suspicious and not _merge_continuation(parent):
+                        table_suspicious = _table_paragraph_suspicious(elem, styles, profile)
+                    _release(elem)
+                    continue
+
+                if parent_tag != W_BODY:
+                    # Content controls etc. are not checked
+                    _release(elem)
+                    continue
+
+                if elem.tag == W_TBL:
+                    if table_suspicious:
+                        suspicious_blocks.add(block_index)
+                    table_suspicious = False
+                else:
+                    try:
+                        style_id = styles.paragraph_style_id(elem)
+                        fonts = styles.fonts(_runs(elem), elem, style_id)
+                        fonts_suspicious = _runs_suspicious(fonts, profile)
+                        if fonts_suspicious:
+                            suspicious_blocks.add(block_index)
+                        text = paragraph_text(elem)
+                        if title_page_end < 0 and profile.title_page_re.search(text):
+                            # Everything up to the marker is the title page
+                            title_page_end = paragraph_index
+                            pending.clear()
+                        # A block flagged by its fonts needs no other rule
+                        elif not fonts_suspicious and _body_paragraph_suspicious(
+                                ParagraphInfo(text), styles.paragraph_format(elem, style_id), fonts, profile):
+                            if title_page_end < 0:
+                                pending.append(block_index)
+                            else:
+                                suspicious_blocks.add(block_index)
+                    except (ValueError, TypeError, InvalidXmlError):
+                        suspicious_blocks.add(block_index)
+                    paragraph_index += 1
+
+                block_index += 1
+                # Drop the processed block to keep memory bounded
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+    suspicious_blocks.update(pending)
+    return PrescanResult(suspicious_blocks, sections_suspicious, title_page_end, stories_suspicious)
@@ -0,0 +1,206 @@
+"""
+docx_utils/report.py
+
+Module for writing detected formatting issues to a report file.
+Report writers are streaming sinks: they can be passed to analyze_docx
+in place of the report list, and each issue is written as soon as it is
+found instead of being buffered. The text of a paragraph is written only
+once, even if the paragraph has several issues.
+
+Supported formats: "text" (human-readable), "jsonl" (JSON Lines), "csv".
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterable, TextIO, Tuple, Type, Union
+from config.config import ReportItem, IssueLocation
+
+
+def _context_key(location: IssueLocation) -> Tuple[Union[str, int, None], ...]:
+    """
+    Identify the paragraph (or section) an issue belongs to.
+    """
+    return (location.story, location.story_index, location.paragraph_index, location.table_index,
+            location.row_index, location.cell_index, location.section_index)
+
+
+class ReportWriter:
+    """
+    Base class for streaming report writers.
+
+    Issues are added with append(), like with a report list, and written
+    immediately. Each distinct paragraph context gets a numeric id; the
+    first issue of a paragraph introduces its text, later ones only refer
+    to it. Issues with an estimated page are counted per page (page_counts).
+    Use as a context manager or call close() when done.
+    """
+
+    extension = ".txt"
+
+    def __init__(self, stream: TextIO, close_stream: bool = False):
+        self.stream = stream
+        self.count = 0
+        self.page_counts: Dict[int, int] = {}
+        self._close_stream = close_stream
+        self._contexts: Dict[Tuple[Union[str, int, None], ...], int] = {}
+
+    def append(self, issue: ReportItem) -> None:
+        key = _context_key(issue.location)
+        context_id = self._contexts.get(key)
+        is_new_context = context_id is None
+        if is_new_context:
+            context_id = len(self._contexts)
+            self._contexts[key] = context_id
+        self.count += 1
+        page = issue.location.page
+        if page is not None:
+            self.page_counts[page] = self.page_counts.get(page, 0) + 1
+        self.write_issue(issue, context_id, is_new_context)
+
+    def extend(self, issues: Iterable[ReportItem]) -> None:
+        for issue in issues:
+            self.append(issue)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def write_issue(self, issue: ReportItem, context_id: int, is_new_context: bool) -> None:
+        raise NotImplementedError
+
+    def write_footer(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.write_footer()
+        if self._close_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class TextReportWriter(ReportWriter):
+    """
+    Human-readable report. Paragraphs outside the body are labeled with
+    their story, e.g. "(footer 1)", and paragraphs with an estimated page
+    with it, e.g. "(page 3)". The total number of issues is written at the
+    end, followed by the number of issues per page if pages were estimated.
+    """
+
+    extension = ".txt"
+
+    def write_issue(self, issue: ReportItem, context_id: int, is_new_context: bool) -> None:
+        if is_new_context:
+            location = issue.location
+            if location.story is not None:
+                label = f" ({location.story} {location.story_index + 1})"
+            elif location.page is not None:
+                label = f" (page {location.page})"
+            else:
+                label = ""
+            self.stream.write(f"Context paragraph{label}: '{issue.paragraph_text}'\n")
+        run_text = issue.text if issue.text else "<No run text>"
+        self.stream.write(f"  Issue found: '{run_text}' - {issue.reason}\n")
+
+    def write_footer(self) -> None:
+        if self.count == 0:
+            self.stream.write("No formatting issues found. Document conforms to standards.\n")
+        else:
+            self.stream.write(f"\nTotal issues found: {self.count}\n")
+        if self.page_counts:
+            self.stream.write("Issues per estimated page:\n")
+            for page, count in sorted(self.page_counts.items()):
+                self.stream.write(f"  Page {page}: {count}\n")
+            other = self.count - sum(self.page_counts.values())
+            if other:
+                self.stream.write(f"  Headers, footers, notes and text boxes: {other}\n")
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    One JSON object per line. A {"type": "paragraph", "id", "text"} record
+    precedes the first issue of each paragraph; {"type": "issue", ...}
+    records refer to it through "paragraph_id".
+    """
+
+    extension = ".jsonl"
+
+    def write_issue(self, issue: ReportItem, context_id: int, is_new_context: bool) -> None:
+        if is_new_context:
+            self._write({"type": "paragraph", "id": context_id, "text": issue.paragraph_text})
+        record = {"type": "issue", **issue.to_dict(), "paragraph_id": context_id}
+        del record["paragraph_text"]
+        self._write(record)
+
+    def _write(self, record: dict) -> None:
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write("\n")
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    One row per issue. paragraph_text is filled only on the first row of
+    each paragraph; later rows of the same paragraph share its paragraph_id.
+    """
+
+    extension = ".csv"
+
+    LOCATION_FIELDS = ("paragraph_index", "run_index", "table_index",
+                       "row_index", "cell_index", "section_index", "story", "story_index", "page")
+    FIELDS = ("rule", "reason", "text", "expected", "actual") + LOCATION_FIELDS + ("paragraph_id", "paragraph_text")
+
+    def __init__(self, stream: TextIO, close_stream: bool = False):
+        super().__init__(stream, close_stream)
+        self._writer = csv.writer(stream)
+        self._writer.writerow(self.FIELDS)
+
+    def write_issue(self, issue: ReportItem, context_id: int, is_new_context: bool) -> None:
+        location = issue.location
+        self._writer.writerow(
+            [issue.rule, issue.reason, issue.text, issue.expected, issue.actual]
+            + [getattr(location, name) for name in self.LOCATION_FIELDS]
+            + [context_id, issue.paragraph_text if is_new_context else ""]
+        )
+
+
+REPORT_FORMATS: Dict[str, Type[ReportWriter]] = {
+    "text": TextReportWriter,
+    "jsonl": JsonLinesReportWriter,
+    "csv": CsvReportWriter,
+}
+
+
+def open_report_writer(report_path: Union[str, Path], report_format: str = "text") -> ReportWriter:
+    """
+    Opens a streaming report writer on a file.
+
+    Args:
+        report_path (str | Path): Path of the report file.
+        report_format (str): One of REPORT_FORMATS.
+
+    Returns:
+        ReportWriter: Writer that must be closed when analysis is done.
+    """
+    writer_class = REPORT_FORMATS[report_format]
+    newline = "" if writer_class is CsvReportWriter else None
+    stream = open(report_path, "w", encoding="utf-8", newline=newline)
+    return writer_class(stream, close_stream=True)
+
+
+def save_report(report: Iterable[ReportItem], report_path: Union[str, Path], report_format: str = "text") -> None:
+    """
+    Saves an already collected report to a file.
+
+    Args:
+        report (Iterable[ReportItem]): Issues returned by analyze_docx.
+        report_path (str | Path): Path to save the report file.
+        report_format (str): One of REPORT_FORMATS.
+    """
+    with open_report_writer(report_path, report_format) as writer:
+        writer.extend(report)
@@ -0,0 +1,153 @@
+"""
+docx_utils/stories.py
+
+Stories of a document besides the main body: headers, footers, footnotes,
+endnotes and text boxes. iter_stories enumerates every one of them once,
+in document order.
+
+Headers and footers are parts shared by all sections that refer to them
+(a section "linked to previous" has no reference of its own), so they are
+found through the section references and each part is visited once, not
+once per section. Text boxes are found in the body and in the other
+stories; the VML copy Word stores next to every DrawingML text box
+(mc:Fallback) is skipped, as are the separator notes of the footnotes
+and endnotes parts.
+
+python-docx loads footnotes and endnotes as opaque binary parts;
+register_note_parts makes it load them as story parts, so documents opened
+afterwards have them parsed, and changes to them are saved. analyze_docx
+calls it before opening a document; callers that open documents themselves
+call it first.
+"""
+
+from typing import Iterator, List, NamedTuple, Tuple, Union
+from docx.document import Document as DocumentObject
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.part import PartFactory, XmlPart
+from docx.oxml.ns import qn
+from docx.parts.story import StoryPart
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+STORY_KINDS = ("header", "footer", "footnote", "endnote", "textbox")
+
+W_P, W_TBL, W_SDT, W_SDT_CONTENT = qn("w:p"), qn("w:tbl"), qn("w:sdt"), qn("w:sdtContent")
+W_TXBX_CONTENT = qn("w:txbxContent")
+W_TYPE = qn("w:type")
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_REFERENCES = {qn("w:headerReference"): "header", qn("w:footerReference"): "footer"}
+_NOTES = ((RT.FOOTNOTES, qn("w:footnote"), "footnote"), (RT.ENDNOTES, qn("w:endnote"), "endnote"))
+
+
+def register_note_parts() -> None:
+    """
+    Have python-docx load the footnotes and endnotes parts of documents
+    opened from now on as story parts. Part classes registered for them
+    before are kept.
+    """
+    PartFactory.part_type_for.setdefault(CT.WML_FOOTNOTES, StoryPart)
+    PartFactory.part_type_for.setdefault(CT.WML_ENDNOTES, StoryPart)
+
+
+class Story(NamedTuple):
+    """
+    A header, footer, footnote, endnote or text box.
+
+    Attributes:
+        kind: one of STORY_KINDS.
+        index: number of the story among the stories of its kind, in document order.
+        element: the story's XML element (w:hdr, w:ftr, w:footnote, w:endnote or w:txbxContent).
+        part: the package part holding the element.
+    """
+    kind: str
+    index: int
+    element: object
+    part: XmlPart
+
+    def blocks(self) -> List[Union[Paragraph, Table]]:
+        """
+        Top-level paragraphs and tables of the story; the content of block
+        content controls (w:sdt, e.g. page numbers) is included.
+        """
+        blocks: List[Union[Paragraph, Table]] = []
+        for child in _block_elements(self.element):
+            blocks.append(Paragraph(child, self.part) if child.tag == W_P else Table(child, self.part))
+        return blocks
+
+
+def _block_elements(element) -> Iterator:
+    for child in element:
+        if child.tag == W_P or child.tag == W_TBL:
+            yield child
+        elif child.tag == W_SDT:
+            content = child.find(W_SDT_CONTENT)
+            if content is not None:
+                yield from _block_elements(content)
+
+
+def _header_footer_parts(docx: DocumentObject) -> Iterator[Tuple[str, XmlPart]]:
+    """
+    The header and footer parts referenced by the sections, each once.
+    """
+    related_parts = docx.part.related_parts
+    seen = set()
+    for section in docx.sections:
+        for reference in section._sectPr:
+            kind = _REFERENCES.get(reference.tag)
+            if kind is None:
+                continue
+            part = related_parts.get(reference.get(qn("r:id")))
+            if part is not None and part not in seen and isinstance(part, XmlPart):
+                seen.add(part)
+                yield kind, part
+
+
+def _note_elements(docx: DocumentObject, reltype: str, tag: str) -> Iterator[Tuple[object, XmlPart]]:
+    """
+    The footnotes or endnotes of the document, without separator notes.
+    """
+    for rel in docx.part.rels.values():
+        if rel.reltype != reltype or rel.is_external:
+            continue
+        part = rel.target_part
+        if not isinstance(part, XmlPart):
+            continue  # opened before register_note_parts was called
+        for note in part.element.iterchildren(tag):
+            if note.get(W_TYPE, "normal") == "normal":
+                yield note, part
+
+
+def iter_stories(docx: DocumentObject) -> Iterator[Story]:
+    """
+    Every header, footer, footnote, endnote and text box of the document,
+    each once: headers and footers in the order the sections refer to them,
+    then footnotes, endnotes and text boxes.
+
+    Args:
+        docx: Document object.
+
+    Yields:
+        Story: the stories, numbered per kind.
+    """
+    counts = dict.fromkeys(STORY_KINDS, 0)
+
+    def story(kind: str, element, part: XmlPart) -> Story:
+        index = counts[kind]
+        counts[kind] += 1
+        return Story(kind, index, element, part)
+
+    containers = [(docx.element.body, docx.part)]
+    for kind, part in _header_footer_parts(docx):
+        containers.append((part.element, part))
+        yield story(kind, part.element, part)
+    for reltype, tag, kind in _NOTES:
+        for note, part in _note_elements(docx, reltype, tag):
+            containers.append((note, part))
+            yield story(kind, note, part)
+
+    for container, part in containers:
+        for textbox in container.iter(W_TXBX_CONTENT):
+            if not any(ancestor.tag == MC_FALLBACK for ancestor in textbox.iterancestors()):
+                yield story("textbox", textbox, part)
@@ -0,0 +1,322 @@
+"""
+docx_utils/styles.py
+
+Module for resolving the effective formatting of paragraphs and runs.
+Formatting that is not set directly on a paragraph or run is inherited
+from its character style, its paragraph style (following the basedOn
+chain) and finally from the document defaults (w:docDefaults); theme
+fonts are resolved through the theme part.
+
+Every style is resolved once and memoized, so looking up the effective
+formatting of an element only merges its direct formatting on top of a
+cached dictionary instead of walking up the style tree. The resolver
+works on plain lxml elements and can therefore be used both with
+python-docx documents and with the raw XML streamed by the pre-scan.
+
+Table style formatting and numbering-level formatting are not resolved.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from lxml import etree
+from docx.document import Document as DocumentObject
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.oxml.simpletypes import ST_HpsMeasure, ST_OnOff, ST_SignedTwipsMeasure, ST_TwipsMeasure
+from docx.shared import Length, Pt
+
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+W_STYLE, W_STYLE_ID, W_TYPE, W_DEFAULT = qn("w:style"), qn("w:styleId"), qn("w:type"), qn("w:default")
+W_BASED_ON, W_PSTYLE, W_RSTYLE, W_VAL = qn("w:basedOn"), qn("w:pStyle"), qn("w:rStyle"), qn("w:val")
+W_PPR, W_RPR, W_TBL = qn("w:pPr"), qn("w:rPr"), qn("w:tbl")
+W_JC, W_IND, W_SPACING = qn("w:jc"), qn("w:ind"), qn("w:spacing")
+W_RFONTS, W_SZ, W_B, W_I, W_U = qn("w:rFonts"), qn("w:sz"), qn("w:b"), qn("w:i"), qn("w:u")
+
+Props = Dict[str, Any]
+
+
+class EffectiveParagraphFormat(NamedTuple):
+    """
+    Resolved paragraph formatting. Field names and value types match
+    python-docx's ParagraphFormat, so either can be passed to the checks;
+    None means the property is not set anywhere in the style hierarchy.
+    """
+    alignment: Optional[WD_ALIGN_PARAGRAPH] = None
+    first_line_indent: Optional[Length] = None
+    left_indent: Optional[Length] = None
+    right_indent: Optional[Length] = None
+    line_spacing: Union[float, Length, None] = None
+
+
+class EffectiveFont(NamedTuple):
+    """
+    Resolved run formatting, with the field names of python-docx's Font.
+    """
+    name: Optional[str] = None
+    size: Optional[Length] = None
+    bold: Optional[bool] = None
+    italic: Optional[bool] = None
+    underline: Optional[bool] = None
+
+
+def paragraph_props(pPr: Optional[etree._Element]) -> Props:
+    """
+    Paragraph properties set in a w:pPr element, interpreted like python-docx.
+    """
+    props: Props = {}
+    if pPr is None:
+        return props
+
+    jc = pPr.find(W_JC)
+    if jc is not None and jc.get(W_VAL) is not None:
+        props["alignment"] = WD_ALIGN_PARAGRAPH.from_xml(jc.get(W_VAL))
+
+    ind = pPr.find(W_IND)
+    if ind is not None:
+        hanging, first_line = ind.get(qn("w:hanging")), ind.get(qn("w:firstLine"))
+        if hanging is not None:
+            props["first_line_indent"] = Length(-ST_TwipsMeasure.convert_from_xml(hanging))
+        elif first_line is not None:
+            props["first_line_indent"] = ST_TwipsMeasure.convert_from_xml(first_line)
+        for attr, name in (("w:left", "left_indent"), ("w:right", "right_indent")):
+            value = ind.get(qn(attr))
+            if value is not None:
+                props[name] = ST_SignedTwipsMeasure.convert_from_xml(value)
+
+    spacing = pPr.find(W_SPACING)
+    if spacing is not None and spacing.get(qn("w:line")) is not None:
+        line = ST_SignedTwipsMeasure.convert_from_xml(spacing.get(qn("w:line")))
+        line_rule = spacing.get(qn("w:lineRule"), "auto")
+        props["line_spacing"] = line / Pt(12) if line_rule == "auto" else line
+
+    return props
+
+
+class StyleResolver:
+    """
+    Memoized resolver of effective paragraph and run formatting.
+
+    Attributes:
+        fingerprint: digest of the style definitions, for caches of results
+            that depend on them.
+    """
+
+    def __init__(self, styles_element: Optional[etree._Element] = None,
+                 theme_element: Optional[etree._Element] = None):
+        """
+        Args:
+            styles_element: root (w:styles) of the styles part, if any.
+            theme_element: root (a:theme) of the theme part, if any.
+        """
+        self._styles: Dict[str, etree._Element] = {}
+        self._default_paragraph_style: Optional[str] = None
+        self._default_table_style: Optional[str] = None
+        self._default_p: Props = {}
+        self._default_r: Props = {}
+        self._theme_fonts: Dict[str, str] = {}
+
+        digest = hashlib.blake2b(digest_size=16)
+        if styles_element is not None:
+            digest.update(etree.tostring(styles_element))
+            self._load_styles(styles_element)
+        if theme_element is not None:
+            for kind in ("major", "minor"):
+                latin = theme_element.find(f".//{{{A_NS}}}{kind}Font/{{{A_NS}}}latin")
+                if latin is not None and latin.get("typeface"):
+                    self._theme_fonts[kind] = latin.get("typeface")
+            digest.update(repr(sorted(self._theme_fonts.items())).encode("utf-8"))
+        self.fingerprint = digest.hexdigest()
+
+        # The defaults may use theme fonts, so run props are read after the theme
+        if styles_element is not None:
+            self._default_r = self.run_props(styles_element.find(f"{qn('w:docDefaults')}/{qn('w:rPrDefault')}/{W_RPR}"))
+
+        self._style_p: Dict[str, Props] = {}
+        self._style_r: Dict[str, Props] = {}
+        self._paragraph_bases: Dict[Optional[str], Props] = {}
+        self._run_bases: Dict[Tuple[Optional[str], Optional[str]], Props] = {}
+
+    @classmethod
+    def from_document(cls, docx: DocumentObject) -> "StyleResolver":
+        """
+        Build a resolver for the styles and theme of a python-docx Document.
+        """
+        try:
+            theme = etree.fromstring(docx.part.part_related_by(RT.THEME).blob)
+        except KeyError:
+            theme = None
+        return cls(docx.styles.element, theme)
+
+    def _load_styles(self, styles_element: etree._Element) -> None:
+        for style in styles_element.iterchildren(W_STYLE):
+            style_id = style.get(W_STYLE_ID)
+            if style_id is None:
+                continue
+            self._styles[style_id] = style
+            if ST_OnOff.convert_from_xml(style.get(W_DEFAULT, "0")):
+                if style.get(W_TYPE) == "paragraph":
+                    self._default_paragraph_style = style_id
+                elif style.get(W_TYPE) == "table":
+                    self._default_table_style = style_id
+        self._default_p = paragraph_props(
+            styles_element.find(f"{qn('w:docDefaults')}/{qn('w:pPrDefault')}/{W_PPR}"))
+
+    def run_props(self, rPr: Optional[etree._Element]) -> Props:
+        """
+        Run properties set in a w:rPr element, interpreted like python-docx.
+        """
+        props: Props = {}
+        if rPr is None:
+            return props
+
+        rFonts = rPr.find(W_RFONTS)
+        if rFonts is not None:
+            # A theme font takes precedence over an explicit font name
+            theme = rFonts.get(qn("w:asciiTheme"))
+            name = self._theme_fonts.get(theme[:5]) if theme else None
+            if name is None:
+                name = rFonts.get(qn("w:ascii"))
+            if name is not None:
+                props["name"] = name
+
+        sz = rPr.find(W_SZ)
+        if sz is not None and sz.get(W_VAL) is not None:
+            props["size"] = ST_HpsMeasure.convert_from_xml(sz.get(W_VAL))
+
+        for tag, name in ((W_B, "bold"), (W_I, "italic")):
+            toggle = rPr.find(tag)
+            if toggle is not None:
+                props[name] = ST_OnOff.convert_from_xml(toggle.get(W_VAL, "1"))
+
+        u = rPr.find(W_U)
+        if u is not None and u.get(W_VAL) is not None:
+            props["underline"] = u.get(W_VAL) != "none"
+
+        return props
+
+    def _resolve_style(self, style_id: Optional[str], cache: Dict[str, Props],
+                       own_props, seen: Tuple[str, ...] = ()) -> Props:
+        """
+        Properties of a style merged over those of its basedOn chain.
+        """
+        if style_id is None or style_id in seen:
+            return {}
+        props = cache.get(style_id)
+        if props is None:
+            style = self._styles.get(style_id)
+            if style is None:
+                return {}
+            based_on = style.find(W_BASED_ON)
+            base_id = based_on.get(W_VAL) if based_on is not None else None
+            props = {**self._resolve_style(base_id, cache, own_props, seen + (style_id,)), **own_props(style)}
+            cache[style_id] = props
+        return props
+
+    def _style_paragraph_props(self, style_id: Optional[str]) -> Props:
+        return self._resolve_style(style_id, self._style_p, lambda style: paragraph_props(style.find(W_PPR)))
+
+    def _style_run_props(self, style_id: Optional[str]) -> Props:
+        return self._resolve_style(style_id, self._style_r, lambda style: self.run_props(style.find(W_RPR)))
+
+    def paragraph_style_id(self, p: etree._Element) -> Optional[str]:
+        """
+        Id of the paragraph style of a w:p element, the default paragraph
+        style if it has none or an unknown one (like python-docx's Paragraph.style).
+        """
+        pPr = p.find(W_PPR)
+        pStyle = pPr.find(W_PSTYLE) if pPr is not None else None
+        if pStyle is not None and pStyle.get(W_VAL) in self._styles:
+            return pStyle.get(W_VAL)
+        return self._default_paragraph_style
+
+    def _paragraph_base(self, style_id: Optional[str]) -> Props:
+        base = self._paragraph_bases.get(style_id)
+        if base is None:
+            base = {**self._default_p, **self._style_paragraph_props(style_id)}
+            self._paragraph_bases[style_id] = base
+        return base
+
+    def _run_base(self, paragraph_style_id: Optional[str], run_style_id: Optional[str]) -> Props:
+        key = (paragraph_style_id, run_style_id)
+        base = self._run_bases.get(key)
+        if base is None:
+            base = {**self._default_r, **self._style_run_props(paragraph_style_id),
+                    **self._style_run_props(run_style_id)}
+            self._run_bases[key] = base
+        return base
+
+    def paragraph_format(self, p: etree._Element, paragraph_style_id: Optional[str] = None
+                         ) -> EffectiveParagraphFormat:
+        """
+        Effective formatting of a w:p element. paragraph_style_id is the
+        result of paragraph_style_id(p), if the caller already has it.
+        """
+        if paragraph_style_id is None:
+            paragraph_style_id = self.paragraph_style_id(p)
+        base = self._paragraph_base(paragraph_style_id)
+        direct = paragraph_props(p.find(W_PPR))
+        return EffectiveParagraphFormat(**{**base, **direct}) if direct else EffectiveParagraphFormat(**base)
+
+    def font(self, r: etree._Element, p: etree._Element) -> EffectiveFont:
+        """
+        Effective formatting of a w:r element inside the w:p element p.
+        """
+        return self._font(r, self.paragraph_style_id(p))
+
+    def fonts(self, runs: Iterable[etree._Element], p: etree._Element,
+              paragraph_style_id: Optional[str] = None) -> List[EffectiveFont]:
+        """
+        Effective formatting of several w:r elements of the w:p element p;
+        the paragraph style is looked up once, unless the caller passes
+        paragraph_style_id(p) as paragraph_style_id.
+        """
+        if paragraph_style_id is None:
+            paragraph_style_id = self.paragraph_style_id(p)
+        return [self._font(r, paragraph_style_id) for r in runs]
+
+    def mark_font(self, p: etree._Element) -> EffectiveFont:
+        """
+        Effective formatting of the paragraph mark of a w:p element (w:pPr/w:rPr),
+        which sets the height of an empty paragraph.
+        """
+        pPr = p.find(W_PPR)
+        paragraph_style_id = self.paragraph_style_id(p)
+        if pPr is None:
+            return EffectiveFont(**self._run_base(paragraph_style_id, None))
+        return self._font(pPr, paragraph_style_id)
+
+    def _font(self, r: etree._Element, paragraph_style_id: Optional[str]) -> EffectiveFont:
+        rPr = r.find(W_RPR)
+        rStyle = rPr.find(W_RSTYLE) if rPr is not None else None
+        base = self._run_base(paragraph_style_id, rStyle.get(W_VAL) if rStyle is not None else None)
+        direct = self.run_props(rPr)
+        return EffectiveFont(**{**base, **direct}) if direct else EffectiveFont(**base)
+
+    def style_chain(self, style_id: Optional[str]) -> List[str]:
+        """
+        Ids of a style and of the styles it is based on, nearest first.
+        """
+        chain: List[str] = []
+        while style_id is not None and style_id in self._styles and style_id not in chain:
+            chain.append(style_id)
+            based_on = self._styles[style_id].find(W_BASED_ON)
+            style_id = based_on.get(W_VAL) if based_on is not None else None
+        return chain
+
+    def referenced_styles(self, p: etree._Element) -> Set[str]:
+        """
+        Ids of the styles a w:p element inherits formatting from: its
+        paragraph style, the character styles of its runs and the styles
+        of the tables it is in, each with its basedOn chain.
+        """
+        style_ids = set(self.style_chain(self.paragraph_style_id(p)))
+        for rStyle in p.iter(W_RSTYLE):
+            style_ids.update(self.style_chain(rStyle.get(W_VAL)))
+        for tbl in p.iterancestors(W_TBL):
+            tblStyle = tbl.find(f"{qn('w:tblPr')}/{qn('w:tblStyle')}")
+            table_style_id = tblStyle.get(W_VAL) if tblStyle is not None else self._default_table_style
+            style_ids.update(self.style_chain(table_style_id))
+        return style_ids
@@ -0,0 +1,478 @@
+"""
+docx_utils/traversal.py
+
+Single-pass traversal engine for DOCX documents.
+Walks the document body and its other stories (headers, footers,
+footnotes, endnotes and text boxes, see stories.py) once, visiting every
+paragraph, run, physical table cell (merged cells and nested tables
+included) and section exactly once, and dispatches each element to all registered visitors (checkers
+and fixers). New rules only need a visitor instead of another full pass
+over the document.
+"""
+
+import itertools
+import time
+from typing import Container, Iterator, List, NamedTuple, Optional, Sequence, Set, Sized, Tuple, Union
+from docx.document import Document as DocumentObject
+from docx.oxml.ns import qn
+from docx.oxml.simpletypes import ST_Merge
+from docx.oxml.table import CT_Tc
+from docx.section import Section
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from config.config import IssueLocation
+from config.profiles import DEFAULT_PROFILE, RuleProfile
+from docx_utils.instrumentation import Instrumentation
+from docx_utils.layout import PageLayout
+from docx_utils.stories import Story, iter_stories
+from docx_utils.styles import StyleResolver
+from docx_utils.classification import (
+    DocumentClassification,
+    ParagraphInfo,
+    ParagraphKind,
+    classify_paragraphs,
+    paragraph_text
+)
+
+
+class ParagraphContext:
+    """
+    Information about the paragraph currently being visited.
+
+    Attributes:
+        paragraph: the Paragraph being visited.
+        runs: runs of the paragraph, created once and shared by all visitors.
+        index: index among the top-level paragraphs of the body or story, or
+            inside the cell for table paragraphs.
+        in_table: True if the paragraph lives inside a table cell.
+        cell: position of the enclosing table cell, or None outside tables.
+        block: index of the top-level body block (paragraph or table) containing
+            the paragraph, as in walk_document's blocks; None if not known or
+            outside the body.
+        story: the header, footer, footnote, endnote or text box containing
+            the paragraph, or None in the body.
+        page: estimated page of the enclosing top-level block, or None if
+            pages are not estimated or outside the body.
+    """
+
+    __slots__ = ("paragraph", "runs", "index", "in_table", "cell", "block", "story", "page",
+                 "_info", "_classification")
+
+    def __init__(self, paragraph: Paragraph, index: int, cell: Optional["CellPosition"] = None,
+                 info: Optional[ParagraphInfo] = None,
+                 classification: Optional[DocumentClassification] = None,
+                 block: Optional[int] = None,
+                 story: Optional[Story] = None,
+                 page: Optional[int] = None):
+        self.paragraph = paragraph
+        self.runs: List[Run] = paragraph.runs
+        self.index = index
+        self.in_table = cell is not None
+        self.cell = cell
+        self.block = block
+        self.story = story
+        self.page = page
+        self._info = info
+        self._classification = classification
+
+    def location(self, run_index: Optional[int] = None) -> IssueLocation:
+        """
+        Build the report location of this paragraph, or of one of its runs.
+        """
+        story = self.story
+        location = IssueLocation(paragraph_index=self.index, run_index=run_index,
+                                 story=story.kind if story is not None else None,
+                                 story_index=story.index if story is not None else None,
+                                 page=self.page)
+        if self.cell is not None:
+            location.table_index = self.cell.table_index
+            location.row_index = self.cell.row_index
+            location.cell_index = self.cell.cell_index
+        return location
+
+    @property
+    def in_story(self) -> bool:
+        """
+        True for paragraphs outside the main body. They follow the rules of
+        table paragraphs: no alignment or first line indent is required.
+        """
+        return self.story is not None
+
+    @property
+    def info(self) -> ParagraphInfo:
+        """
+        Text and kind of the paragraph; computed on first access, so
+        visitors that do not need the text never read it.
+        """
+        if self._info is None:
+            if self._classification is not None:
+                self._info = self._classification[self.index]
+            else:
+                self._info = ParagraphInfo(paragraph_text(self.paragraph._p))
+        return self._info
+
+    @property
+    def in_title_page(self) -> bool:
+        if self._classification is not None:
+            return self.index <= self._classification.title_page_end
+        return self._info is not None and self._info.kind is ParagraphKind.TITLE_PAGE
+
+
+class DocumentVisitor:
+    """
+    Base class for rules taking part in a document traversal.
+    All hooks do nothing by default; subclasses override the ones they need.
+    """
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        pass
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        pass
+
+    def leave_paragraph(self, ctx: ParagraphContext) -> None:
+        """
+        Called after the paragraph and all of its runs have been visited.
+        """
+        pass
+
+    def visit_cell(self, cell: _Cell, position: "CellPosition") -> None:
+        pass
+
+    def visit_section(self, section: Section, index: int) -> None:
+        pass
+
+
+class StopTraversal(Exception):
+    """
+    Raised by a visitor to end the traversal early.
+    """
+
+
+class IssueLimitVisitor(DocumentVisitor):
+    """
+    Stops the traversal as soon as the report holds max_issues issues.
+    Register it after the checkers so it sees their issues immediately.
+    """
+
+    def __init__(self, report: Sized, max_issues: int):
+        self.report = report
+        self.max_issues = max_issues
+
+    def _check_limit(self) -> None:
+        if len(self.report) >= self.max_issues:
+            raise StopTraversal
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        self._check_limit()
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        self._check_limit()
+
+    def visit_section(self, section: Section, index: int) -> None:
+        self._check_limit()
+
+
+class IssueBlocksVisitor(DocumentVisitor):
+    """
+    Records the top-level blocks and the sections for which issues were
+    appended to report, to fix only those afterwards. Must come after the
+    checkers in the list of visitors.
+
+    Attributes:
+        blocks: indices of the top-level body blocks with issues.
+        sections: indices of the sections with issues.
+        style_ids: ids of the styles the paragraphs with issues inherit
+            formatting from (see StyleResolver.referenced_styles), if a
+            resolver was given.
+    """
+
+    def __init__(self, report: Sized, styles: Optional[StyleResolver] = None):
+        self.report = report
+        self.styles = styles
+        self.blocks: Set[int] = set()
+        self.sections: Set[int] = set()
+        self.style_ids: Set[str] = set()
+        self._start = self._seen = len(report)
+
+    @property
+    def found(self) -> bool:
+        """
+        Whether any issue was appended to report since the visitor was created.
+        """
+        return len(self.report) > self._start
+
+    def _new_issues(self) -> bool:
+        seen, self._seen = self._seen, len(self.report)
+        return self._seen > seen
+
+    def leave_paragraph(self, ctx: ParagraphContext) -> None:
+        if not self._new_issues():
+            return
+        if ctx.block is not None:
+            self.blocks.add(ctx.block)
+        if self.styles is not None:
+            self.style_ids.update(self.styles.referenced_styles(ctx.paragraph._p))
+
+    def visit_section(self, section: Section, index: int) -> None:
+        if self._new_issues():
+            self.sections.add(index)
+
+
+class TimedVisitor(DocumentVisitor):
+    """
+    Wraps a visitor and adds the time spent in its hooks to a stage,
+    so rules sharing one traversal are timed separately.
+    """
+
+    def __init__(self, visitor: DocumentVisitor, stage: str, instrumentation: Instrumentation):
+        self.visitor = visitor
+        self.stage = stage
+        self.instrumentation = instrumentation
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        start = time.perf_counter()
+        try:
+            self.visitor.visit_paragraph(ctx)
+        finally:
+            self.instrumentation.add_time(self.stage, time.perf_counter() - start)
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        start = time.perf_counter()
+        try:
+            self.visitor.visit_run(run, run_index, ctx)
+        finally:
+            self.instrumentation.add_time(self.stage, time.perf_counter() - start)
+
+    def leave_paragraph(self, ctx: ParagraphContext) -> None:
+        start = time.perf_counter()
+        try:
+            self.visitor.leave_paragraph(ctx)
+        finally:
+            self.instrumentation.add_time(self.stage, time.perf_counter() - start)
+
+    def visit_cell(self, cell: _Cell, position: "CellPosition") -> None:
+        start = time.perf_counter()
+        try:
+            self.visitor.visit_cell(cell, position)
+        finally:
+            self.instrumentation.add_time(self.stage, time.perf_counter() - start)
+
+    def visit_section(self, section: Section, index: int) -> None:
+        start = time.perf_counter()
+        try:
+            self.visitor.visit_section(section, index)
+        finally:
+            self.instrumentation.add_time(self.stage, time.perf_counter() - start)
+
+
+class CountingVisitor(DocumentVisitor):
+    """
+    Counts the paragraphs, runs, cells and sections visited by a traversal.
+    """
+
+    def __init__(self, instrumentation: Instrumentation):
+        self.instrumentation = instrumentation
+
+    def visit_paragraph(self, ctx: ParagraphContext) -> None:
+        self.instrumentation.count("paragraphs")
+
+    def visit_run(self, run: Run, run_index: int, ctx: ParagraphContext) -> None:
+        self.instrumentation.count("runs")
+
+    def visit_cell(self, cell: _Cell, position: "CellPosition") -> None:
+        self.instrumentation.count("cells")
+
+    def visit_section(self, section: Section, index: int) -> None:
+        self.instrumentation.count("sections")
+
+
+def _is_merge_continuation(tc: CT_Tc) -> bool:
+    """
+    True if the w:tc element continues a cell merged from above (w:vMerge)
+    or from the left (legacy w:hMerge) and therefore has no content of its own.
+    """
+    tcPr = tc.tcPr
+    if tcPr is None:
+        return False
+    if tcPr.vMerge_val == ST_Merge.CONTINUE:
+        return True
+    h_merge = tcPr.find(qn("w:hMerge"))
+    return h_merge is not None and h_merge.get(qn("w:val"), ST_Merge.CONTINUE) == ST_Merge.CONTINUE
+
+
+class CellPosition(NamedTuple):
+    table_index: int
+    row_index: int
+    cell_index: int
+
+
+def iter_table_cells(table: Table,
+                     table_counter: Optional[Iterator[int]] = None) -> Iterator[Tuple[CellPosition, _Cell]]:
+    """
+    Yield (position, cell) for every physical cell of a table exactly once,
+    including the cells of nested tables (depth-first, in document order).
+
+    Works from the underlying w:tc elements instead of table.rows/row.cells,
+    which repeat a merged cell once per grid position it spans. Cells that
+    only continue a vertical or legacy horizontal merge are skipped.
+
+    Args:
+        table: Table to iterate.
+        table_counter: shared counter numbering the tables of a document;
+            a fresh one (starting at 0 for this table) is used if omitted.
+    """
+    if table_counter is None:
+        table_counter = itertools.count()
+    table_index = next(table_counter)
+    for row_index, tr in enumerate(table._tbl.tr_lst):
+        for cell_index, tc in enumerate(tr.tc_lst):
+            if _is_merge_continuation(tc):
+                continue
+            cell = _Cell(tc, table)
+            yield CellPosition(table_index, row_index, cell_index), cell
+            for nested_table in cell.tables:
+                yield from iter_table_cells(nested_table, table_counter)
+
+
+def _visit_paragraph(ctx: ParagraphContext, visitors: Sequence[DocumentVisitor]) -> None:
+    for visitor in visitors:
+        visitor.visit_paragraph(ctx)
+    for run_index, run in enumerate(ctx.runs):
+        for visitor in visitors:
+            visitor.visit_run(run, run_index, ctx)
+    for visitor in visitors:
+        visitor.leave_paragraph(ctx)
+
+
+def _visit_table(table: Table, table_counter: Iterator[int], visitors: Sequence[DocumentVisitor],
+                 block_index: Optional[int] = None, story: Optional[Story] = None,
+                 page: Optional[int] = None) -> None:
+    for position, cell in iter_table_cells(table, table_counter):
+        for visitor in visitors:
+            visitor.visit_cell(cell, position)
+        for index, paragraph in enumerate(cell.paragraphs):
+            _visit_paragraph(ParagraphContext(paragraph, index, position, block=block_index, story=story,
+                                              page=page), visitors)
+
+
+def visit_story(story: Story, visitors: Sequence[DocumentVisitor]) -> None:
+    """
+    Visit the paragraphs and tables of a header, footer, note or text box.
+    """
+    # Paragraphs and tables are numbered per story
+    index = 0
+    table_counter = itertools.count()
+    for block in story.blocks():
+        if isinstance(block, Paragraph):
+            _visit_paragraph(ParagraphContext(block, index, story=story), visitors)
+            index += 1
+        else:
+            _visit_table(block, table_counter, visitors, story=story)
+
+
+def _skip_table(table: Table, table_counter: Iterator[int]) -> None:
+    next(table_counter)
+    for nested in table._tbl.iter(qn("w:tbl")):
+        if nested is not table._tbl:
+            next(table_counter)
+
+
+class BodyWalker:
+    """
+    Visits top-level body blocks one at a time, in document order, numbering
+    paragraphs, tables and blocks across calls. walk_document hands it the
+    whole body; chunked processing (see docx_utils.chunked) one window of
+    blocks at a time.
+
+    Attributes:
+        block_index: index of the next block.
+        paragraph_index: index of the next top-level paragraph.
+    """
+
+    def __init__(self, visitors: Sequence[DocumentVisitor],
+                 classification: Optional[DocumentClassification] = None,
+                 layout: Optional[PageLayout] = None):
+        self.visitors = visitors
+        self.classification = classification
+        self.layout = layout
+        self.block_index = 0
+        self.paragraph_index = 0
+        self._table_counter = itertools.count()
+
+    def visit(self, block: Union[Paragraph, Table], skip: bool = False) -> None:
+        """
+        Visit the next block, or only count it if skip is True.
+        """
+        is_paragraph = isinstance(block, Paragraph)
+        if not skip:
+            page = self.layout.block_pages[self.block_index] if self.layout is not None else None
+            if is_paragraph:
+                _visit_paragraph(ParagraphContext(block, self.paragraph_index, classification=self.classification,
+                                                  block=self.block_index, page=page), self.visitors)
+            else:
+                _visit_table(block, self._table_counter, self.visitors, self.block_index, page=page)
+        elif not is_paragraph:
+            # Keep table numbering stable when tables are skipped
+            _skip_table(block, self._table_counter)
+        if is_paragraph:
+            self.paragraph_index += 1
+        self.block_index += 1
+
+
+def walk_document(docx: DocumentObject, visitors: Sequence[DocumentVisitor],
+                  classification: Optional[DocumentClassification] = None,
+                  blocks: Optional[Container[int]] = None,
+                  sections: Union[bool, Container[int]] = True,
+                  profile: RuleProfile = DEFAULT_PROFILE,
+                  stories: bool = True,
+                  layout: Optional[PageLayout] = None) -> DocumentClassification:
+    """
+    Visit every paragraph, run, table cell and section of the document once,
+    in document order, calling the matching hook of every visitor: first the
+    body, then the headers, footers, footnotes, endnotes and text boxes
+    (each shared header or footer once), then the sections.
+    A visitor may raise StopTraversal to end the walk early.
+
+    Args:
+        docx: Document object to traverse.
+        visitors: visitors to notify, in the order they should be called.
+        classification: body paragraph classification returned by a previous
+            walk over the same (or a cloned) document; computed if omitted.
+        blocks: indices of the top-level body blocks (paragraphs and tables,
+            counted together) to visit; all blocks are visited if omitted.
+        sections: whether to visit sections, or the indices of the sections to visit.
+        profile: rule profile defining the title page marker, used when
+            classification is omitted.
+        stories: whether to visit the stories besides the body.
+        layout: estimated pages of the body (see docx_utils.layout); body
+            paragraphs are then given their page.
+
+    Returns:
+        DocumentClassification: classification of the top-level body paragraphs.
+    """
+    body_blocks = list(docx.iter_inner_content())
+    if classification is None:
+        classification = classify_paragraphs([block for block in body_blocks if isinstance(block, Paragraph)],
+                                             profile=profile)
+
+    try:
+        walker = BodyWalker(visitors, classification, layout)
+        for block_index, block in enumerate(body_blocks):
+            walker.visit(block, skip=blocks is not None and block_index not in blocks)
+
+        if stories:
+            for story in iter_stories(docx):
+                visit_story(story, visitors)
+
+        if sections:
+            for i, section in enumerate(docx.sections):
+                if sections is not True and i not in sections:
+                    continue
+                for visitor in visitors:
+                    visitor.visit_section(section, i)
+    except StopTraversal:
+        pass
+
+    return classification
@@ -3,22 +3,28 @@ main.py
 
 This script allows the user to select a .docx document, checks it for font inconsistencies,
 highlights the problematic text in red, and saves a new copy of the document.
-Additionally, it analyzes pages for potential issues and reports them.
+Additionally, it estimates the page of every issue and reports the number of issues per page.
 """
 
 
-from docx.document import Document as DocumentObject
-from typing import List
-from docx.text.run import Run
-import tkinter as tk
-from tkinter import filedialog
-from docx_utils.docx_operations import analyze_docx, save_docx
+from typing import TYPE_CHECKING, List
+from docx_utils.report import save_report
 from pathlib import Path
 
-from config.config import ReportItem
+from config.config import ReportItem, configure_gui_environment
+
+if TYPE_CHECKING:
+    from docx.document import Document as DocumentObject
 
 
 def main():
+    # Tkinter and python-docx are imported only here so that importing
+    # this module (e.g. from the headless CLI, cli.py) does not pay for them
+    configure_gui_environment()
+    import tkinter as tk
+    from tkinter import filedialog
+    from docx_utils.docx_operations import analyze_docx, save_docx
+
     # Initialize Tkinter and hide the main window
     root: tk.Tk = tk.Tk()
     root.withdraw()
@@ -53,9 +59,10 @@ def main():
     # Check the document and save a new copy
     # -----------------------------
     report: List[ReportItem]
-    docx: DocumentObject
-    docx_fixed: DocumentObject
-    report, docx, docx_fixed = analyze_docx(docx_path)
+    docx: "DocumentObject"
+    docx_fixed: "DocumentObject"
+    # Pages are estimated so the report can list the issues per page
+    report, docx, docx_fixed = analyze_docx(docx_path, pages=True)
 
     total_issues: int = len(report)
 
@@ -65,16 +72,7 @@ def main():
     print(f"Total issues found: {total_issues}")
 
     # Save report to a text file
-    with open(report_path, "w", encoding="utf-8") as f:
-        if total_issues == 0:
-            f.write("No formatting issues found. Document conforms to standards.\n")
-        else:
-            f.write(f"Total issues found: {total_issues}\n\n")
-            for issue in report:
-                run = issue.get("run")
-                run_text = run.text if run else "<No run text>"
-                f.write(f"Issue found: '{run_text}' - {issue['reason']}\n")
-                f.write(f"Context paragraph: '{issue['paragraph_text']}'\n\n")
+    save_report(report, report_path)
 
     print(f"Report saved as: {report_path}")
 
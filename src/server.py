@@ -0,0 +1,507 @@
+"""
+server.py
+
+Local validation service. Accepts .docx uploads over HTTP (TCP or a Unix
+socket) and returns the report and, depending on the mode, the checked
+and fixed documents. Built on asyncio only, no web framework needed.
+
+The CPU-bound analysis runs in a bounded pool of worker processes that
+are started and warmed up (python-docx, lxml and the default template
+loaded) once, so a request does not pay for interpreter startup and
+imports. At most WORKERS + QUEUE_SIZE requests are accepted at a time;
+further requests are rejected with 503 and a Retry-After header until a
+slot frees up. Every request has a deadline covering both the time spent
+waiting in the queue and the analysis; on Unix the worker aborts the
+analysis when the deadline passes, so a pathological document cannot
+keep a worker busy. Elsewhere the request is answered with 504 but keeps
+its slot until the worker is done with it, so no more work is admitted
+than the pool can run.
+
+Usage:
+    python src/server.py [--host HOST] [--port PORT | --unix PATH] [-j WORKERS]
+                         [--queue-size N] [--timeout SECONDS] [--max-upload MB]
+                         [--profile FILE ...]
+
+Endpoints:
+    POST /analyze  Body: the .docx file, e.g.
+                   curl --data-binary @doc.docx "http://127.0.0.1:8765/analyze?mode=full"
+                   Query parameters (all optional):
+                     mode        report (default), highlight, full or fix (see AnalysisMode)
+                     max_issues  stop checking after this many issues
+                     prescan     1 to pre-scan the raw XML first
+                     profile     name of a rule profile loaded with --profile
+                                 (default: the rules in config.config)
+                     comments    1 to add a comment listing the issues to every
+                                 highlighted paragraph of the checked document
+                     pages       1 to add the estimated page to every issue location
+                   Response (JSON): issue_count, issues (ReportItem dicts) and, for the
+                   documents built in the chosen mode, checked and fixed (base64 .docx).
+    GET /health    Response (JSON): status, workers, pending requests, capacity and
+                   the names of the loaded rule profiles.
+
+Rule profiles are compiled once in every worker at startup, so requests
+for different standards are served by the same warm pool.
+
+Errors are returned as JSON {"error": message} with status 400 (bad request),
+404, 405, 411 (no Content-Length), 413 (upload too large), 422 (not a valid
+.docx), 503 (queue full or workers restarting) or 504 (deadline passed).
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import importlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from config.profiles import DEFAULT_PROFILE, RuleProfile, load_profiles
+from docx_utils.modes import AnalysisMode
+
+
+logger = logging.getLogger("server")
+
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_UPLOAD_MB = 50
+
+# Time allowed to read the request line, headers and body of a request
+READ_TIMEOUT = 30.0
+MAX_HEADERS = 100
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class ServiceError(Exception):
+    """
+    An error answered with the given HTTP status and extra headers.
+    """
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class InvalidDocument(Exception):
+    """
+    Raised by a worker for an upload that is not a valid .docx document.
+    """
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+# python-docx is imported by the workers only: the parent process accepts
+# connections and never parses a document, so it starts without loading it.
+
+# Rule profiles of this worker process, by name
+_profiles: Dict[str, RuleProfile] = {DEFAULT_PROFILE.name: DEFAULT_PROFILE}
+
+
+def _warm_worker(profiles: Optional[Dict[str, RuleProfile]] = None) -> None:
+    """
+    Worker initializer: load python-docx, lxml, the checkers and the default
+    template once, and keep the rule profiles requests refer to by name.
+    """
+    from docx import Document
+
+    if profiles:
+        _profiles.update(profiles)
+    importlib.import_module("docx_utils.docx_operations")
+    Document()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+@contextmanager
+def _deadline(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Raise TimeoutError inside the with-block once time.time() passes deadline.
+    Enforced with SIGALRM where available (Unix); elsewhere only checked on entry,
+    and ValidationService.analyze counts the job until the worker finishes it.
+    """
+    if deadline is not None and deadline <= time.time():
+        raise TimeoutError("deadline passed while the request was queued")
+    if deadline is None or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def expired(signum, frame):
+        raise TimeoutError("deadline passed during the analysis")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 1e-3))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def analyze_upload(data: bytes, mode: str = AnalysisMode.REPORT, max_issues: Optional[int] = None,
+                   prescan: bool = False, deadline: Optional[float] = None,
+                   profile: str = DEFAULT_PROFILE.name, comments: bool = False,
+                   pages: bool = False) -> Dict[str, Any]:
+    """
+    Analyze an uploaded document. Runs inside a worker process.
+
+    Args:
+        data: Contents of the .docx file.
+        mode, max_issues, prescan, comments, pages: Passed to analyze_docx.
+        deadline: time.time() value after which the analysis is aborted.
+        profile: name of a rule profile the worker was started with.
+
+    Returns:
+        dict: issue_count, issues and the base64 encoded documents built in this mode.
+
+    Raises:
+        InvalidDocument: data is not a valid .docx document.
+    """
+    from docx_utils.docx_operations import InvalidDocxError, analyze_docx, save_docx
+
+    with _deadline(deadline):
+        try:
+            report, docx_checked, docx_fixed = analyze_docx(data, None, mode, max_issues, prescan,
+                                                            profile=_profiles[profile], comments=comments,
+                                                            pages=pages)
+        except InvalidDocxError as exc:
+            raise InvalidDocument(str(exc)) from None
+        result: Dict[str, Any] = {
+            "issue_count": len(report),
+            "issues": [issue.to_dict() for issue in report],
+        }
+        for name, docx in (("checked", docx_checked), ("fixed", docx_fixed)):
+            if docx is not None:
+                result[name] = base64.b64encode(save_docx(docx)).decode("ascii")
+    return result
+
+
+# -----------------------------
+# Service
+# -----------------------------
+class ValidationService:
+    """
+    Bounded pool of warm worker processes with admission control.
+
+    Attributes:
+        workers: number of worker processes.
+        capacity: maximum number of requests queued or running at a time.
+        pending: number of requests queued or running, including requests
+            answered with 504 whose analysis is still running in a worker.
+        timeout: seconds a request may take, queueing included.
+        profiles: rule profiles requests may choose from, by name.
+    """
+
+    def __init__(self, workers: int, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, profiles: Optional[Dict[str, RuleProfile]] = None):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.profiles = {DEFAULT_PROFILE.name: DEFAULT_PROFILE, **(profiles or {})}
+        self.pending = 0
+        self._executor = self._start_executor()
+        # Bumped on every pool restart, so requests that failed on the same
+        # broken pool restart it only once
+        self._generation = 0
+        self._restart_lock: Optional[asyncio.Lock] = None
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                       initargs=(self.profiles,))
+        # Start every worker now instead of on the first requests
+        for future in [executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    async def _restart(self, generation: int) -> None:
+        """
+        Replace the pool that broke while running a request submitted to pool
+        generation, unless another request already did. The new workers are
+        started in a thread so the event loop keeps serving meanwhile.
+        """
+        if self._restart_lock is None:
+            self._restart_lock = asyncio.Lock()
+        async with self._restart_lock:
+            if generation != self._generation:
+                return
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = await asyncio.get_running_loop().run_in_executor(None, self._start_executor)
+            self._generation += 1
+
+    async def analyze(self, data: bytes, mode: AnalysisMode, max_issues: Optional[int],
+                      prescan: bool, profile: str = DEFAULT_PROFILE.name,
+                      comments: bool = False, pages: bool = False) -> Dict[str, Any]:
+        """
+        Run analyze_upload in the pool, or fail fast if the queue is full or
+        the pool is being restarted.
+        """
+        if profile not in self.profiles:
+            raise ServiceError(400, f"unknown profile {profile!r}; available: {', '.join(sorted(self.profiles))}")
+        if self.pending >= self.capacity:
+            raise ServiceError(503, "too many requests in progress, retry later", {"Retry-After": "1"})
+        if self._restart_lock is not None and self._restart_lock.locked():
+            raise ServiceError(503, "worker processes are restarting, retry later", {"Retry-After": "1"})
+        self.pending += 1
+        future: Optional[asyncio.Future] = None
+        try:
+            deadline = time.time() + self.timeout
+            job = functools.partial(analyze_upload, data, mode, max_issues, prescan, deadline, profile, comments,
+                                    pages)
+            generation = self._generation
+            try:
+                future = asyncio.get_running_loop().run_in_executor(self._executor, job)
+                # The worker enforces the deadline; the extra second covers
+                # workers that cannot (no SIGALRM) and result transfer. The
+                # job is shielded so it keeps its slot until it really ends.
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout + 1)
+            except (asyncio.TimeoutError, TimeoutError):
+                raise ServiceError(504, f"analysis did not finish within {self.timeout:g} s")
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); replace the whole pool
+                await self._restart(generation)
+                raise ServiceError(503, "worker process crashed, retry later", {"Retry-After": "1"})
+            except InvalidDocument as exc:
+                raise ServiceError(422, f"not a valid .docx document: {exc}")
+        finally:
+            if future is None or future.done():
+                self.pending -= 1
+            else:
+                # Deadline passed in a worker that cannot abort the analysis
+                future.add_done_callback(self._finished)
+
+    def _finished(self, future: asyncio.Future) -> None:
+        """
+        Free the slot of a job whose request was already answered.
+        """
+        if not future.cancelled():
+            future.exception()  # retrieved, so asyncio does not log it
+        self.pending -= 1
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "workers": self.workers, "pending": self.pending, "capacity": self.capacity,
+                "profiles": sorted(self.profiles)}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------
+# HTTP
+# -----------------------------
+class Request:
+    """
+    A parsed HTTP request.
+    """
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       max_upload: int) -> Optional[Request]:
+    """
+    Read one HTTP/1.1 request; None if the client closed the connection.
+    The body size is checked against max_upload before it is read.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ServiceError(400, "malformed request line")
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise ServiceError(400, "too many headers")
+        name, sep, value = line.decode("latin-1").partition(":")
+        if not sep:
+            raise ServiceError(400, "malformed header")
+        headers[name.strip().lower()] = value.strip()
+
+    body = b""
+    if method == "POST":
+        if "transfer-encoding" in headers or "content-length" not in headers:
+            raise ServiceError(411, "Content-Length is required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise ServiceError(400, "invalid Content-Length")
+        if length < 0:
+            raise ServiceError(400, "invalid Content-Length")
+        if length > max_upload:
+            raise ServiceError(413, f"upload exceeds {max_upload} bytes")
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        body = await reader.readexactly(length)
+    return Request(method, target, headers, body)
+
+
+async def write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                         headers: Optional[Dict[str, str]] = None) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    lines = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def _flag(query: Dict[str, str], name: str) -> bool:
+    return query.get(name, "0").lower() in ("1", "true", "yes")
+
+
+def _analysis_options(query: Dict[str, str]) -> Tuple[AnalysisMode, Optional[int], bool, str, bool, bool]:
+    try:
+        mode = AnalysisMode(query.get("mode", AnalysisMode.REPORT.value))
+    except ValueError:
+        raise ServiceError(400, f"mode must be one of {', '.join(m.value for m in AnalysisMode)}")
+    max_issues = None
+    if "max_issues" in query:
+        try:
+            max_issues = int(query["max_issues"])
+        except ValueError:
+            max_issues = 0
+        if max_issues < 1:
+            raise ServiceError(400, "max_issues must be a positive integer")
+    return (mode, max_issues, _flag(query, "prescan"), query.get("profile", DEFAULT_PROFILE.name),
+            _flag(query, "comments"), _flag(query, "pages"))
+
+
+class ValidationServer:
+    """
+    asyncio HTTP front end of a ValidationService.
+    """
+
+    def __init__(self, service: ValidationService, max_upload: int = DEFAULT_MAX_UPLOAD_MB * 1024 * 1024):
+        self.service = service
+        self.max_upload = max_upload
+
+    async def dispatch(self, request: Request) -> Dict[str, Any]:
+        if request.path == "/health":
+            if request.method != "GET":
+                raise ServiceError(405, "use GET", {"Allow": "GET"})
+            return self.service.health()
+        if request.path == "/analyze":
+            if request.method != "POST":
+                raise ServiceError(405, "use POST with the .docx file as body", {"Allow": "POST"})
+            if not request.body:
+                raise ServiceError(400, "empty upload")
+            return await self.service.analyze(request.body, *_analysis_options(request.query))
+        raise ServiceError(404, f"no such endpoint: {request.path}")
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                request = await asyncio.wait_for(read_request(reader, writer, self.max_upload), READ_TIMEOUT)
+                if request is None:
+                    return
+                await write_response(writer, 200, await self.dispatch(request))
+            except ServiceError as exc:
+                await write_response(writer, exc.status, {"error": exc.message}, exc.headers)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                await write_response(writer, 400, {"error": "incomplete or oversized request"})
+            except Exception:
+                logger.exception("Unexpected error while handling a request")
+                await write_response(writer, 500, {"error": "internal error"})
+        except ConnectionError:
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                    unix_path: Optional[str] = None) -> None:
+        """
+        Listen on host:port, or on the Unix socket unix_path, until cancelled.
+        """
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        # Stop cleanly on SIGTERM as well as on Ctrl+C
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows
+        for sock in server.sockets:
+            print(f"Listening on {sock.getsockname()}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if unix_path and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve .docx format validation over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="TCP port, 0 for any free port (default: %(default)s)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="requests that may wait for a free worker (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds per request, waiting included (default: %(default)s)")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                        help="maximum upload size in MB (default: %(default)s)")
+    parser.add_argument("--profile", metavar="FILE", action="append", default=[],
+                        help="load a rule profile (.json or .toml) that requests can select by name; "
+                             "may be repeated")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        profiles = load_profiles(args.profile)
+    except (OSError, ValueError) as exc:
+        print(f"Cannot load profile: {exc}", file=sys.stderr)
+        return 2
+    service = ValidationService(max(1, args.workers), max(0, args.queue_size), args.timeout, profiles)
+    server = ValidationServer(service, args.max_upload * 1024 * 1024)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
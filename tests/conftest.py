@@ -0,0 +1,81 @@
+"""
+tests/conftest.py
+
+Shared fixtures of the tests: puts src on the import path and builds small
+documents in memory.
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from docx import Document  # noqa: E402
+from docx.enum.text import WD_ALIGN_PARAGRAPH  # noqa: E402
+from docx.shared import Emu, Pt  # noqa: E402
+from config.profiles import DEFAULT_PROFILE  # noqa: E402
+
+# Matches the title page pattern of the default profile
+TITLE_PAGE_MARKER = "Москва 2025 г."
+
+
+def make_document(paragraphs: int = 40, wrong_runs: int = 0, quotes: int = 0, title_page_end: int = -1,
+                  table_rows: int = 0) -> bytes:
+    """
+    A document whose Normal style and page margins conform to the default
+    profile, with paragraphs body paragraphs of two runs; the second run of
+    the first wrong_runs paragraphs is set in Arial. Then come quotes
+    paragraphs of two runs in the Quote style, set in Arial. With
+    title_page_end, the paragraph at that index is the title page marker.
+    With table_rows, a table of that many rows of two cells follows the
+    body paragraphs; the text of its last cell is set in Arial.
+
+    Returns:
+        bytes: the saved document.
+    """
+    profile = DEFAULT_PROFILE
+    docx = Document()
+    normal = docx.styles["Normal"]
+    normal.font.name = profile.target_font
+    normal.font.size = Pt(profile.min_font_size)
+    fmt = normal.paragraph_format
+    fmt.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+    fmt.first_line_indent = Emu(profile.first_line_indent_emu)
+    fmt.left_indent = Emu(0)
+    fmt.right_indent = Emu(0)
+    fmt.line_spacing = profile.line_spacing
+    for section in docx.sections:
+        for side, _, emu in profile.margins_emu:
+            setattr(section, f"{side}_margin", Emu(emu))
+    for index in range(paragraphs):
+        text = TITLE_PAGE_MARKER if index == title_page_end else f"Paragraph {index} of the report, "
+        paragraph = docx.add_paragraph(text)
+        run = paragraph.add_run("with a second run.")
+        if index < wrong_runs:
+            run.font.name = "Arial"
+    if table_rows:
+        table = docx.add_table(rows=table_rows, cols=2)
+        for row_index, row in enumerate(table.rows):
+            for cell_index, cell in enumerate(row.cells):
+                cell.text = f"Cell {row_index}.{cell_index}"
+        cell.paragraphs[0].runs[0].font.name = "Arial"
+    docx.styles["Quote"].font.name = "Arial"
+    for index in range(quotes):
+        paragraph = docx.add_paragraph(f"Quote {index}, ", style="Quote")
+        paragraph.add_run("with a second run.")
+    data = io.BytesIO()
+    docx.save(data)
+    return data.getvalue()
+
+
+@pytest.fixture(scope="session")
+def clean_document() -> bytes:
+    return make_document()
+
+
+@pytest.fixture(scope="session")
+def mostly_clean_document() -> bytes:
+    return make_document(wrong_runs=2, quotes=4)
@@ -0,0 +1,66 @@
+"""
+tests/test_cache.py
+
+Tests of the result cache keys: every rule setting and analysis option
+that changes the result must change the key.
+"""
+
+import dataclasses
+
+import pytest
+
+from config.profiles import DEFAULT_PROFILE
+from docx_utils.cache import CachedResult, ResultCache, cached_analyze_docx
+from docx_utils.instrumentation import Instrumentation
+from docx_utils.modes import AnalysisMode
+
+
+@pytest.mark.parametrize("changes", [{"target_font": "Arial"}, {"left_margin_cm": 3.0}])
+def test_profiles_with_different_rules_have_different_keys(tmp_path, clean_document, changes):
+    cache = ResultCache(tmp_path)
+    other = dataclasses.replace(DEFAULT_PROFILE, name="other", **changes)
+    key = cache.key(clean_document, profile=DEFAULT_PROFILE)
+    other_key = cache.key(clean_document, profile=other)
+    assert key != other_key
+
+    cache.put(key, CachedResult([], None, None))
+    assert cache.get(key) is not None
+    assert cache.get(other_key) is None
+
+
+def test_profile_name_is_not_part_of_the_key(tmp_path, clean_document):
+    cache = ResultCache(tmp_path)
+    renamed = dataclasses.replace(DEFAULT_PROFILE, name="renamed")
+    assert cache.key(clean_document, profile=DEFAULT_PROFILE) == cache.key(clean_document, profile=renamed)
+
+
+def test_prescan_run_does_not_answer_full_run(tmp_path, clean_document):
+    path = tmp_path / "clean.docx"
+    path.write_bytes(clean_document)
+    cache = ResultCache(tmp_path / "cache")
+
+    prescanned = cached_analyze_docx(path, cache, AnalysisMode.FULL, prescan=True)
+    assert prescanned.report == []
+    assert prescanned.fixed is None
+
+    full = cached_analyze_docx(path, cache, AnalysisMode.FULL)
+    assert full.report == []
+    assert full.fixed is not None
+
+
+def test_hit_counts_issues_per_rule(tmp_path, mostly_clean_document):
+    path = tmp_path / "mostly_clean.docx"
+    path.write_bytes(mostly_clean_document)
+    cache = ResultCache(tmp_path / "cache")
+
+    records = []
+    for _ in range(2):
+        instrumentation = Instrumentation()
+        with instrumentation.activate():
+            cached_analyze_docx(path, cache, AnalysisMode.REPORT)
+        records.append(instrumentation.emit())
+    miss, hit = records
+    assert miss["counters"]["cache_misses"] == 1
+    assert hit["counters"]["cache_hits"] == 1
+    assert hit["issues"] == miss["issues"]
+    assert sum(hit["issues"].values()) > 0
@@ -0,0 +1,50 @@
+"""
+tests/test_chunked.py
+
+Tests of chunked processing: it reports the same issues as the analysis
+of the whole document, and the fixed copy it writes has none left.
+"""
+
+import io
+from dataclasses import replace
+
+import pytest
+
+from cli import main
+from conftest import make_document
+from docx_utils.chunked import analyze_docx_chunked
+from docx_utils.docx_operations import analyze_docx
+
+
+@pytest.fixture(scope="module")
+def long_document() -> bytes:
+    return make_document(paragraphs=60, wrong_runs=5, quotes=4, title_page_end=2, table_rows=12)
+
+
+def comparable(report) -> list:
+    """
+    The issues of a report in a fixed order, without their paragraph indices.
+    """
+    issues = [replace(issue, location=replace(issue.location, paragraph_index=None)).to_dict() for issue in report]
+    return sorted(issues, key=lambda issue: repr(sorted(issue.items())))
+
+
+@pytest.mark.parametrize("mode", ["report", "full"])
+def test_chunked_reports_the_same_issues(long_document, mode):
+    expected, _, _ = analyze_docx(long_document, mode=mode)
+    outputs = {"checked_output": io.BytesIO(), "fixed_output": io.BytesIO()} if mode == "full" else {}
+    # Windows of 7 blocks split the body, the title page and the table apart
+    report = analyze_docx_chunked(long_document, mode=mode, chunk_blocks=7, **outputs)
+    assert len(report) > 0
+    assert comparable(report) == comparable(expected)
+
+
+def test_chunked_fixed_copy_has_no_issues(tmp_path, long_document):
+    source = tmp_path / "long.docx"
+    source.write_bytes(long_document)
+    out = tmp_path / "out"
+
+    assert main([str(source), "-o", str(out), "-j", "1", "--chunked", "7"]) == 1
+    fixed = out / "long_fixed.docx"
+    report, _, _ = analyze_docx(str(fixed), mode="report")
+    assert list(report) == []
@@ -0,0 +1,33 @@
+"""
+tests/test_cli.py
+
+Tests of the batch entry point: where the outputs of documents go.
+"""
+
+from cli import main, output_collisions, output_dirs
+
+
+def test_same_name_in_different_folders_keeps_both_outputs(tmp_path, mostly_clean_document, clean_document):
+    first = tmp_path / "in" / "a" / "thesis.docx"
+    second = tmp_path / "in" / "b" / "thesis.docx"
+    for path, data in ((first, mostly_clean_document), (second, clean_document)):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(data)
+    out = tmp_path / "out"
+
+    assert main([str(tmp_path / "in"), "-o", str(out), "-j", "1", "-f", "jsonl"]) == 1
+    assert (out / "a" / "thesis_report.jsonl").read_text(encoding="utf-8") != ""
+    assert (out / "b" / "thesis_report.jsonl").read_text(encoding="utf-8") == ""
+    assert (out / "a" / "thesis_fixed.docx").exists()
+    assert not (out / "b" / "thesis_fixed.docx").exists()
+
+
+def test_documents_of_one_folder_go_to_the_output_folder(tmp_path):
+    paths = [tmp_path / "one.docx", tmp_path / "two.docx"]
+    assert output_dirs(paths, str(tmp_path / "out")) == [str(tmp_path / "out")] * 2
+    assert output_dirs(paths, None) == [None, None]
+
+
+def test_same_stem_in_one_folder_is_a_collision(tmp_path):
+    paths = [tmp_path / "thesis.DOCX", tmp_path / "thesis.docx"]
+    assert output_collisions(paths, output_dirs(paths, str(tmp_path / "out"))) == [tuple(paths)]
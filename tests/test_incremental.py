@@ -0,0 +1,88 @@
+"""
+tests/test_incremental.py
+
+Tests of incremental re-validation: re-runs with a saved state report the
+same issues as full runs while checking only the changed paragraphs, and
+unusable saved states are discarded.
+"""
+
+import io
+import json
+
+from docx import Document
+
+from conftest import TITLE_PAGE_MARKER, make_document
+from docx_utils.docx_operations import analyze_docx
+from docx_utils.incremental import IncrementalState
+from docx_utils.instrumentation import Instrumentation
+
+
+def edit(data: bytes, index: int, text: str) -> bytes:
+    """
+    The document with the first run of body paragraph index set to text.
+    """
+    docx = Document(io.BytesIO(data))
+    docx.paragraphs[index].runs[0].text = text
+    out = io.BytesIO()
+    docx.save(out)
+    return out.getvalue()
+
+
+def rerun(data: bytes, path) -> tuple:
+    """
+    Report of data with the state saved at path, and the number of paragraphs checked.
+    """
+    instrumentation = Instrumentation()
+    state = IncrementalState.load(path)
+    report, _, _ = analyze_docx(data, mode="report", incremental=state, instrumentation=instrumentation)
+    state.save(path)
+    return [issue.to_dict() for issue in report], instrumentation.counters["paragraphs_checked"]
+
+
+def full_run(data: bytes) -> list:
+    report, _, _ = analyze_docx(data, mode="report")
+    return [issue.to_dict() for issue in report]
+
+
+def test_only_the_edited_paragraph_is_checked_again(tmp_path):
+    path = tmp_path / "doc.state"
+    original = make_document(wrong_runs=3, quotes=2)
+    first, checked = rerun(original, path)
+    assert first == full_run(original)
+    assert checked == 42
+
+    edited = edit(original, 10, "An edited paragraph, ")
+    second, checked = rerun(edited, path)
+    assert second == full_run(edited)
+    assert checked == 1
+
+
+def test_moved_title_page_marker_is_found_again(tmp_path):
+    path = tmp_path / "doc.state"
+    original = make_document(wrong_runs=8, title_page_end=3)
+    rerun(original, path)
+
+    moved = edit(edit(original, 3, "No longer the marker, "), 6, TITLE_PAGE_MARKER)
+    report, _ = rerun(moved, path)
+    assert report == full_run(moved)
+    assert report != full_run(original)
+
+
+def test_state_of_another_version_is_discarded(tmp_path, mostly_clean_document):
+    path = tmp_path / "doc.state"
+    state = IncrementalState()
+    analyze_docx(mostly_clean_document, incremental=state)
+    state.save(path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["paragraphs"]
+    data["version"] -= 1
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    assert IncrementalState.load(path).paragraphs == {}
+
+
+def test_unreadable_state_is_discarded(tmp_path):
+    path = tmp_path / "doc.state"
+    for content in (b"\x80\x04garbage", b'{"version": 2, "paragraphs": []}', b"[]"):
+        path.write_bytes(content)
+        assert IncrementalState.load(path).paragraphs == {}
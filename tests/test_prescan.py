@@ -0,0 +1,59 @@
+"""
+tests/test_prescan.py
+
+Tests of the pre-scan: analyze_docx reports the same issues with and
+without it, and a clean document is not checked at all.
+"""
+
+import io
+
+import pytest
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+from conftest import make_document
+from docx_utils.docx_operations import analyze_docx
+from docx_utils.prescan import prescan_docx
+
+
+def centered(data: bytes, *indices: int) -> bytes:
+    """
+    The document with the body paragraphs at indices centered.
+    """
+    docx = Document(io.BytesIO(data))
+    for index in indices:
+        docx.paragraphs[index].alignment = WD_ALIGN_PARAGRAPH.CENTER
+    out = io.BytesIO()
+    docx.save(out)
+    return out.getvalue()
+
+
+@pytest.fixture(scope="module")
+def title_page_document() -> bytes:
+    # Font violations on the title page, before its marker, an alignment
+    # violation on the title page (not reported) and one after it, a table
+    # with a wrong cell and paragraphs in a wrong style
+    return centered(make_document(wrong_runs=2, quotes=3, title_page_end=4, table_rows=30), 3, 20)
+
+
+@pytest.mark.parametrize("mode", ["report", "full"])
+def test_prescan_reports_the_same_issues(title_page_document, mode):
+    expected, _, _ = analyze_docx(title_page_document, mode=mode)
+    report, _, _ = analyze_docx(title_page_document, mode=mode, prescan=True)
+    assert [issue.to_dict() for issue in report] == [issue.to_dict() for issue in expected]
+    rules = {issue.rule for issue in report}
+    assert len(rules) > 1
+
+
+def test_prescan_flags_blocks_around_the_title_page(title_page_document):
+    scan = prescan_docx(io.BytesIO(title_page_document))
+    assert scan.title_page_end == 4
+    # The fonts of 0 and 1, the alignment of 20, the table (block 40) and the
+    # quotes; the alignment of paragraph 3 does not apply on the title page
+    assert scan.suspicious_blocks == {0, 1, 20, 40, 41, 42, 43}
+
+
+def test_clean_document_is_not_checked(clean_document):
+    report, checked, fixed = analyze_docx(clean_document, mode="full", prescan=True)
+    assert list(report) == [] and fixed is None
+    assert prescan_docx(io.BytesIO(clean_document)).clean
@@ -0,0 +1,94 @@
+"""
+tests/test_server.py
+
+Tests of the validation service over HTTP: a server with one worker on a
+free localhost port, answering valid, invalid and excess uploads.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from server import ValidationServer, ValidationService
+
+
+@pytest.fixture(scope="module")
+def server():
+    service = ValidationService(workers=1, queue_size=0, timeout=30)
+    front = ValidationServer(service)
+    loop = asyncio.new_event_loop()
+    listener = loop.run_until_complete(asyncio.start_server(front.handle_connection, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    port = listener.sockets[0].getsockname()[1]
+    yield service, f"http://127.0.0.1:{port}"
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    listener.close()
+    loop.close()
+    service.shutdown()
+
+
+def post(url: str, data: bytes):
+    request = urllib.request.Request(f"{url}/analyze", data=data, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read()), dict(response.headers)
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read()), dict(exc.headers)
+
+
+def test_valid_document_is_analyzed(server, mostly_clean_document):
+    _, url = server
+    status, payload, _ = post(url, mostly_clean_document)
+    assert status == 200
+    assert payload["issue_count"] == len(payload["issues"]) > 0
+
+
+def test_invalid_document_is_rejected(server):
+    _, url = server
+    status, payload, _ = post(url, b"not a zip archive")
+    assert status == 422
+    assert "not a valid .docx" in payload["error"]
+
+
+def test_full_service_rejects_with_retry_after(server, clean_document):
+    service, url = server
+    service.pending = service.capacity
+    try:
+        status, _, headers = post(url, clean_document)
+    finally:
+        service.pending = 0
+    assert status == 503
+    assert headers["Retry-After"] == "1"
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="needs SIGKILL")
+def test_crashed_worker_is_replaced(server, clean_document):
+    service, url = server
+    for worker in multiprocessing.active_children():
+        os.kill(worker.pid, signal.SIGKILL)
+    status, _, _ = post(url, clean_document)
+    assert status == 503
+    status, _, _ = post(url, clean_document)
+    assert status == 200
+
+
+def test_unexpected_error_is_logged_not_sent(server, clean_document, monkeypatch, caplog):
+    service, url = server
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("secret detail")
+
+    monkeypatch.setattr(service, "analyze", fail)
+    status, payload, _ = post(url, clean_document)
+    assert status == 500
+    assert payload == {"error": "internal error"}
+    assert any(record.exc_info and "secret detail" in str(record.exc_info[1]) for record in caplog.records)
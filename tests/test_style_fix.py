@@ -0,0 +1,69 @@
+"""
+tests/test_style_fix.py
+
+Tests of the style level fix: a conforming document is left as it is, and
+a mostly clean one is changed less than by fixing every run and paragraph.
+"""
+
+import io
+import zipfile
+
+from docx import Document
+from docx.oxml.ns import qn
+from lxml import etree
+
+from docx_utils.auto_fix.alignment_fix import AlignmentFixVisitor
+from docx_utils.auto_fix.changes import FixChanges
+from docx_utils.auto_fix.font_fix import FontFixVisitor
+from docx_utils.auto_fix.page_margins_fix import PageMarginsFixVisitor
+from docx_utils.docx_operations import analyze_docx, fix_docx, save_docx
+from docx_utils.styles import StyleResolver
+from docx_utils.traversal import walk_document
+
+
+def _per_run_fix(data: bytes) -> FixChanges:
+    """
+    The fix of every run and paragraph on its own, as before the style fix.
+    """
+    docx = Document(io.BytesIO(data))
+    styles = StyleResolver.from_document(docx)
+    changes = FixChanges()
+    walk_document(docx, [
+        FontFixVisitor(styles=styles, changes=changes),
+        AlignmentFixVisitor(styles=styles, changes=changes),
+        PageMarginsFixVisitor(changes=changes),
+    ])
+    return changes
+
+
+def _parts(data: bytes):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in ("word/document.xml", "word/styles.xml")}
+
+
+def test_conforming_document_is_not_changed(clean_document):
+    docx = Document(io.BytesIO(clean_document))
+    changes = fix_docx(docx)
+    assert len(changes) == 0
+    assert changes.properties == 0
+    assert _parts(save_docx(docx)) == _parts(save_docx(Document(io.BytesIO(clean_document))))
+
+
+def test_mostly_clean_document_gets_fewer_mutations_than_per_run_fix(mostly_clean_document):
+    docx = Document(io.BytesIO(mostly_clean_document))
+    changes = fix_docx(docx)
+    baseline = _per_run_fix(mostly_clean_document)
+    assert 0 < changes.properties < baseline.properties
+
+    report, _, _ = analyze_docx(save_docx(docx), mode="report")
+    assert report == []
+
+
+def test_only_used_styles_are_changed(mostly_clean_document):
+    docx = Document(io.BytesIO(mostly_clean_document))
+    before = {style.style_id: etree.tostring(style.element) for style in docx.styles}
+    changes = fix_docx(docx)
+    assert [style.get(qn("w:styleId")) for style in changes.styles] == ["Quote"]
+    for style in docx.styles:
+        if style.style_id != "Quote":
+            assert etree.tostring(style.element) == before[style.style_id], style.style_id